@@ -0,0 +1,96 @@
+# Async access to database.py for the FastAPI handlers
+# Every query runs on dedicated database threads (each with its own connection), so a slow
+# disk or network never blocks the event loop. SQLite gets a single thread (writes serialize on
+# the file anyway); PostgreSQL gets one thread per pooled connection (DB_POOL_MAX_SIZE).
+# The functions mirror database.py: await async_database.get_user_by_id(user_id) instead of
+# calling database.get_user_by_id(user_id).
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+import database
+
+# (backend, executor sized for it); replaced when the backend changes (tests)
+_executor: Optional[Tuple[database.DatabaseBackend, ThreadPoolExecutor]] = None
+_executor_lock = threading.Lock()
+
+
+def worker_count(backend: database.DatabaseBackend) -> int:
+    """Number of database threads for a backend"""
+    if isinstance(backend, database.SQLiteBackend):
+        return 1
+    return max(1, getattr(backend, "max_size", 1))
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """The database threads of the current backend"""
+    global _executor
+    backend = database.get_backend()
+    current = _executor
+    if current is not None and current[0] is backend:
+        return current[1]
+    with _executor_lock:
+        if _executor is None or _executor[0] is not backend:
+            if _executor is not None:
+                _executor[1].shutdown(wait=False)
+            _executor = (backend, ThreadPoolExecutor(max_workers=worker_count(backend), thread_name_prefix="database"))
+        return _executor[1]
+
+
+async def run(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a function on a database thread (for several queries that belong together)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _async(name: str) -> Callable[..., Any]:
+    function = getattr(database, name)
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        # Looked up on every call, so database functions patched in tests are used
+        return await run(getattr(database, name), *args, **kwargs)
+    return wrapper
+
+
+ping = _async("ping")
+get_schema_version = _async("get_schema_version")
+init_database = _async("init_database")
+
+# Users
+create_user = _async("create_user")
+create_test_user = _async("create_test_user")
+get_user_by_google_id = _async("get_user_by_google_id")
+get_user_by_id = _async("get_user_by_id")
+get_user_by_email = _async("get_user_by_email")
+is_first_user = _async("is_first_user")
+
+# Invitations
+create_invitation = _async("create_invitation")
+get_invitation_by_code = _async("get_invitation_by_code")
+mark_invitation_used = _async("mark_invitation_used")
+
+# Images
+create_image = _async("create_image")
+get_image_by_filename = _async("get_image_by_filename")
+get_image_by_sha256 = _async("get_image_by_sha256")
+find_image_by_source_sha256 = _async("find_image_by_source_sha256")
+add_image_ref = _async("add_image_ref")
+get_image_ref = _async("get_image_ref")
+get_image_ref_count = _async("get_image_ref_count")
+delete_image_ref = _async("delete_image_ref")
+get_image_ids_for_file = _async("get_image_ids_for_file")
+get_stored_image_filenames = _async("get_stored_image_filenames")
+
+# Usage log
+insert_usage_events = _async("insert_usage_events")
+get_usage_events = _async("get_usage_events")
+get_usage_rollups = _async("get_usage_rollups")
+get_usage_render_histogram = _async("get_usage_render_histogram")
+
+# Admin
+get_all_users = _async("get_all_users")
+get_users_page = _async("get_users_page")
+delete_user = _async("delete_user")
+promote_to_admin = _async("promote_to_admin")
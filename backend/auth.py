@@ -1,13 +1,21 @@
+import hashlib
+import hmac
+import json
+import math
 import os
 import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from google.oauth2 import id_token
+from google.auth import jwt as google_jwt
 from google.auth.transport import requests
 import database
+import rate_limit
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -19,8 +27,26 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+# Signed download URLs (verified without a database lookup)
+DOWNLOAD_URL_TTL_SECONDS = int(os.getenv("DOWNLOAD_URL_TTL_SECONDS", str(24 * 3600)))
+# Expiry times are rounded up to this granularity, so repeated requests get the same URL
+# (and a CDN or proxy in front of /downloads can serve it from cache)
+DOWNLOAD_URL_EXPIRY_GRANULARITY_SECONDS = 3600
+
+# Verified access token -> user record, so authenticated requests skip the JWT decode and user lookup.
+# Entries expire after USER_CACHE_TTL_SECONDS (or when the token does) and are dropped when the user
+# is deleted or changes role in this process; other instances see the change within the TTL.
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
 # Google OAuth configuration
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "your-google-client-id")
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+# Local {"key id": "x509 certificate"} JSON used instead of GOOGLE_CERTS_URL (tests, offline development)
+GOOGLE_CERTS_FILE = os.getenv("GOOGLE_CERTS_FILE")
+# Used when Google's response has no max-age
+GOOGLE_CERTS_DEFAULT_MAX_AGE = 3600
 
 # Rate limiting configuration
 RATE_LIMITS = {
@@ -29,6 +55,15 @@ RATE_LIMITS = {
 }
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# One transport (and pooled requests.Session) for all calls to Google
+_google_transport = requests.Request()
+_google_certs: Dict[str, Any] = {"certs": None, "expires_at": 0.0}
+_google_certs_lock = threading.Lock()
+
+_user_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # token -> {"user", "expires_at"}
+_user_cache_lock = threading.Lock()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
@@ -58,17 +93,96 @@ def verify_token(token: str) -> Optional[Dict[str, Any]]:
     except JWTError:
         return None
 
+def _max_age(cache_control: str) -> Optional[int]:
+    for directive in cache_control.split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age" and value.isdigit():
+            return int(value)
+    return None
+
+def _fetch_google_certs() -> Dict[str, Any]:
+    """Download Google's signing certificates; returns the certs and how long they may be cached"""
+    if GOOGLE_CERTS_FILE:
+        with open(GOOGLE_CERTS_FILE) as f:
+            return {"certs": json.load(f), "max_age": GOOGLE_CERTS_DEFAULT_MAX_AGE}
+    
+    response = _google_transport(GOOGLE_CERTS_URL, method="GET")
+    if response.status != 200:
+        raise ValueError(f"Could not fetch Google certificates (HTTP {response.status})")
+    
+    headers = {name.lower(): value for name, value in response.headers.items()}
+    max_age = _max_age(headers.get("cache-control", ""))
+    if max_age is None:
+        max_age = GOOGLE_CERTS_DEFAULT_MAX_AGE
+    age = headers.get("age", "0")
+    max_age = max(0, max_age - (int(age) if age.isdigit() else 0))
+    return {"certs": json.loads(response.data.decode("utf-8")), "max_age": max_age}
+
+def get_google_certs(refresh: bool = False) -> Dict[str, str]:
+    """Google's signing certificates, cached for as long as Google's Cache-Control max-age allows"""
+    with _google_certs_lock:
+        if refresh or _google_certs["certs"] is None or _google_certs["expires_at"] <= time.time():
+            fetched = _fetch_google_certs()
+            _google_certs["certs"] = fetched["certs"]
+            _google_certs["expires_at"] = time.time() + fetched["max_age"]
+        return _google_certs["certs"]
+
 def verify_google_token(token: str) -> Optional[Dict[str, Any]]:
-    """Verify Google ID token"""
+    """Verify Google ID token (signature checked locally against cached certificates)"""
     try:
-        idinfo = id_token.verify_oauth2_token(token, requests.Request(), GOOGLE_CLIENT_ID)
-        return idinfo
+        try:
+            idinfo = google_jwt.decode(token, certs=get_google_certs(), audience=GOOGLE_CLIENT_ID)
+        except ValueError as e:
+            if "Certificate for key id" not in str(e):
+                raise
+            # Signed with a key newer than our cached certificates (Google rotated its keys)
+            idinfo = google_jwt.decode(token, certs=get_google_certs(refresh=True), audience=GOOGLE_CLIENT_ID)
     except ValueError:
         return None
+    if idinfo.get("iss") not in GOOGLE_ISSUERS:
+        return None
+    return idinfo
+
+def _cached_user(token: str) -> Optional[Dict[str, Any]]:
+    with _user_cache_lock:
+        entry = _user_cache.get(token)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= time.time():
+            del _user_cache[token]
+            return None
+        _user_cache.move_to_end(token)
+        return dict(entry["user"])
+
+def _cache_user(token: str, payload: Dict[str, Any], user: Dict[str, Any]):
+    expires_at = time.time() + USER_CACHE_TTL_SECONDS
+    if payload.get("exp"):
+        expires_at = min(expires_at, payload["exp"])
+    with _user_cache_lock:
+        _user_cache[token] = {"user": dict(user), "expires_at": expires_at}
+        _user_cache.move_to_end(token)
+        while len(_user_cache) > USER_CACHE_MAX_ENTRIES:
+            _user_cache.popitem(last=False)
+
+def invalidate_user(user_id: int):
+    """Drop cached records of a user (all of their tokens)"""
+    with _user_cache_lock:
+        for token in [token for token, entry in _user_cache.items() if entry["user"]["id"] == user_id]:
+            del _user_cache[token]
+
+def clear_user_cache():
+    with _user_cache_lock:
+        _user_cache.clear()
+
+database.add_user_change_listener(invalidate_user)
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
     """Get current user from JWT token"""
     token = credentials.credentials
+    user = _cached_user(token)
+    if user is not None:
+        return user
+    
     payload = verify_token(token)
     
     if payload is None:
@@ -94,8 +208,15 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    _cache_user(token, payload, user)
     return user
 
+def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> Optional[Dict[str, Any]]:
+    """Get current user if a bearer token was sent, otherwise None"""
+    if credentials is None:
+        return None
+    return get_current_user(credentials)
+
 def get_current_admin_user(current_user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
     """Get current admin user"""
     if current_user["role"] != "admin":
@@ -105,6 +226,29 @@ def get_current_admin_user(current_user: Dict[str, Any] = Depends(get_current_us
         )
     return current_user
 
+def _download_signature(path: str, expires: int) -> str:
+    message = f"{path}:{expires}".encode()
+    return hmac.new(SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+def sign_download_url(path: str, ttl_seconds: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Create a signed, expiring URL for a download path such as "/downloads/{key}.pdf".
+    Returns the URL and its expiry (unix timestamp).
+    """
+    ttl = DOWNLOAD_URL_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    granularity = DOWNLOAD_URL_EXPIRY_GRANULARITY_SECONDS
+    expires = math.ceil((time.time() + ttl) / granularity) * granularity
+    return {
+        "url": f"{path}?expires={expires}&signature={_download_signature(path, expires)}",
+        "expires": expires
+    }
+
+def verify_download_signature(path: str, expires: int, signature: str) -> bool:
+    """Check a signed download URL (constant-time comparison, no database access)"""
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(_download_signature(path, expires), signature)
+
 def generate_invitation_code() -> str:
     """Generate a unique invitation code"""
     return secrets.token_urlsafe(16)
@@ -113,21 +257,28 @@ def check_rate_limit_middleware(user_id: int, endpoint: str):
     """Check rate limit for a specific endpoint"""
     rate_limit_config = RATE_LIMITS.get(endpoint, RATE_LIMITS["default"])
     
-    if not database.check_rate_limit(
-        user_id, 
-        endpoint, 
-        rate_limit_config["max_requests"], 
-        rate_limit_config["window_minutes"]
-    ):
+    allowed, retry_after = rate_limit.get_limiter().acquire(
+        f"{user_id}:{endpoint}",
+        rate_limit_config["max_requests"],
+        rate_limit_config["window_minutes"] * 60
+    )
+    if not allowed:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Rate limit exceeded. Max {rate_limit_config['max_requests']} requests per {rate_limit_config['window_minutes']} minutes."
+            detail=f"Rate limit exceeded. Max {rate_limit_config['max_requests']} requests per {rate_limit_config['window_minutes']} minutes.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
         )
 
 # Authentication flow functions
 def authenticate_user_with_google(google_token: str) -> Dict[str, Any]:
     """Authenticate user with Google token and return user info"""
-    google_user_info = verify_google_token(google_token)
+    return get_or_create_google_user(verify_google_token(google_token))
+
+def get_or_create_google_user(google_user_info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    The user of a verified Google token (as returned by verify_google_token), created on first sign-in.
+    Only database queries, no network calls.
+    """
     if not google_user_info:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,46 +1,386 @@
+# Database access for users, invitations, images and the usage log
+# The functions below run on a DatabaseBackend:
+#   - SQLite (default): the file DATABASE_PATH, one persistent WAL connection per thread
+#   - PostgreSQL (DATABASE_URL=postgresql://...): a shared connection pool, so that several
+#     instances see the same users and invitations (requires psycopg and psycopg_pool)
+# SQL is written once with "?" placeholders and runs unchanged on both.
+import bisect
+import json
 import sqlite3
 import os
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Iterator, Callable
 
 DATABASE_PATH = "app.db"
 
-def init_database():
-    """Initialize the database with required tables"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
+# SQLite connection tuning (see SQLiteBackend._configure)
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE_MB = int(os.getenv("DB_MMAP_SIZE_MB", "64"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_STATEMENT_CACHE_SIZE = 256  # prepared statements kept per connection, keyed by SQL text
+
+# Default PostgreSQL connection pool size (DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE, read by create_backend)
+DEFAULT_POOL_MIN_SIZE = 1
+DEFAULT_POOL_MAX_SIZE = 10
+
+
+class DatabaseError(Exception):
+    """Raised when the database backend is misconfigured or unavailable"""
+
+
+class IntegrityError(Exception):
+    """A UNIQUE or FOREIGN KEY constraint was violated (raised by every backend)"""
+
+
+class DatabaseBackend:
+    """
+    Interface of a database backend.
+
+    transaction() yields a connection whose execute() takes "?" placeholders and returns a
+    cursor with fetchone()/fetchall(); rows can be indexed by position or column name.
+    """
+
+    name = ""
+    # Column definition of an auto-incrementing integer primary key
+    auto_id = ""
+
+    @contextmanager
+    def transaction(self) -> Iterator[Any]:
+        """A connection in a transaction: committed on success, rolled back when the block raises"""
+        raise NotImplementedError
+
+    def lock_for_migration(self, conn):
+        """Block other processes from migrating until the transaction ends"""
+        raise NotImplementedError
+
+    def get_schema_version(self, conn) -> int:
+        raise NotImplementedError
+
+    def set_schema_version(self, conn, version: int):
+        raise NotImplementedError
+
+    def close(self):
+        """Close all connections; they are reopened on next use"""
+
+
+class SQLiteBackend(DatabaseBackend):
+    """
+    A local SQLite file. Every thread keeps one open connection (sqlite3 connections must not
+    be shared between threads while in use); all are tracked so they can be closed on shutdown.
+    """
+
+    auto_id = "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path  # None follows DATABASE_PATH (replaced in tests)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by close(), so threads drop their closed connection
+
+    @property
+    def path(self) -> str:
+        return self._path or DATABASE_PATH
+
+    @property
+    def name(self) -> str:
+        return f"sqlite:{self.path}"
+
+    @staticmethod
+    def _configure(conn: sqlite3.Connection):
+        """
+        WAL lets readers run alongside a writer; synchronous=NORMAL is durable across application
+        crashes in WAL mode and skips an fsync per commit. busy_timeout waits for a lock instead of
+        failing with "database is locked". foreign_keys is off by default in SQLite; it is turned on
+        so the schema's constraints hold as they do on PostgreSQL.
+        """
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE_MB * 1024 * 1024}')
+        conn.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA foreign_keys = ON')
+
+    def get_connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use (persistent: never close it)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation == self._generation:
+            if self._local.path == self.path:
+                return conn
+            self._close(conn)  # DATABASE_PATH changed (tests)
+
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=DB_STATEMENT_CACHE_SIZE,
+            check_same_thread=False  # only used by its own thread, but closed from close()
+        )
+        conn.row_factory = sqlite3.Row  # This allows accessing columns by name
+        self._configure(conn)
+
+        self._local.conn = conn
+        self._local.path = self.path
+        self._local.generation = self._generation
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _close(self, conn: sqlite3.Connection):
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self.get_connection()
+        try:
+            yield conn
+            conn.commit()
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            raise IntegrityError(str(e)) from e
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def lock_for_migration(self, conn: sqlite3.Connection):
+        # IMMEDIATE takes the write lock up front, so concurrent workers migrate one at a time
+        conn.execute('BEGIN IMMEDIATE')
+
+    def get_schema_version(self, conn: sqlite3.Connection) -> int:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def set_schema_version(self, conn: sqlite3.Connection, version: int):
+        conn.execute(f'PRAGMA user_version = {int(version)}')
+
+    def close(self):
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+            self._generation += 1
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+class _PostgresRow(dict):
+    """Row of a PostgreSQL query, indexable by column name and position (like sqlite3.Row)"""
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self.values())[key]
+        return super().__getitem__(key)
+
+
+def _postgres_row_factory(cursor):
+    names = [column.name for column in cursor.description or []]
+    return lambda values: _PostgresRow(zip(names, values))
+
+
+class _PostgresConnection:
+    """psycopg connection taking the "?" placeholders used throughout this module"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, sql: str, params: tuple = ()):
+        return self._conn.execute(sql.replace("?", "%s"), params)
+
+    def cursor(self) -> "_PostgresCursor":
+        return _PostgresCursor(self._conn.cursor())
+
+
+class _PostgresCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, params: tuple = ()):
+        self._cursor.execute(sql.replace("?", "%s"), params)
+        return self
+
+    def executemany(self, sql: str, params_seq):
+        self._cursor.executemany(sql.replace("?", "%s"), params_seq)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+
+class PostgresBackend(DatabaseBackend):
+    """PostgreSQL through a psycopg connection pool shared by all threads"""
+
+    auto_id = "BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY"
+    # Key of the advisory lock held while migrating
+    MIGRATION_LOCK_ID = 5_316_842
+
+    def __init__(self, url: str, min_size: int = DEFAULT_POOL_MIN_SIZE, max_size: int = DEFAULT_POOL_MAX_SIZE):
+        try:
+            import psycopg
+            from psycopg_pool import ConnectionPool
+        except ImportError as e:
+            raise DatabaseError("psycopg er ikke installert (pip install 'psycopg[binary]' psycopg_pool)") from e
+        self._psycopg = psycopg
+        self._pool_class = ConnectionPool
+        self.url = url
+        self.min_size = min_size
+        self.max_size = max_size
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = self._pool_class(
+                        self.url,
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        kwargs={"row_factory": _postgres_row_factory},
+                        open=True
+                    )
+        return self._pool
+
+    @property
+    def name(self) -> str:
+        return self.url
+
+    @contextmanager
+    def transaction(self) -> Iterator[_PostgresConnection]:
+        try:
+            # The pool commits when the block succeeds and rolls back when it raises
+            with self.pool.connection() as conn:
+                yield _PostgresConnection(conn)
+        except self._psycopg.IntegrityError as e:
+            raise IntegrityError(str(e)) from e
+
+    def lock_for_migration(self, conn: _PostgresConnection):
+        conn.execute('SELECT pg_advisory_xact_lock(?)', (self.MIGRATION_LOCK_ID,))
+
+    def get_schema_version(self, conn: _PostgresConnection) -> int:
+        conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)')
+        row = conn.execute('SELECT version FROM schema_version').fetchone()
+        return row[0] if row else 0
+
+    def set_schema_version(self, conn: _PostgresConnection, version: int):
+        conn.execute('DELETE FROM schema_version')
+        conn.execute('INSERT INTO schema_version (version) VALUES (?)', (version,))
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+
+
+_backend: Optional[DatabaseBackend] = None
+_backend_lock = threading.Lock()
+
+def create_backend() -> DatabaseBackend:
+    """
+    Create the backend configured by DATABASE_URL (PostgreSQL) or DATABASE_PATH (SQLite).
+    The environment is read here rather than on import, so settings loaded from .env later are seen.
+    """
+    url = os.getenv("DATABASE_URL", "")
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresBackend(
+            url,
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE", str(DEFAULT_POOL_MIN_SIZE))),
+            max_size=int(os.getenv("DB_POOL_MAX_SIZE", str(DEFAULT_POOL_MAX_SIZE)))
+        )
+    if url:
+        raise DatabaseError(f"Ukjent DATABASE_URL: {url.split('://')[0]}")
+    return SQLiteBackend()
+
+def get_backend() -> DatabaseBackend:
+    """Get the process-wide database backend"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+def set_backend(backend: Optional[DatabaseBackend]):
+    """Replace the process-wide database backend (None recreates it from the environment)"""
+    global _backend
+    _backend = backend
+
+# The open transaction of each thread, so nested connection() blocks join it
+_local = threading.local()
+
+@contextmanager
+def connection() -> Iterator[Any]:
+    """
+    A connection in a transaction: committed when the block succeeds, rolled back when it
+    raises (so a pooled connection never carries an open transaction into the next call).
+    Nested blocks join the outermost transaction.
+    """
+    current = getattr(_local, "conn", None)
+    if current is not None:
+        yield current
+        return
+    with get_backend().transaction() as conn:
+        _local.conn = conn
+        try:
+            yield conn
+        finally:
+            _local.conn = None
+
+def get_db_connection() -> sqlite3.Connection:
+    """This thread's SQLite connection (SQLite backend only; use connection() for queries)"""
+    backend = get_backend()
+    if not isinstance(backend, SQLiteBackend):
+        raise DatabaseError("get_db_connection() er kun tilgjengelig for SQLite")
+    return backend.get_connection()
+
+def close_all_connections():
+    """Close every pooled connection (on shutdown); threads reconnect on next use"""
+    if _backend is not None:
+        _backend.close()
+
+def _create_base_schema(cursor, backend: DatabaseBackend):
+    """Migration 1: the original schema (IF NOT EXISTS, so databases created before versioning upgrade cleanly)"""
     # Users table
-    cursor.execute('''
+    cursor.execute(f'''
         CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id {backend.auto_id},
             google_id TEXT UNIQUE NOT NULL,
             email TEXT UNIQUE NOT NULL,
             name TEXT NOT NULL,
             role TEXT DEFAULT 'user' CHECK (role IN ('user', 'admin')),
-            is_active BOOLEAN DEFAULT 1,
+            is_active BOOLEAN DEFAULT TRUE,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
     
     # Invitations table
-    cursor.execute('''
+    cursor.execute(f'''
         CREATE TABLE IF NOT EXISTS invitations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id {backend.auto_id},
             code TEXT UNIQUE NOT NULL,
             email TEXT NOT NULL,
             created_by INTEGER NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             used_at TIMESTAMP NULL,
-            is_used BOOLEAN DEFAULT 0,
+            is_used BOOLEAN DEFAULT FALSE,
             FOREIGN KEY (created_by) REFERENCES users (id)
         )
     ''')
     
     # Rate limiting table
-    cursor.execute('''
+    cursor.execute(f'''
         CREATE TABLE IF NOT EXISTS rate_limits (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id {backend.auto_id},
             user_id INTEGER NOT NULL,
             endpoint TEXT NOT NULL,
             count INTEGER DEFAULT 1,
@@ -50,216 +390,627 @@ def init_database():
         )
     ''')
     
+    # Uploaded images table (metadata recorded when an upload is normalized)
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS images (
+            id {backend.auto_id},
+            image_id TEXT UNIQUE NOT NULL,
+            filename TEXT UNIQUE NOT NULL,
+            format TEXT NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            has_alpha BOOLEAN DEFAULT FALSE,
+            byte_size INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            uploaded_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (uploaded_by) REFERENCES users (id)
+        )
+    ''')
+    
+    # Image references: every upload gets its own image_id pointing at shared content.
+    # The number of references to a content hash is its reference count.
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS image_refs (
+            image_id TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            source_sha256 TEXT,
+            uploaded_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (uploaded_by) REFERENCES users (id)
+        )
+    ''')
+    
     # Create indexes for better performance
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_google_id ON users(google_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_invitations_code ON invitations(code)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_rate_limits_user_endpoint ON rate_limits(user_id, endpoint)')
-    
-    conn.commit()
-    conn.close()
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_images_sha256 ON images(sha256)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_refs_sha256 ON image_refs(sha256)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_refs_source_sha256 ON image_refs(source_sha256)')
+
+def _drop_rate_limits(cursor, backend: DatabaseBackend):
+    """Migration 2: rate limits moved to rate_limit.py (token buckets, no table)"""
+    cursor.execute('DROP INDEX IF EXISTS idx_rate_limits_user_endpoint')
+    cursor.execute('DROP TABLE IF EXISTS rate_limits')
+
+def _index_users_created_at(cursor, backend: DatabaseBackend):
+    """Migration 3: index for the keyset-paginated admin user listing (newest first)"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at DESC, id DESC)')
+
+def _create_usage_events(cursor, backend: DatabaseBackend):
+    """Migration 4: append-only log of generated documents (written in batches by usage_log.py)"""
+    # No foreign key on user_id: the log outlives deleted users
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS usage_events (
+            id {backend.auto_id},
+            created_at TIMESTAMP NOT NULL,
+            user_id INTEGER,
+            generator TEXT NOT NULL,
+            document_id TEXT,
+            options TEXT,
+            byte_size INTEGER,
+            timings TEXT,
+            duration_ms REAL,
+            cache_hit BOOLEAN NOT NULL DEFAULT FALSE
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_usage_events_created_at ON usage_events(created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_usage_events_user_id ON usage_events(user_id, created_at)')
+
+def _create_usage_rollups(cursor, backend: DatabaseBackend):
+    """Migration 5: hourly and daily usage rollups, kept up to date by insert_usage_events"""
+    # One row per (period, bucket, generator, user); user_id 0 is an unknown user
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS usage_rollups (
+            period TEXT NOT NULL,
+            bucket_start TIMESTAMP NOT NULL,
+            generator TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            events INTEGER NOT NULL DEFAULT 0,
+            cache_hits INTEGER NOT NULL DEFAULT 0,
+            bytes BIGINT NOT NULL DEFAULT 0,
+            duration_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+            PRIMARY KEY (period, bucket_start, generator, user_id)
+        )
+    ''')
+    # Render times (cache misses) counted per USAGE_RENDER_BUCKETS_MS bucket, for percentiles
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS usage_render_histogram (
+            period TEXT NOT NULL,
+            bucket_start TIMESTAMP NOT NULL,
+            generator TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            events INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (period, bucket_start, generator, bucket)
+        )
+    ''')
+    # Events logged before the rollups existed
+    cursor.execute('SELECT created_at, user_id, generator, byte_size, duration_ms, cache_hit FROM usage_events')
+    _add_to_usage_rollups(cursor, [dict(row) for row in cursor.fetchall()])
+
+# Foreign keys to users and what happens to the row when the user is deleted
+_USER_FOREIGN_KEYS = [
+    ("images", "uploaded_by", "SET NULL"),
+    ("image_refs", "uploaded_by", "SET NULL"),
+    ("invitations", "created_by", "CASCADE"),
+]
+
+def _add_user_delete_rules(cursor, backend: DatabaseBackend):
+    """
+    Migration 6: deleting a user keeps their uploads (uploaded_by becomes NULL) and drops the
+    invitations they created. Without a rule the foreign keys made the delete fail.
+    """
+    for table, column, action in _USER_FOREIGN_KEYS:
+        # Rows left pointing at deleted users while SQLite did not enforce foreign keys
+        if action == "SET NULL":
+            cursor.execute(f'UPDATE {table} SET {column} = NULL WHERE {column} NOT IN (SELECT id FROM users)')
+        else:
+            cursor.execute(f'DELETE FROM {table} WHERE {column} NOT IN (SELECT id FROM users)')
+
+        if not isinstance(backend, SQLiteBackend):
+            cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_{column}_fkey')
+            cursor.execute(f'''
+                ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey
+                FOREIGN KEY ({column}) REFERENCES users (id) ON DELETE {action}
+            ''')
+            continue
+
+        # SQLite cannot alter a constraint: recreate the table with the rule and copy the rows over
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        create_sql = cursor.fetchone()[0]
+        reference = f'FOREIGN KEY ({column}) REFERENCES users (id)'
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+        cursor.execute(create_sql.replace(reference, f'{reference} ON DELETE {action}'))
+        cursor.execute(f'INSERT INTO {table} SELECT * FROM {table}_old')
+        cursor.execute(f'DROP TABLE {table}_old')
+
+    # Indexes of the recreated SQLite tables were dropped with the old ones
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_invitations_code ON invitations(code)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_images_sha256 ON images(sha256)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_refs_sha256 ON image_refs(sha256)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_refs_source_sha256 ON image_refs(source_sha256)')
+
+# Schema migrations, applied in order. The schema version of a database (PRAGMA user_version
+# on SQLite, the schema_version table on PostgreSQL) is the number of migrations it has;
+# add new ones at the end and never change released ones.
+MIGRATIONS = [
+    _create_base_schema,
+    _drop_rate_limits,
+    _index_users_created_at,
+    _create_usage_events,
+    _create_usage_rollups,
+    _add_user_delete_rules,
+]
+
+_migrated = set()
+_migrate_lock = threading.Lock()
 
-def get_db_connection():
-    """Get a database connection"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row  # This allows accessing columns by name
-    return conn
+def get_schema_version() -> int:
+    """Number of migrations applied to the database"""
+    with connection() as conn:
+        return get_backend().get_schema_version(conn)
+
+def migrate() -> int:
+    """Apply pending migrations in one transaction; returns the schema version"""
+    backend = get_backend()
+    with connection() as conn:
+        backend.lock_for_migration(conn)
+        version = backend.get_schema_version(conn)
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(conn.cursor(), backend)
+            backend.set_schema_version(conn, number)
+            print(f"🗄️ Applied database migration {number}: {migration.__name__}")
+    return max(version, len(MIGRATIONS))
+
+def init_database():
+    """Create or upgrade the schema. Runs the migrations once per process and database."""
+    name = get_backend().name
+    if name in _migrated:
+        return
+    with _migrate_lock:
+        if name not in _migrated:
+            migrate()
+            _migrated.add(name)
+
+def ping() -> bool:
+    """Cheap connectivity check (SELECT 1 on a pooled connection)"""
+    with connection() as conn:
+        return conn.execute('SELECT 1').fetchone()[0] == 1
 
 # User management functions
 def create_user(google_id: str, email: str, name: str, is_first_user: bool = False) -> int:
     """Create a new user, first user becomes admin"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    role = 'admin' if is_first_user else 'user'
+        role = 'admin' if is_first_user else 'user'
     
-    cursor.execute('''
-        INSERT INTO users (google_id, email, name, role)
-        VALUES (?, ?, ?, ?)
-    ''', (google_id, email, name, role))
+        cursor.execute('''
+            INSERT INTO users (google_id, email, name, role)
+            VALUES (?, ?, ?, ?)
+            RETURNING id
+        ''', (google_id, email, name, role))
     
-    user_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return user_id
+        user_id = cursor.fetchone()[0]
+        return user_id
 
 def create_test_user(email: str, name: str, role: str = 'admin') -> int:
     """Create a test user without Google ID requirement"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('''
-        INSERT INTO users (google_id, email, name, role)
-        VALUES (?, ?, ?, ?)
-    ''', (f"test_{email}", email, name, role))
+        cursor.execute('''
+            INSERT INTO users (google_id, email, name, role)
+            VALUES (?, ?, ?, ?)
+            RETURNING id
+        ''', (f"test_{email}", email, name, role))
     
-    user_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return user_id
+        user_id = cursor.fetchone()[0]
+        return user_id
 
 def get_user_by_google_id(google_id: str) -> Optional[Dict[str, Any]]:
     """Get user by Google ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM users WHERE google_id = ?', (google_id,))
-    user = cursor.fetchone()
+        cursor.execute('SELECT * FROM users WHERE google_id = ?', (google_id,))
+        user = cursor.fetchone()
     
-    conn.close()
-    return dict(user) if user else None
+        return dict(user) if user else None
 
 def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
     """Get user by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-    user = cursor.fetchone()
+        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+        user = cursor.fetchone()
     
-    conn.close()
-    return dict(user) if user else None
+        return dict(user) if user else None
 
 def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
     """Get user by email"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
-    user = cursor.fetchone()
+        cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
+        user = cursor.fetchone()
     
-    conn.close()
-    return dict(user) if user else None
+        return dict(user) if user else None
 
 def is_first_user() -> bool:
     """Check if this is the first user to register"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('SELECT COUNT(*) FROM users')
-    count = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM users')
+        count = cursor.fetchone()[0]
     
-    conn.close()
-    return count == 0
+        return count == 0
 
 # Invitation management functions
 def create_invitation(code: str, email: str, created_by: int) -> int:
     """Create a new invitation"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('''
-        INSERT INTO invitations (code, email, created_by)
-        VALUES (?, ?, ?)
-    ''', (code, email, created_by))
+        cursor.execute('''
+            INSERT INTO invitations (code, email, created_by)
+            VALUES (?, ?, ?)
+            RETURNING id
+        ''', (code, email, created_by))
     
-    invitation_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return invitation_id
+        invitation_id = cursor.fetchone()[0]
+        return invitation_id
 
 def get_invitation_by_code(code: str) -> Optional[Dict[str, Any]]:
     """Get invitation by code"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM invitations WHERE code = ? AND is_used = 0', (code,))
-    invitation = cursor.fetchone()
+        cursor.execute('SELECT * FROM invitations WHERE code = ? AND is_used = FALSE', (code,))
+        invitation = cursor.fetchone()
     
-    conn.close()
-    return dict(invitation) if invitation else None
+        return dict(invitation) if invitation else None
 
 def mark_invitation_used(invitation_id: int, used_at: datetime):
     """Mark invitation as used"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('''
-        UPDATE invitations 
-        SET is_used = 1, used_at = ? 
-        WHERE id = ?
-    ''', (used_at, invitation_id))
+        cursor.execute('''
+            UPDATE invitations 
+            SET is_used = TRUE, used_at = ? 
+            WHERE id = ?
+        ''', (used_at, invitation_id))
     
-    conn.commit()
-    conn.close()
 
-# Rate limiting functions
-def check_rate_limit(user_id: int, endpoint: str, max_requests: int, window_minutes: int) -> bool:
-    """Check if user has exceeded rate limit for an endpoint"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# Image functions
+def create_image(image_id: str, filename: str, format: str, width: int, height: int,
+                 has_alpha: bool, byte_size: int, sha256: str, uploaded_by: Optional[int] = None) -> int:
+    """Record metadata for a normalized upload"""
+    with connection() as conn:
+        cursor = conn.cursor()
+    
+        cursor.execute('''
+            INSERT INTO images (image_id, filename, format, width, height, has_alpha, byte_size, sha256, uploaded_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING id
+        ''', (image_id, filename, format, width, height, has_alpha, byte_size, sha256, uploaded_by))
+    
+        row_id = cursor.fetchone()[0]
+        return row_id
+
+def get_image_by_filename(filename: str) -> Optional[Dict[str, Any]]:
+    """Get image metadata by stored filename"""
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    now = datetime.now()
-    window_start = now - timedelta(minutes=window_minutes)
+        cursor.execute('SELECT * FROM images WHERE filename = ?', (filename,))
+        image = cursor.fetchone()
     
-    # Clean up old rate limit records
-    cursor.execute('''
-        DELETE FROM rate_limits 
-        WHERE window_end < ?
-    ''', (now,))
+        return dict(image) if image else None
+
+def get_image_by_sha256(sha256: str) -> Optional[Dict[str, Any]]:
+    """Get stored image content by its SHA-256"""
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    # Get current count for this user and endpoint
-    cursor.execute('''
-        SELECT COUNT(*) FROM rate_limits 
-        WHERE user_id = ? AND endpoint = ? AND window_start >= ?
-    ''', (user_id, endpoint, window_start))
+        cursor.execute('SELECT * FROM images WHERE sha256 = ? ORDER BY id LIMIT 1', (sha256,))
+        image = cursor.fetchone()
     
-    current_count = cursor.fetchone()[0]
+        return dict(image) if image else None
+
+def find_image_by_source_sha256(source_sha256: str) -> Optional[Dict[str, Any]]:
+    """Find stored image content produced from an identical original upload"""
+    with connection() as conn:
+        cursor = conn.cursor()
+    
+        cursor.execute('''
+            SELECT i.* FROM image_refs r
+            JOIN images i ON i.sha256 = r.sha256
+            WHERE r.source_sha256 = ?
+            ORDER BY i.id LIMIT 1
+        ''', (source_sha256,))
+        image = cursor.fetchone()
+    
+        return dict(image) if image else None
+
+def add_image_ref(image_id: str, sha256: str, source_sha256: Optional[str] = None,
+                  uploaded_by: Optional[int] = None) -> int:
+    """Point an image_id at stored content; returns the new reference count"""
+    with connection() as conn:
+        cursor = conn.cursor()
+    
+        cursor.execute('''
+            INSERT INTO image_refs (image_id, sha256, source_sha256, uploaded_by)
+            VALUES (?, ?, ?, ?)
+        ''', (image_id, sha256, source_sha256, uploaded_by))
+        cursor.execute('SELECT COUNT(*) FROM image_refs WHERE sha256 = ?', (sha256,))
+        ref_count = cursor.fetchone()[0]
+    
+        return ref_count
+
+def get_image_ref(image_id: str) -> Optional[Dict[str, Any]]:
+    """Get the stored image an image_id refers to"""
+    with connection() as conn:
+        cursor = conn.cursor()
+    
+        cursor.execute('''
+            SELECT r.image_id, i.filename, i.format, i.width, i.height, i.has_alpha, i.byte_size, i.sha256
+            FROM image_refs r
+            JOIN images i ON i.sha256 = r.sha256
+            WHERE r.image_id = ?
+            ORDER BY i.id LIMIT 1
+        ''', (image_id,))
+        image = cursor.fetchone()
+    
+        return dict(image) if image else None
+
+def get_image_ref_count(sha256: str) -> int:
+    """Number of image_ids referring to stored content"""
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    if current_count >= max_requests:
-        conn.close()
-        return False  # Rate limit exceeded
+        cursor.execute('SELECT COUNT(*) FROM image_refs WHERE sha256 = ?', (sha256,))
+        ref_count = cursor.fetchone()[0]
     
-    # Record this request
-    window_end = now + timedelta(minutes=window_minutes)
-    cursor.execute('''
-        INSERT INTO rate_limits (user_id, endpoint, window_start, window_end)
-        VALUES (?, ?, ?, ?)
-    ''', (user_id, endpoint, now, window_end))
+        return ref_count
+
+def delete_image_ref(image_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Remove a reference. When it was the last one the content row is deleted as well.
+    Returns the sha256, filenames and remaining reference count, or None if the image_id is unknown.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+    
+        cursor.execute('SELECT sha256 FROM image_refs WHERE image_id = ?', (image_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+    
+        sha256 = row["sha256"]
+        cursor.execute('DELETE FROM image_refs WHERE image_id = ?', (image_id,))
+        cursor.execute('SELECT COUNT(*) FROM image_refs WHERE sha256 = ?', (sha256,))
+        ref_count = cursor.fetchone()[0]
+        cursor.execute('SELECT filename FROM images WHERE sha256 = ?', (sha256,))
+        filenames = [r["filename"] for r in cursor.fetchall()]
+        if ref_count == 0:
+            cursor.execute('DELETE FROM images WHERE sha256 = ?', (sha256,))
+    
+        return {"sha256": sha256, "filenames": filenames, "ref_count": ref_count}
+
+def get_image_ids_for_file(filename: str) -> List[str]:
+    """image_ids of all references to the stored content in filename, oldest first"""
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT image_refs.image_id FROM image_refs
+            JOIN images ON images.sha256 = image_refs.sha256
+            WHERE images.filename = ?
+            ORDER BY image_refs.created_at, image_refs.image_id
+        ''', (filename,)).fetchall()
+    return [row["image_id"] for row in rows]
+
+def get_stored_image_filenames() -> List[str]:
+    """Filenames of all stored image content"""
+    with connection() as conn:
+        cursor = conn.cursor()
+    
+        cursor.execute('SELECT filename FROM images')
+        filenames = [row["filename"] for row in cursor.fetchall()]
     
-    conn.commit()
-    conn.close()
-    return True  # Request allowed
+        return filenames
+
+# Usage log
+USAGE_EVENT_COLUMNS = ("created_at", "user_id", "generator", "document_id", "options",
+                       "byte_size", "timings", "duration_ms", "cache_hit")
+
+def insert_usage_events(events: List[Dict[str, Any]]) -> int:
+    """Append usage events in one transaction (options and timings as JSON); returns the number written"""
+    if not events:
+        return 0
+    rows = [(
+        event["created_at"],
+        event.get("user_id"),
+        event["generator"],
+        event.get("document_id"),
+        json.dumps(event.get("options") or {}, sort_keys=True),
+        event.get("byte_size"),
+        json.dumps(event.get("timings") or {}, sort_keys=True),
+        event.get("duration_ms"),
+        bool(event.get("cache_hit")),
+    ) for event in events]
+    placeholders = ", ".join("?" for _ in USAGE_EVENT_COLUMNS)
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            f'INSERT INTO usage_events ({", ".join(USAGE_EVENT_COLUMNS)}) VALUES ({placeholders})', rows
+        )
+        _add_to_usage_rollups(cursor, events)
+    return len(rows)
+
+# Rollup periods and the start of the bucket a "YYYY-MM-DD HH:MM:SS" timestamp falls in
+USAGE_ROLLUP_PERIODS = {
+    "hour": lambda timestamp: timestamp[:13] + ":00:00",
+    "day": lambda timestamp: timestamp[:10] + " 00:00:00",
+}
+# Upper bounds (ms) of the render time histogram buckets; the last bucket holds everything slower
+USAGE_RENDER_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+def _add_to_usage_rollups(cursor, events: List[Dict[str, Any]]):
+    """
+    Add events to the hourly and daily rollups: the batch is summed per row first, then each
+    row is upserted once, so the cost depends on the batch and never on the history.
+    """
+    rollups: Dict[tuple, List[float]] = {}
+    histogram: Dict[tuple, int] = {}
+    for event in events:
+        created_at = str(event["created_at"])[:19]
+        cache_hit = bool(event.get("cache_hit"))
+        duration_ms = event.get("duration_ms") or 0
+        for period, bucket_start in USAGE_ROLLUP_PERIODS.items():
+            start = bucket_start(created_at)
+            row = rollups.setdefault((period, start, event["generator"], event.get("user_id") or 0), [0, 0, 0, 0.0])
+            row[0] += 1
+            row[1] += cache_hit
+            row[2] += event.get("byte_size") or 0
+            row[3] += duration_ms
+            if not cache_hit:
+                key = (period, start, event["generator"], bisect.bisect_left(USAGE_RENDER_BUCKETS_MS, duration_ms))
+                histogram[key] = histogram.get(key, 0) + 1
+
+    if rollups:
+        cursor.executemany('''
+            INSERT INTO usage_rollups (period, bucket_start, generator, user_id, events, cache_hits, bytes, duration_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (period, bucket_start, generator, user_id) DO UPDATE SET
+                events = usage_rollups.events + excluded.events,
+                cache_hits = usage_rollups.cache_hits + excluded.cache_hits,
+                bytes = usage_rollups.bytes + excluded.bytes,
+                duration_ms = usage_rollups.duration_ms + excluded.duration_ms
+        ''', [(*key, *values) for key, values in rollups.items()])
+    if histogram:
+        cursor.executemany('''
+            INSERT INTO usage_render_histogram (period, bucket_start, generator, bucket, events)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (period, bucket_start, generator, bucket) DO UPDATE SET
+                events = usage_render_histogram.events + excluded.events
+        ''', [(*key, count) for key, count in histogram.items()])
+
+def get_usage_rollups(period: str, since: datetime) -> List[Dict[str, Any]]:
+    """Rollup rows of a period ('hour' or 'day') from the bucket containing since, oldest first"""
+    start = USAGE_ROLLUP_PERIODS[period](since.strftime("%Y-%m-%d %H:%M:%S"))
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT bucket_start, generator, user_id, events, cache_hits, bytes, duration_ms
+            FROM usage_rollups WHERE period = ? AND bucket_start >= ?
+            ORDER BY bucket_start, generator, user_id
+        ''', (period, start)).fetchall()
+    return [{**dict(row), "bucket_start": str(row["bucket_start"])} for row in rows]
+
+def get_usage_render_histogram(period: str, since: datetime) -> List[Dict[str, Any]]:
+    """Render time histogram rows of a period from the bucket containing since, oldest first"""
+    start = USAGE_ROLLUP_PERIODS[period](since.strftime("%Y-%m-%d %H:%M:%S"))
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT bucket_start, generator, bucket, events
+            FROM usage_render_histogram WHERE period = ? AND bucket_start >= ?
+            ORDER BY bucket_start, generator, bucket
+        ''', (period, start)).fetchall()
+    return [{**dict(row), "bucket_start": str(row["bucket_start"])} for row in rows]
+
+def get_usage_events(limit: int = 100) -> List[Dict[str, Any]]:
+    """Most recent usage events, newest first (options and timings decoded)"""
+    with connection() as conn:
+        rows = conn.execute(
+            'SELECT * FROM usage_events ORDER BY created_at DESC, id DESC LIMIT ?', (limit,)
+        ).fetchall()
+
+    events = [dict(row) for row in rows]
+    for event in events:
+        event["options"] = json.loads(event["options"] or "{}")
+        event["timings"] = json.loads(event["timings"] or "{}")
+        event["cache_hit"] = bool(event["cache_hit"])
+    return events
+
+# Called with the user id after a user is deleted or changes role (e.g. to drop cached records)
+_user_change_listeners: List[Callable[[int], None]] = []
+
+def add_user_change_listener(listener: Callable[[int], None]):
+    """Register a function to call when a user is deleted or changes role"""
+    _user_change_listeners.append(listener)
+
+def _notify_user_changed(user_id: int):
+    for listener in _user_change_listeners:
+        listener(user_id)
 
 # Admin functions
 def get_all_users() -> List[Dict[str, Any]]:
     """Get all users (admin only)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM users ORDER BY created_at DESC')
-    users = [dict(row) for row in cursor.fetchall()]
+        cursor.execute('SELECT * FROM users ORDER BY created_at DESC')
+        users = [dict(row) for row in cursor.fetchall()]
     
-    conn.close()
+        return users
+
+# Columns the admin user listing may select
+USER_LIST_COLUMNS = ("id", "email", "name", "role", "is_active", "created_at")
+
+def get_users_page(limit: int, after: Optional[tuple] = None,
+                   columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    One page of users, newest first (admin only).
+
+    Keyset pagination: after is the (created_at, id) of the last user on the previous page,
+    so every page is an index range scan no matter how deep it is. created_at and id are
+    always selected, for building the next cursor.
+    """
+    columns = list(columns or USER_LIST_COLUMNS)
+    unknown = set(columns) - set(USER_LIST_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown user columns: {', '.join(sorted(unknown))}")
+    selected = ", ".join(dict.fromkeys(columns + ["created_at", "id"]))
+
+    with connection() as conn:
+        if after is None:
+            rows = conn.execute(f'''
+                SELECT {selected} FROM users
+                ORDER BY created_at DESC, id DESC LIMIT ?
+            ''', (limit,)).fetchall()
+        else:
+            rows = conn.execute(f'''
+                SELECT {selected} FROM users
+                WHERE (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC LIMIT ?
+            ''', (*after, limit)).fetchall()
+
+    users = [dict(row) for row in rows]
+    if "is_active" in columns:
+        for user in users:
+            user["is_active"] = bool(user["is_active"])
     return users
 
 def delete_user(user_id: int) -> bool:
     """Delete a user (admin only)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
-        conn.commit()
-        conn.close()
-        return True
+        with connection() as conn:
+            conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
     except:
-        conn.close()
         return False
+    _notify_user_changed(user_id)
+    return True
 
 def promote_to_admin(user_id: int) -> bool:
     """Promote user to admin (admin only)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute('UPDATE users SET role = "admin" WHERE id = ?', (user_id,))
-        conn.commit()
-        conn.close()
-        return True
+        with connection() as conn:
+            conn.execute("UPDATE users SET role = 'admin' WHERE id = ?", (user_id,))
     except:
-        conn.close()
         return False
-
-# Initialize database when module is imported
-init_database()
+    _notify_user_changed(user_id)
+    return True
@@ -0,0 +1,194 @@
+# HTTP caching for served files
+# Strong ETags from content hashes, Cache-Control (immutable for content-addressed files)
+# and 304 responses for conditional requests. Byte ranges (Range / If-Range) of local files are
+# handled by FileResponse itself, using the ETag set here. Objects in remote storage are streamed,
+# single byte ranges are fetched from the backend.
+import mimetypes
+import os
+import re
+from functools import lru_cache
+from typing import Optional, Dict, BinaryIO, Iterator, Tuple
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from image_processing import file_sha256
+import storage
+
+# Files named after their SHA-256 (uploads/{sha256}.jpg, downloads/{key}.pdf) never change
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}\.")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Headers a 304 response repeats from the full response
+NOT_MODIFIED_HEADERS = ("etag", "cache-control", "vary")
+
+# Read size when streaming an object from remote storage
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# A single byte range: "bytes=first-last", "bytes=first-" or "bytes=-suffix_length"
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def is_content_addressed(filename: str) -> bool:
+    """Check if a filename starts with a SHA-256 content hash"""
+    return bool(CONTENT_ADDRESSED_NAME.match(os.path.basename(filename)))
+
+
+@lru_cache(maxsize=4096)
+def _file_etag(file_path: str, mtime_ns: int, size: int) -> str:
+    return f'"{file_sha256(file_path)}"'
+
+
+def file_etag(file_path: str) -> str:
+    """Strong ETag from the SHA-256 of a file (hashed once per file version)"""
+    stat = os.stat(file_path)
+    return _file_etag(file_path, stat.st_mtime_ns, stat.st_size)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison, as RFC 9110 requires for GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+
+def cache_control(immutable: bool, private: bool = False, max_age: Optional[int] = None) -> str:
+    """
+    Cache-Control value: content-addressed files are cached forever (or for max_age, e.g. until
+    a signed URL expires), others are revalidated
+    """
+    scope = "private" if private else "public"
+    if immutable:
+        return f"{scope}, max-age={IMMUTABLE_MAX_AGE if max_age is None else max_age}, immutable"
+    return f"{scope}, no-cache"
+
+
+def cached_file_response(
+    request: Request,
+    file_path: str,
+    etag: Optional[str] = None,
+    immutable: Optional[bool] = None,
+    private: bool = False,
+    max_age: Optional[int] = None,
+    headers: Optional[Dict[str, str]] = None,
+    **kwargs
+) -> Response:
+    """
+    FileResponse with ETag and Cache-Control, or an empty 304 when the client already has the file.
+
+    Args:
+        etag: Strong ETag to use; defaults to the SHA-256 of the file
+        immutable: Whether the file can never change; defaults to whether its name is a content hash
+        private: Only cacheable by the browser (for authenticated responses)
+        max_age: Cache lifetime of an immutable file, if shorter than IMMUTABLE_MAX_AGE
+    """
+    if etag is None:
+        etag = file_etag(file_path)
+    if immutable is None:
+        immutable = is_content_addressed(file_path)
+
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": cache_control(immutable, private, max_age)}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return _not_modified(headers)
+    return FileResponse(file_path, headers=headers, **kwargs)
+
+
+def _not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers={
+        name: value for name, value in headers.items() if name.lower() in NOT_MODIFIED_HEADERS
+    })
+
+
+def parse_byte_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    First and last byte (inclusive) requested by a Range header, or None to send the whole object
+    (malformed or multiple ranges). Raises ValueError when the range is not satisfiable.
+    """
+    match = BYTE_RANGE.match(range_header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError(range_header)
+        return max(0, size - suffix), size - 1
+    if last and int(last) < int(first):
+        return None
+    if int(first) >= size:
+        raise ValueError(range_header)
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+def _read_chunks(body: BinaryIO, length: int) -> Iterator[bytes]:
+    try:
+        while length > 0:
+            chunk = body.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        body.close()
+
+
+def cached_storage_response(
+    request: Request,
+    key: str,
+    etag: Optional[str] = None,
+    immutable: Optional[bool] = None,
+    private: bool = False,
+    max_age: Optional[int] = None,
+    headers: Optional[Dict[str, str]] = None,
+    media_type: Optional[str] = None
+) -> Optional[Response]:
+    """
+    Response for a stored object, or None if it does not exist.
+
+    Local files are served by cached_file_response. Remote objects are streamed in chunks
+    from the backend without a local copy (ETag from the backend); a single byte range
+    (honoring If-Range) is fetched as such and answered with 206.
+    """
+    backend = storage.get_storage()
+    if backend.stores_locally:
+        file_path = backend.local_path(key)
+        if file_path is None:
+            return None
+        return cached_file_response(request, file_path, etag=etag, immutable=immutable, private=private,
+                                    max_age=max_age, headers=headers, media_type=media_type)
+
+    stat = backend.stat(key)
+    if stat is None:
+        return None
+    if etag is None:
+        etag = stat.get("etag") or f'"{stat["size"]}-{int(stat["modified"])}"'
+    if immutable is None:
+        immutable = is_content_addressed(key)
+
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": cache_control(immutable, private, max_age)}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return _not_modified(headers)
+
+    size = stat["size"]
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    try:
+        body = backend.open(key, byte_range)
+    except FileNotFoundError:
+        return None
+
+    headers["Accept-Ranges"] = "bytes"
+    media_type = media_type or mimetypes.guess_type(key)[0] or "application/octet-stream"
+    if byte_range is None:
+        return StreamingResponse(_read_chunks(body, size), media_type=media_type,
+                                 headers={**headers, "Content-Length": str(size)})
+    first, last = byte_range
+    return StreamingResponse(_read_chunks(body, last - first + 1), status_code=206, media_type=media_type, headers={
+        **headers, "Content-Length": str(last - first + 1), "Content-Range": f"bytes {first}-{last}/{size}"
+    })
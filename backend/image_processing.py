@@ -0,0 +1,348 @@
+# Image processing for uploaded images
+# Uploads are normalized once into a render-ready format so that PDF rendering
+# can embed them directly without decoding or converting pixels.
+import hashlib
+import math
+import os
+import tempfile
+from typing import Optional, Dict, Any, Tuple
+from PIL import Image, ImageOps
+import database
+import storage
+
+# HEIC/HEIF support is optional and only available when pillow-heif is installed
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+# Largest size an upload is stored at (matches the 1920x1080 PDF page)
+MAX_IMAGE_SIZE = (1920, 1080)
+JPEG_QUALITY = 85
+
+# Renditions served to the browser: longest edge in pixels ("master" is the stored image itself)
+RENDITION_SIZES = {"thumb": 256, "preview": 960, "master": None}
+RENDITION_DIR = "renditions"
+WEBP_QUALITY = 80
+
+# Largest image accepted, checked from the header before any pixel data is decoded
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_MEGAPIXELS", "50")) * 1000 * 1000
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# Uploads are copied to disk in fixed-size chunks and rejected once they exceed the limit
+# (the request as a whole is limited before it is parsed, see UploadSizeLimitMiddleware in main.py)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "30")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Batch uploads: files per request and images processed at the same time
+MAX_BATCH_UPLOAD_FILES = int(os.getenv("MAX_BATCH_UPLOAD_FILES", "20"))
+UPLOAD_BATCH_WORKERS = int(os.getenv("UPLOAD_BATCH_WORKERS", "4"))
+
+# File signatures of the image formats we accept: (offset, magic bytes, format)
+IMAGE_SIGNATURES = [
+    (0, b"\xff\xd8\xff", "jpg"),
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (0, b"BM", "bmp"),
+    (0, b"II*\x00", "tiff"),
+    (0, b"MM\x00*", "tiff"),
+    (8, b"WEBP", "webp"),
+    (4, b"ftypheic", "heic"),
+    (4, b"ftypheix", "heic"),
+    (4, b"ftypmif1", "heic"),
+    (4, b"ftypmsf1", "heic"),
+]
+SIGNATURE_BYTES = 16
+
+
+class ImageProcessingError(ValueError):
+    """Raised when an uploaded file cannot be processed as an image"""
+
+
+class UploadTooLargeError(ImageProcessingError):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES"""
+
+
+def detect_image_type(header: bytes) -> Optional[str]:
+    """Detect the image format from the first bytes of a file"""
+    for offset, magic, image_type in IMAGE_SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            if image_type == "webp" and not header.startswith(b"RIFF"):
+                continue
+            return image_type
+    return None
+
+
+async def stream_upload(upload, upload_dir: str, max_bytes: Optional[int] = None) -> Tuple[str, str]:
+    """
+    Copy an UploadFile to a temporary file in upload_dir, chunk by chunk.
+
+    The upload has already been received: Starlette spools the multipart body before the handler
+    runs, and the request size is limited before that (UploadSizeLimitMiddleware in main.py).
+    This enforces the per-file limit; checking the first chunk against known image signatures and
+    stopping at max_bytes only avoid copying a file that is rejected anyway.
+    Memory use per upload is bounded by UPLOAD_CHUNK_SIZE. The temporary file is removed on
+    any failure; on success the caller owns it.
+
+    Returns the path of the temporary file and the SHA-256 of the uploaded bytes.
+    """
+    if max_bytes is None:
+        max_bytes = MAX_UPLOAD_BYTES
+
+    fd, temp_path = tempfile.mkstemp(dir=upload_dir, suffix=".part")
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            total = 0
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if total == 0 and detect_image_type(chunk[:SIGNATURE_BYTES]) is None:
+                    raise ImageProcessingError("Filen er ikke et gyldig bilde")
+                total += len(chunk)
+                if total > max_bytes:
+                    raise UploadTooLargeError(f"Filen er for stor (maks {max_bytes // (1024 * 1024)} MB)")
+                buffer.write(chunk)
+                digest.update(chunk)
+
+        if total == 0:
+            raise ImageProcessingError("Filen er tom")
+        return temp_path, digest.hexdigest()
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _save_atomic(img: Image.Image, file_path: str, **save_args):
+    """Save an image to a temporary file next to file_path and move it into place"""
+    temp_path = f"{file_path}.part"
+    try:
+        img.save(temp_path, **save_args)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def has_transparency(img: Image.Image) -> bool:
+    """Check if an image actually uses transparency (not just has an alpha channel)"""
+    if img.mode == "P" and "transparency" in img.info:
+        img = img.convert("RGBA")
+    elif img.mode in ("L", "RGB") and "transparency" in img.info:
+        img = img.convert("RGBA")
+
+    if img.mode in ("RGBA", "LA", "PA"):
+        alpha_min, _ = img.getchannel("A").getextrema()
+        return alpha_min < 255
+    return False
+
+
+def file_sha256(file_path: str) -> str:
+    """Calculate SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _oriented_size(img: Image.Image):
+    """Image size after EXIF orientation is applied (orientations 5-8 swap width and height)"""
+    orientation = img.getexif().get(0x0112, 1)
+    if orientation in (5, 6, 7, 8):
+        return img.height, img.width
+    return img.width, img.height
+
+
+def _draft_size(img: Image.Image):
+    """
+    Smallest size (in stored orientation) the decoder may reduce to while still covering
+    the final MAX_IMAGE_SIZE thumbnail, or None if no reduction is needed
+    """
+    width, height = _oriented_size(img)
+    scale = min(MAX_IMAGE_SIZE[0] / width, MAX_IMAGE_SIZE[1] / height)
+    if scale >= 1:
+        return None
+    return max(1, math.ceil(img.width * scale)), max(1, math.ceil(img.height * scale))
+
+
+def normalize_image(source_path: str, upload_dir: str, image_id: str) -> Dict[str, Any]:
+    """
+    Normalize an uploaded image into the canonical render format.
+
+    Photos are stored as baseline RGB JPEGs, which ReportLab embeds as-is (DCT passthrough).
+    Images with real transparency are stored as 8-bit RGBA PNGs, so the soft mask can be
+    taken straight from the alpha channel without palette or mode conversion at render time.
+    EXIF orientation is applied since PDF viewers ignore it.
+
+    Images over MAX_IMAGE_PIXELS are rejected from the header alone. Large JPEGs are decoded
+    at a reduced scale (1/2, 1/4 or 1/8 in the DCT domain) before the final LANCZOS resample,
+    so a 24 MP photo is never fully decoded.
+
+    Returns metadata for the stored image.
+    """
+    try:
+        img = Image.open(source_path)
+    except Exception as e:
+        raise ImageProcessingError(f"Kunne ikke lese bildefil: {e}") from e
+
+    with img:
+        print(f"📸 Image uploaded: {img.format} {img.mode} {img.width}x{img.height}")
+        original_format = img.format
+        if img.width * img.height > MAX_IMAGE_PIXELS:
+            raise ImageProcessingError(
+                f"Bildet er for stort ({img.width}x{img.height}, maks {MAX_IMAGE_PIXELS // 1000000} megapiksler)"
+            )
+
+        draft_size = _draft_size(img)
+        if draft_size and img.draft(None, draft_size):
+            print(f"⚡ Decoding at reduced size {img.width}x{img.height}")
+        try:
+            normalized = ImageOps.exif_transpose(img)
+        except Exception as e:
+            raise ImageProcessingError(f"Kunne ikke lese bildefil: {e}") from e
+
+    # Resize if too large (max 1920x1080)
+    if normalized.width > MAX_IMAGE_SIZE[0] or normalized.height > MAX_IMAGE_SIZE[1]:
+        print(f"🔄 Resizing image from {normalized.width}x{normalized.height} to max 1920x1080")
+        normalized.thumbnail(MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
+
+    transparent = has_transparency(normalized)
+    if transparent:
+        normalized = normalized.convert("RGBA")
+        filename = f"{image_id}.png"
+        file_path = os.path.join(upload_dir, filename)
+        _save_atomic(normalized, file_path, format="PNG", optimize=True)
+    else:
+        normalized = normalized.convert("RGB")
+        filename = f"{image_id}.jpg"
+        file_path = os.path.join(upload_dir, filename)
+        _save_atomic(normalized, file_path, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=False)
+
+    print(f"✅ Image normalized: {original_format} -> {'PNG' if transparent else 'JPEG'} {normalized.width}x{normalized.height}")
+
+    return {
+        "filename": filename,
+        "format": "PNG" if transparent else "JPEG",
+        "width": normalized.width,
+        "height": normalized.height,
+        "has_alpha": transparent,
+        "byte_size": os.path.getsize(file_path),
+        "sha256": file_sha256(file_path),
+    }
+
+
+def get_image_info(file_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Get dimensions and transparency (plus content hash when recorded) for an upload.
+    Uses the metadata recorded at upload time, falling back to reading the image header
+    for files uploaded before normalization was introduced. Never decodes pixel data.
+    """
+    info = database.get_image_by_filename(os.path.basename(file_path))
+    if info:
+        return info
+
+    if not os.path.exists(file_path):
+        return None
+
+    with Image.open(file_path) as img:
+        return {
+            "filename": os.path.basename(file_path),
+            "format": img.format,
+            "width": img.width,
+            "height": img.height,
+            "has_alpha": img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info,
+            "sha256": None,
+        }
+
+
+def rendition_key(filename: str, size: str, webp: bool) -> str:
+    """
+    Storage key of a rendition of a stored image. The master in its stored format is the stored
+    file itself; everything else lives in uploads/renditions/ as {stem}.{size}.{webp|jpg|png}.
+    """
+    stem, ext = os.path.splitext(filename)
+    if size == "master" and not webp:
+        return f"uploads/{filename}"
+    return f"uploads/{RENDITION_DIR}/{stem}.{size}.{'webp' if webp else ext.lstrip('.')}"
+
+
+def create_rendition(filename: str, size: str, webp: bool, master_path: Optional[str] = None) -> Optional[str]:
+    """
+    Create one rendition from the stored master and put it in storage (skipped if it exists).
+    Transparent images keep their alpha channel in both WebP and PNG.
+
+    Args:
+        master_path: Local copy of the master, fetched from storage when not given
+
+    Returns the rendition's storage key, or None if the master does not exist.
+    """
+    backend = storage.get_storage()
+    key = rendition_key(filename, size, webp)
+    if backend.exists(key):
+        return key
+
+    master_path = master_path or backend.local_path(f"uploads/{filename}")
+    if master_path is None:
+        return None
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, os.path.basename(key))
+        with Image.open(master_path) as img:
+            longest_edge = RENDITION_SIZES[size]
+            if longest_edge:
+                img.draft(None, (longest_edge, longest_edge))
+                img.thumbnail((longest_edge, longest_edge), Image.Resampling.LANCZOS)
+            else:
+                img.load()
+
+            if webp:
+                img.save(path, format="WEBP", quality=WEBP_QUALITY, method=4)
+            elif img.mode == "RGBA":
+                img.save(path, format="PNG", optimize=True)
+            else:
+                img.convert("RGB").save(path, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        backend.put_file(key, path)
+    return key
+
+
+def create_renditions(filename: str, master_path: Optional[str] = None):
+    """Create every rendition (all sizes, WebP and JPEG/PNG) of a stored image"""
+    keys = []
+    for size in RENDITION_SIZES:
+        for webp in (True, False):
+            keys.append(create_rendition(filename, size, webp, master_path))
+    print(f"🖼️ Created {len(keys) - 1} renditions for {filename}")
+    return keys
+
+
+def remove_renditions(filename: str):
+    """Delete the renditions of a stored image (not the stored file itself)"""
+    backend = storage.get_storage()
+    for size in RENDITION_SIZES:
+        for webp in (True, False):
+            key = rendition_key(filename, size, webp)
+            if key != f"uploads/{filename}":
+                backend.delete(key)
+
+
+def get_stored_image_info(filename: str) -> Optional[Dict[str, Any]]:
+    """
+    Image metadata for a stored upload. Uses the metadata index, so nothing is fetched from
+    storage unless the image predates it.
+    """
+    info = database.get_image_by_filename(filename)
+    if info:
+        return info
+
+    local_path = storage.get_storage().local_path(f"uploads/{filename}")
+    return get_image_info(local_path) if local_path else None
+
+
+def image_mask(info: Optional[Dict[str, Any]]):
+    """Return the ReportLab mask argument for an image: only transparent images need a soft mask"""
+    return 'auto' if info and info.get("has_alpha") else None
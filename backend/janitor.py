@@ -0,0 +1,208 @@
+# Background cleanup of uploaded images and generated PDFs in storage
+# Runs periodically and:
+#   - releases the references of stored images not used within the upload TTL (content is deleted
+#     with its last reference)
+#   - deletes orphaned content-addressed uploads (no stored content refers to them), renditions
+#     whose upload is gone and stale temp files; uploads from before content addressing are kept
+#   - deletes generated PDFs not accessed within the download TTL
+#   - evicts least-recently-accessed PDFs and renditions while over the disk quota
+#   - evicts least-recently-used local copies of remote (S3) objects beyond STORAGE_CACHE_MAX_MB
+# Renditions and PDFs can always be recreated; referenced originals are never evicted for quota.
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List
+import database
+import http_cache
+import storage
+import upload_store
+from image_processing import RENDITION_DIR
+
+UPLOAD_PREFIX = "uploads/"
+RENDITION_PREFIX = f"uploads/{RENDITION_DIR}/"
+DOWNLOAD_PREFIX = "downloads/"
+
+JANITOR_INTERVAL_SECONDS = int(os.getenv("JANITOR_INTERVAL_SECONDS", "600"))  # 0 disables the janitor
+UPLOAD_TTL_HOURS = float(os.getenv("UPLOAD_TTL_HOURS", str(30 * 24)))
+DOWNLOAD_TTL_HOURS = float(os.getenv("DOWNLOAD_TTL_HOURS", str(7 * 24)))
+STORAGE_QUOTA_MB = float(os.getenv("STORAGE_QUOTA_MB", "2048"))
+
+# Files younger than this are never treated as orphans (uploads in progress)
+ORPHAN_GRACE_SECONDS = 3600
+
+_metrics = {
+    "runs": 0,
+    "last_run_at": None,
+    "last_run_seconds": None,
+    "files_removed": 0,
+    "bytes_reclaimed": 0,
+    "bytes_reclaimed_by_reason": {"upload_ttl": 0, "orphan": 0, "download_ttl": 0, "quota": 0, "storage_cache": 0},
+    "bytes_in_use": None,
+}
+_lock = threading.Lock()
+
+
+def mark_accessed(key: str):
+    """Record that a stored file was used"""
+    storage.get_storage().touch(key)
+
+
+def _files(prefix: str) -> List[Dict[str, Any]]:
+    """Stored files directly under a prefix with size and last access time"""
+    return list(storage.get_storage().list(prefix))
+
+
+def _name(file: Dict[str, Any]) -> str:
+    return file["key"].rsplit("/", 1)[-1]
+
+
+def _remove(file: Dict[str, Any], reason: str, stats: Dict[str, Any]):
+    if not storage.get_storage().delete(file["key"]):
+        return
+    stats["files_removed"] += 1
+    stats["bytes_reclaimed"] += file["size"]
+    stats["bytes_reclaimed_by_reason"][reason] += file["size"]
+
+
+def _release_unused_uploads(now: float, stats: Dict[str, Any]):
+    """
+    Release every reference to stored images that were not used within the upload TTL.
+    An image is used when it or one of its renditions is served or drawn into a PDF
+    (see mark_accessed). Backends that cannot record access (S3) never expire uploads.
+    """
+    backend = storage.get_storage()
+    if not backend.tracks_access:
+        return
+
+    files = _files(UPLOAD_PREFIX) + _files(RENDITION_PREFIX)
+    last_used: Dict[str, float] = {}
+    for file in files:
+        stem = _name(file).split(".")[0]
+        last_used[stem] = max(last_used.get(stem, 0), file["accessed"])
+
+    cutoff = now - UPLOAD_TTL_HOURS * 3600
+    unused = [filename for filename in database.get_stored_image_filenames()
+              if last_used.get(os.path.splitext(filename)[0], now) < cutoff]
+    if not unused:
+        return
+
+    before = {f["key"]: f["size"] for f in files}
+    for filename in unused:
+        for image_id in database.get_image_ids_for_file(filename):
+            upload_store.release_image(image_id)
+
+    for key, size in before.items():
+        if not backend.exists(key):
+            stats["files_removed"] += 1
+            stats["bytes_reclaimed"] += size
+            stats["bytes_reclaimed_by_reason"]["upload_ttl"] += size
+
+
+def _is_orphan_candidate(name: str) -> bool:
+    """
+    Upload files the janitor may delete when nothing refers to them: leftovers of interrupted
+    uploads and content-addressed files. Uploads from before content addressing have no
+    images row and are kept.
+    """
+    return name.endswith((".part", ".tmp")) or http_cache.is_content_addressed(name)
+
+
+def _remove_orphans(now: float, stats: Dict[str, Any]):
+    """Delete upload files and renditions that no stored image refers to"""
+    stored = set(database.get_stored_image_filenames())
+
+    uploads = []
+    for file in _files(UPLOAD_PREFIX):
+        name = _name(file)
+        if now - file["modified"] > ORPHAN_GRACE_SECONDS and name not in stored and _is_orphan_candidate(name):
+            _remove(file, "orphan", stats)
+        else:
+            uploads.append(name)
+
+    # A rendition is an orphan once its source file is gone (older uploads keep theirs)
+    upload_stems = {os.path.splitext(name)[0] for name in uploads}
+    for file in _files(RENDITION_PREFIX):
+        stem = _name(file).split(".")[0]
+        if now - file["modified"] > ORPHAN_GRACE_SECONDS and stem not in upload_stems:
+            _remove(file, "orphan", stats)
+
+    for file in _files(DOWNLOAD_PREFIX):
+        if file["key"].endswith(".tmp") and now - file["modified"] > ORPHAN_GRACE_SECONDS:
+            _remove(file, "orphan", stats)
+
+
+def _remove_expired_downloads(now: float, stats: Dict[str, Any]):
+    """Delete generated PDFs not accessed within the download TTL"""
+    for file in _files(DOWNLOAD_PREFIX):
+        if now - file["accessed"] > DOWNLOAD_TTL_HOURS * 3600:
+            _remove(file, "download_ttl", stats)
+
+
+def _enforce_quota(stats: Dict[str, Any]) -> int:
+    """Evict least-recently-accessed PDFs and renditions until total usage is within the quota"""
+    downloads = _files(DOWNLOAD_PREFIX)
+    renditions = _files(RENDITION_PREFIX)
+    in_use = sum(f["size"] for f in _files(UPLOAD_PREFIX) + downloads + renditions)
+    quota = STORAGE_QUOTA_MB * 1024 * 1024
+
+    for file in sorted(downloads + renditions, key=lambda f: f["accessed"]):
+        if in_use <= quota:
+            break
+        _remove(file, "quota", stats)
+        in_use -= file["size"]
+
+    if in_use > quota:
+        print(f"⚠️ Storage still over quota after eviction: {in_use} bytes (referenced uploads are kept)")
+    return in_use
+
+
+def _trim_storage_cache(stats: Dict[str, Any]):
+    """Evict least-recently-used local copies of remote objects beyond STORAGE_CACHE_MAX_MB"""
+    freed = storage.get_storage().trim_cache()
+    stats["bytes_reclaimed"] += freed
+    stats["bytes_reclaimed_by_reason"]["storage_cache"] += freed
+
+
+def run_once() -> Dict[str, Any]:
+    """Run one cleanup pass; returns what this pass removed"""
+    started = time.time()
+    stats = {"files_removed": 0, "bytes_reclaimed": 0,
+             "bytes_reclaimed_by_reason": {reason: 0 for reason in _metrics["bytes_reclaimed_by_reason"]}}
+
+    _release_unused_uploads(started, stats)
+    _remove_orphans(started, stats)
+    _remove_expired_downloads(started, stats)
+    in_use = _enforce_quota(stats)
+    _trim_storage_cache(stats)
+
+    with _lock:
+        _metrics["runs"] += 1
+        _metrics["last_run_at"] = datetime.now().isoformat()
+        _metrics["last_run_seconds"] = round(time.time() - started, 3)
+        _metrics["files_removed"] += stats["files_removed"]
+        _metrics["bytes_reclaimed"] += stats["bytes_reclaimed"]
+        for reason, reclaimed in stats["bytes_reclaimed_by_reason"].items():
+            _metrics["bytes_reclaimed_by_reason"][reason] += reclaimed
+        _metrics["bytes_in_use"] = in_use
+
+    if stats["files_removed"]:
+        print(f"🧹 Janitor removed {stats['files_removed']} files, reclaimed {stats['bytes_reclaimed']} bytes")
+    return stats
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Cumulative janitor metrics since process start"""
+    with _lock:
+        return {**_metrics, "bytes_reclaimed_by_reason": dict(_metrics["bytes_reclaimed_by_reason"])}
+
+
+async def run_forever():
+    """Run cleanup passes every JANITOR_INTERVAL_SECONDS (in a worker thread, off the event loop)"""
+    while True:
+        try:
+            await asyncio.to_thread(run_once)
+        except Exception as e:
+            print(f"❌ Janitor error: {e}")
+        await asyncio.sleep(JANITOR_INTERVAL_SECONDS)
@@ -1,25 +1,40 @@
 # backend/main.py
-from fastapi import FastAPI, HTTPException, Depends, File, Form, UploadFile
-from fastapi.responses import StreamingResponse, HTMLResponse, FileResponse
+# Load environment variables from .env first: the project modules below read their settings on import
+from dotenv import load_dotenv
+load_dotenv()
+
+from fastapi import FastAPI, HTTPException, Depends, File, Form, Query, UploadFile, Header, Request
+from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.security import HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
-from typing import Literal, List
+from typing import Literal, List, Optional, Dict, Any
 from write_to_pdf import generate_pdf
+from pdf_generators.common import _extract_sheet_id
+import asyncio
+import async_database
+import base64
 import auth
 import database
+import http_cache
+import image_processing
+import janitor
+import render_cache
+import storage
+import upload_store
+import usage_log
 from models import (
     GoogleAuthRequest, AuthResponse, RefreshTokenRequest,
     CreateInvitationRequest, InvitationResponse, UseInvitationRequest,
-    UserResponse, UserListResponse, PromoteUserRequest, DeleteUserRequest,
+    UserResponse, UserPageResponse, PromoteUserRequest, DeleteUserRequest,
     HealthResponse, ProjectType, GenerateContentRequest, GeneratedContent,
-    ImageUploadResponse, ProjectDescriptionRequest, ProjectDescriptionResponse
+    ImageUploadResponse, ProjectDescriptionRequest, ProjectDescriptionResponse,
+    ProjectDescriptionLayout, BatchImageUploadResult, BatchImageUploadResponse, UsageResponse
 )
-from datetime import datetime
-from dotenv import load_dotenv
+from datetime import datetime, timedelta, timezone
 import os
-
-# Load environment variables from .env file
-load_dotenv()
+import time
+from functools import lru_cache
 
 app = FastAPI(title="Pristilbud Generator API", version="1.0.0")
 
@@ -33,14 +48,22 @@ async def startup_event():
         print(f"🐍 Python version: {os.sys.version}")
         print(f"🔧 Environment: {os.environ.get('ENVIRONMENT', 'development')}")
         
-        # Create required directories
-        os.makedirs("uploads", exist_ok=True)
-        os.makedirs("downloads", exist_ok=True)
-        print("✅ Directories created successfully")
+        # Storage backend for uploads and generated PDFs
+        backend = storage.get_storage()
+        print(f"✅ Storage backend: {type(backend).__name__}")
+        
+        # Apply pending schema migrations (no-op if already done in this process)
+        await async_database.init_database()
+        print(f"✅ Database ready (schema version {await async_database.get_schema_version()})")
+        
+        # Periodic cleanup of stored uploads and PDFs
+        if janitor.JANITOR_INTERVAL_SECONDS > 0:
+            asyncio.create_task(janitor.run_forever())
+            print(f"✅ Janitor started (every {janitor.JANITOR_INTERVAL_SECONDS}s)")
         
-        # Initialize database
-        database.init_database()
-        print("✅ Database initialized successfully")
+        # Batched writes of the usage log
+        asyncio.create_task(usage_log.run_forever())
+        print(f"✅ Usage log started (flush every {usage_log.USAGE_FLUSH_INTERVAL_SECONDS}s)")
         
         # Check Google Sheets credentials
         google_creds = os.environ.get("GOOGLE_CREDENTIALS_JSON")
@@ -68,6 +91,64 @@ async def startup_event():
         traceback.print_exc()
         # Don't raise here - let the app start but log the error
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write the remaining usage events and close pooled database connections"""
+    try:
+        written = await async_database.run(usage_log.flush)
+        print(f"📝 Usage log: wrote {written} events on shutdown")
+    except Exception as e:
+        print(f"❌ Usage log flush failed on shutdown, {usage_log.get_metrics()['buffered']} events lost: {e}")
+    database.close_all_connections()
+    print("👋 Database connections closed")
+
+# Upload request bodies are limited before they are parsed: Starlette receives the whole multipart
+# body and spools every file to a temp file before the handler (and stream_upload) runs.
+UPLOAD_BODY_OVERHEAD_BYTES = 1024 * 1024  # multipart headers and form fields
+
+def _upload_body_limit(path: str) -> Optional[int]:
+    """Largest request body accepted on an upload endpoint (None for other paths)"""
+    if path == "/upload-image":
+        return image_processing.MAX_UPLOAD_BYTES + UPLOAD_BODY_OVERHEAD_BYTES
+    if path == "/upload-images":
+        return image_processing.MAX_BATCH_UPLOAD_FILES * image_processing.MAX_UPLOAD_BYTES + UPLOAD_BODY_OVERHEAD_BYTES
+    return None
+
+class UploadSizeLimitMiddleware:
+    """
+    Answer 413 to upload requests whose Content-Length exceeds the limit, without reading the body.
+    Bodies without a Content-Length (chunked) are counted while they are received and cut off at the limit.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = _upload_body_limit(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        detail = f"Forespørselen er for stor (maks {limit // (1024 * 1024)} MB)"
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised while FastAPI parses the body, which passes HTTPExceptions through
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # CORS (adjust origins for your deployment)
 app.add_middleware(
     CORSMiddleware,
@@ -84,27 +165,69 @@ class PDFRequest(BaseModel):
     mva: Literal["y", "n"]
     discount_percent: Literal[0, 10, 15, 20, 25, 30, 40] = Field(default=0, description="Rabatt i prosent (0, 10, 15, 20, 25, 30, 40)")
 
+# Readiness is cached briefly, so frequent probes cost a dict lookup
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "5"))
+_readiness = {"checked_at": 0.0, "result": None}
+
+@lru_cache(maxsize=1)
+def _credentials_status() -> str:
+    """Status of the Google Sheets credentials (the environment does not change while running)"""
+    google_creds = os.environ.get("GOOGLE_CREDENTIALS_JSON")
+    if not google_creds:
+        return "missing"
+    try:
+        import json
+        json.loads(google_creds)
+        return "ok"
+    except json.JSONDecodeError:
+        return "invalid"
+
+async def _check_readiness() -> dict:
+    """Database reachable (SELECT 1) and credential status, cached for READINESS_CACHE_SECONDS"""
+    now = time.monotonic()
+    if _readiness["result"] is not None and now - _readiness["checked_at"] < READINESS_CACHE_SECONDS:
+        return _readiness["result"]
+    
+    try:
+        db_status = "connected" if await async_database.ping() else "error"
+    except Exception as e:
+        print(f"❌ Readiness check failed: {e}")
+        db_status = "error"
+    
+    result = {
+        "ready": db_status == "connected",
+        "database": db_status,
+        "credentials": _credentials_status()
+    }
+    _readiness["checked_at"] = now
+    _readiness["result"] = result
+    return result
+
+# Liveness probe: the process is up and serving requests (no dependencies)
+@app.get("/livez")
+async def livez():
+    return {"status": "ok"}
+
+# Readiness probe: the instance can take traffic
+@app.get("/readyz")
+async def readyz():
+    readiness = await _check_readiness()
+    return JSONResponse(
+        status_code=200 if readiness["ready"] else 503,
+        content={"status": "ok" if readiness["ready"] else "unavailable", **readiness}
+    )
+
 # Simple public health check (no auth required)
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Simple health check endpoint for deployment monitoring"""
-    try:
-        # Basic checks
-        db_status = "connected" if database.init_database() else "error"
-        
-        return HealthResponse(
-            status="ok",
-            timestamp=datetime.now(),
-            database=db_status,
-            user=None
-        )
-    except Exception as e:
-        return HealthResponse(
-            status="error",
-            timestamp=datetime.now(),
-            database="error",
-            user=None
-        )
+    readiness = await _check_readiness()
+    return HealthResponse(
+        status="ok" if readiness["ready"] else "error",
+        timestamp=datetime.now(),
+        database=readiness["database"],
+        user=None
+    )
 
 # Simple ping endpoint (no dependencies)
 @app.get("/ping")
@@ -128,7 +251,10 @@ async def healthz(current_user: dict = Depends(auth.get_current_user)):
 async def google_auth(request: GoogleAuthRequest):
     """Authenticate user with Google token"""
     try:
-        user = auth.authenticate_user_with_google(request.google_token)
+        # Verifying the token may fetch Google's certificates, so it runs on a worker thread rather
+        # than holding the database threads; the user lookup and creation run on those
+        google_user_info = await asyncio.to_thread(auth.verify_google_token, request.google_token)
+        user = await async_database.run(auth.get_or_create_google_user, google_user_info)
         tokens = auth.create_user_tokens(user)
         return AuthResponse(
             access_token=tokens["access_token"],
@@ -148,7 +274,7 @@ async def refresh_token(request: RefreshTokenRequest):
             raise HTTPException(status_code=401, detail="Invalid refresh token")
         
         user_id = int(payload["sub"])
-        user = database.get_user_by_id(user_id)
+        user = await async_database.get_user_by_id(user_id)
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         
@@ -171,13 +297,13 @@ async def create_invitation(
     """Create a new invitation (admin only)"""
     try:
         invitation_code = auth.generate_invitation_code()
-        invitation_id = database.create_invitation(
+        invitation_id = await async_database.create_invitation(
             invitation_code, 
             request.email, 
             current_admin["id"]
         )
         
-        invitation = database.get_invitation_by_code(invitation_code)
+        invitation = await async_database.get_invitation_by_code(invitation_code)
         return InvitationResponse(
             id=invitation["id"],
             code=invitation["code"],
@@ -191,18 +317,47 @@ async def create_invitation(
 @app.post("/invitations/use")
 async def use_invitation(request: UseInvitationRequest):
     """Use an invitation code (returns success message)"""
-    invitation = database.get_invitation_by_code(request.invitation_code)
+    invitation = await async_database.get_invitation_by_code(request.invitation_code)
     if not invitation:
         raise HTTPException(status_code=400, detail="Invalid or expired invitation code")
     
     return {"message": "Invitation code is valid", "email": invitation["email"]}
 
 # User management endpoints (admin only)
-@app.get("/admin/users", response_model=UserListResponse)
-async def get_all_users(current_admin: dict = Depends(auth.get_current_admin_user)):
-    """Get all users (admin only)"""
-    users = database.get_all_users()
-    return UserListResponse(users=users)
+def _encode_user_cursor(user: dict) -> str:
+    return base64.urlsafe_b64encode(f"{user['created_at']}|{user['id']}".encode()).decode()
+
+def _decode_user_cursor(cursor: str) -> tuple:
+    try:
+        created_at, user_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return created_at, int(user_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Ugyldig cursor")
+
+@app.get("/admin/users", response_model=UserPageResponse)
+async def get_all_users(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    columns: Optional[str] = None,
+    current_admin: dict = Depends(auth.get_current_admin_user)
+):
+    """
+    List users, newest first (admin only).
+    Paginated: follow next_cursor with ?cursor=. ?columns=id,email,... selects the returned fields.
+    """
+    after = _decode_user_cursor(cursor) if cursor else None
+    selected = [column.strip() for column in columns.split(",") if column.strip()] if columns else None
+    try:
+        # One extra row tells whether there is a next page
+        users = await async_database.get_users_page(limit + 1, after=after, columns=selected)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Ugyldige kolonner: {e}")
+    
+    next_cursor = _encode_user_cursor(users[limit - 1]) if len(users) > limit else None
+    users = users[:limit]
+    if selected:
+        users = [{column: user[column] for column in selected} for user in users]
+    return UserPageResponse(users=users, next_cursor=next_cursor)
 
 @app.post("/admin/users/promote")
 async def promote_user(
@@ -210,7 +365,7 @@ async def promote_user(
     current_admin: dict = Depends(auth.get_current_admin_user)
 ):
     """Promote user to admin (admin only)"""
-    success = database.promote_to_admin(request.user_id)
+    success = await async_database.promote_to_admin(request.user_id)
     if not success:
         raise HTTPException(status_code=400, detail="Failed to promote user")
     return {"message": "User promoted to admin successfully"}
@@ -224,11 +379,35 @@ async def delete_user(
     if user_id == current_admin["id"]:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     
-    success = database.delete_user(user_id)
+    success = await async_database.delete_user(user_id)
     if not success:
         raise HTTPException(status_code=400, detail="Failed to delete user")
     return {"message": "User deleted successfully"}
 
+@app.get("/admin/storage")
+async def get_storage_metrics(current_admin: dict = Depends(auth.get_current_admin_user)):
+    """Janitor metrics: bytes reclaimed, files removed and current disk usage (admin only)"""
+    return janitor.get_metrics()
+
+# Hourly buckets are only served for this many days (the response grows with the window)
+USAGE_HOURLY_MAX_DAYS = 31
+
+@app.get("/admin/usage", response_model=UsageResponse)
+async def get_usage(
+    period: Literal["hour", "day"] = "day",
+    days: int = Query(7, ge=1, le=366),
+    current_admin: dict = Depends(auth.get_current_admin_user)
+):
+    """
+    Generated documents per hour or day (admin only): counts, cache hit rates, render time
+    percentiles and documents per user. Read from the precomputed rollups only.
+    """
+    if period == "hour" and days > USAGE_HOURLY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Timesoversikt er begrenset til {USAGE_HOURLY_MAX_DAYS} dager")
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+    summary = await async_database.run(usage_log.get_usage_summary, period, since)
+    return UsageResponse(period=period, since=since, log=usage_log.get_metrics(), **summary)
+
 # Protected PDF generation endpoint
 @app.post("/generate-pdf")
 def create_pdf(
@@ -236,11 +415,13 @@ def create_pdf(
     current_user: dict = Depends(auth.get_current_user)
 ):
     """Generate PDF (requires authentication)"""
+    started = time.perf_counter()
+    timings = {}
+    # Check rate limit (outside the try, so the 429 and its Retry-After reach the client)
+    auth.check_rate_limit_middleware(current_user["id"], "generate-pdf")
     try:
-        # Check rate limit
-        auth.check_rate_limit_middleware(current_user["id"], "generate-pdf")
-        
-        buffer, filename = generate_pdf(req.url, req.language, req.reise, req.mva, req.discount_percent)
+        buffer, filename = generate_pdf(req.url, req.language, req.reise, req.mva, req.discount_percent,
+                                        timings=timings)
     except ValueError as ve:
         # e.g., invalid URL format
         raise HTTPException(status_code=400, detail=str(ve))
@@ -257,6 +438,15 @@ def create_pdf(
     print(f"   Media type: application/pdf")
     print(f"   Buffer size: {len(buffer.getvalue())} bytes")
     
+    usage_log.record(
+        "price_quote", current_user["id"], _extract_sheet_id(req.url),
+        options={"language": req.language, "reise": req.reise, "mva": req.mva,
+                 "discount_percent": req.discount_percent},
+        byte_size=len(buffer.getvalue()),
+        timings=timings,
+        duration_ms=(time.perf_counter() - started) * 1000
+    )
+    
     # Alternative: send filename in custom header
     headers = {
         "Content-Disposition": f'attachment; filename="{filename}"',
@@ -276,18 +466,18 @@ async def create_first_user():
     """Create the first user for testing (remove in production)"""
     try:
         # Check if any users exist
-        if not database.is_first_user():
+        if not await async_database.is_first_user():
             raise HTTPException(status_code=400, detail="Users already exist")
         
         # Create a test user (first user becomes admin)
-        user_id = database.create_user(
+        user_id = await async_database.create_user(
             google_id="test-google-id-123",
             email="admin@test.com",
             name="Test Admin",
             is_first_user=True
         )
         
-        user = database.get_user_by_id(user_id)
+        user = await async_database.get_user_by_id(user_id)
         
         # Create tokens for this user
         tokens = auth.create_user_tokens(user)
@@ -306,11 +496,11 @@ async def create_test_invitation():
     """Create a test invitation (remove in production)"""
     try:
         # Check if any users exist
-        if database.is_first_user():
+        if await async_database.is_first_user():
             raise HTTPException(status_code=400, detail="No users exist yet")
         
         # Get the first user (admin)
-        users = database.get_all_users()
+        users = await async_database.get_all_users()
         if not users:
             raise HTTPException(status_code=400, detail="No users found")
         
@@ -318,13 +508,13 @@ async def create_test_invitation():
         
         # Create invitation
         invitation_code = auth.generate_invitation_code()
-        invitation_id = database.create_invitation(
+        invitation_id = await async_database.create_invitation(
             invitation_code, 
             "test@example.com", 
             admin_user["id"]
         )
         
-        invitation = database.get_invitation_by_code(invitation_code)
+        invitation = await async_database.get_invitation_by_code(invitation_code)
         
         return {
             "message": "Test invitation created successfully",
@@ -344,13 +534,13 @@ async def test_auth():
         print("🔐 Test auth requested")
         
         # Check if test user exists, if not create it
-        existing_user = database.get_user_by_email("test@example.com")
+        existing_user = await async_database.get_user_by_email("test@example.com")
         print(f"📋 Existing user check: {existing_user is not None}")
         
         if not existing_user:
             print("👤 Creating test user...")
             # Create test user in database
-            user_id = database.create_test_user(
+            user_id = await async_database.create_test_user(
                 email="test@example.com",
                 name="Test User",
                 role="admin"
@@ -358,7 +548,7 @@ async def test_auth():
             print(f"✅ Test user created with ID: {user_id}")
             
             # Get the created user
-            existing_user = database.get_user_by_email("test@example.com")
+            existing_user = await async_database.get_user_by_email("test@example.com")
             print(f"📋 Retrieved created user: {existing_user is not None}")
         
         if not existing_user:
@@ -479,6 +669,39 @@ async def generate_ai_content(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Feil ved generering av innhold: {str(e)}")
 
+async def _receive_upload(file: UploadFile, work_dir: str):
+    """Copy one uploaded file to a temp file in work_dir (per-file size limit and magic bytes checked while copying)"""
+    if not file.content_type or not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="Kun bildefiler er tillatt")
+    try:
+        return await image_processing.stream_upload(file, work_dir)
+    except image_processing.UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except image_processing.ImageProcessingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _store_upload(raw_path: str, source_sha256: str, work_dir: str, placeholder_type: str, user_id) -> ImageUploadResponse:
+    """
+    Store a received upload by content hash: duplicates reuse the processed image, new images are
+    normalized once into the render format (baseline JPEG or RGBA PNG). CPU-bound, runs in a worker thread.
+    """
+    import uuid
+    
+    # Every upload gets its own image_id, even when the content is already stored
+    image_id = str(uuid.uuid4())
+    try:
+        image_info = upload_store.store_image(raw_path, source_sha256, work_dir, image_id, uploaded_by=user_id)
+    except image_processing.ImageProcessingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filename = image_info["filename"]
+    return ImageUploadResponse(
+        image_id=image_id,
+        filename=filename,
+        url=f"/uploads/{filename}",
+        placeholder_type=placeholder_type
+    )
+
 @app.post("/upload-image")
 async def upload_image(
     file: UploadFile = File(...),
@@ -487,64 +710,146 @@ async def upload_image(
 ):
     """Upload image for project description"""
     try:
-        # Validate file type
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="Kun bildefiler er tillatt")
-        
-        # Generate unique filename
-        import uuid
-        import os
-        from PIL import Image
-        
-        file_extension = file.filename.split('.')[-1]
-        image_id = str(uuid.uuid4())
-        filename = f"{image_id}.{file_extension}"
-        
-        # Create uploads directory if it doesn't exist
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        file_path = os.path.join(upload_dir, filename)
-        
-        # Save and process image
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Process image (resize if needed, add watermark, etc.)
-        with Image.open(file_path) as img:
-            print(f"📸 Image uploaded: {img.format} {img.mode} {img.width}x{img.height}")
-            # Resize if too large (max 1920x1080)
-            if img.width > 1920 or img.height > 1080:
-                print(f"🔄 Resizing image from {img.width}x{img.height} to max 1920x1080")
-                img.thumbnail((1920, 1080), Image.Resampling.LANCZOS)
-                img.save(file_path, quality=85, optimize=True)
-                print(f"✅ Image resized and saved")
-            else:
-                print(f"✅ Image size OK, no resizing needed")
-        
-        # Return image info
-        return ImageUploadResponse(
-            image_id=image_id,
-            filename=filename,
-            url=f"/uploads/{filename}",
-            placeholder_type=placeholder_type
-        )
+        import tempfile
+        
+        # Uploads are processed in a local scratch directory and then put in storage
+        with tempfile.TemporaryDirectory() as work_dir:
+            raw_path, source_sha256 = await _receive_upload(file, work_dir)
+            return await asyncio.to_thread(
+                _store_upload, raw_path, source_sha256, work_dir, placeholder_type, current_user["id"]
+            )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Feil ved bildeopplasting: {str(e)}")
 
+@app.post("/upload-images", response_model=BatchImageUploadResponse)
+async def upload_images(
+    files: List[UploadFile] = File(...),
+    placeholder_types: List[str] = Form(...),
+    current_user: dict = Depends(auth.get_current_user)
+):
+    """
+    Upload several images in one request. Files are streamed to disk one after another and then
+    resized, transcoded and stored in parallel. Returns one result per file, in order; a failing
+    file does not fail the others.
+    
+    placeholder_types has one entry per file, or a single entry used for all files.
+    """
+    import tempfile
+    
+    if len(files) > image_processing.MAX_BATCH_UPLOAD_FILES:
+        raise HTTPException(status_code=400, detail=f"For mange filer (maks {image_processing.MAX_BATCH_UPLOAD_FILES})")
+    if len(placeholder_types) not in (1, len(files)):
+        raise HTTPException(status_code=400, detail="Antall placeholder_types må være 1 eller lik antall filer")
+    if len(placeholder_types) == 1:
+        placeholder_types = placeholder_types * len(files)
+    
+    semaphore = asyncio.Semaphore(image_processing.UPLOAD_BATCH_WORKERS)
+    
+    async def process(file: UploadFile, placeholder_type: str, received):
+        if isinstance(received, HTTPException):
+            return BatchImageUploadResult(filename=file.filename, status_code=received.status_code, error=received.detail)
+        async with semaphore:
+            try:
+                image = await asyncio.to_thread(_store_upload, *received, work_dir, placeholder_type, current_user["id"])
+                return BatchImageUploadResult(filename=file.filename, status_code=200, image=image)
+            except HTTPException as e:
+                return BatchImageUploadResult(filename=file.filename, status_code=e.status_code, error=e.detail)
+            except Exception as e:
+                print(f"❌ Batch upload error for {file.filename}: {e}")
+                return BatchImageUploadResult(filename=file.filename, status_code=500,
+                                              error=f"Feil ved bildeopplasting: {str(e)}")
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        received_files = []
+        for file in files:
+            try:
+                received_files.append(await _receive_upload(file, work_dir))
+            except HTTPException as e:
+                received_files.append(e)
+        
+        results = await asyncio.gather(*(
+            process(file, placeholder_type, received)
+            for file, placeholder_type, received in zip(files, placeholder_types, received_files)
+        ))
+    
+    print(f"📦 Batch upload: {sum(r.status_code == 200 for r in results)}/{len(results)} images stored")
+    return BatchImageUploadResponse(results=results)
+
+def _signed_pdf_url(pdf_key: str) -> Dict[str, Any]:
+    """Signed, expiring URL of a stored PDF"""
+    signed = auth.sign_download_url(f"/{pdf_key}")
+    return {"pdf_url": signed["url"], "pdf_url_expires_at": datetime.fromtimestamp(signed["expires"])}
+
+def _inline_pdf_response(http_request: Request, pdf_key: str, project_id: str, cached: bool):
+    """Return a stored project description PDF in the response body, with its metadata in headers"""
+    response = http_cache.cached_storage_response(
+        http_request,
+        pdf_key,
+        private=True,
+        media_type='application/pdf',
+        headers={
+            "Content-Disposition": f"inline; filename={os.path.basename(pdf_key)}",
+            "X-PDF-URL": _signed_pdf_url(pdf_key)["pdf_url"],
+            "X-Project-Id": project_id,
+            "X-Cached": "true" if cached else "false",
+            "Access-Control-Expose-Headers": "Content-Disposition, X-PDF-URL, X-Project-Id, X-Cached"
+        }
+    )
+    if response is None:
+        raise HTTPException(status_code=404, detail="PDF ikke funnet")
+    return response
+
+def _record_project_description(current_user: dict, request: ProjectDescriptionRequest, project_id: str,
+                                 inline: bool, byte_size: int, timings: dict, started: float, cache_hit: bool):
+    """Queue the usage event of a project description"""
+    usage_log.record(
+        "project_description", current_user["id"], project_id,
+        options={"project_type": request.project_type, "language": request.language,
+                 "images": len(request.images), "inline": inline},
+        byte_size=byte_size,
+        timings=timings,
+        duration_ms=(time.perf_counter() - started) * 1000,
+        cache_hit=cache_hit
+    )
+
 @app.post("/generate-project-description", response_model=ProjectDescriptionResponse)
-async def generate_project_description_pdf(
+def generate_project_description_pdf(
     request: ProjectDescriptionRequest,
+    http_request: Request,
+    inline: bool = False,
     current_user: dict = Depends(auth.get_current_user)
 ):
-    """Generate PDF project description with images and AI content"""
+    """
+    Generate PDF project description with images and AI content.
+    With ?inline=true the PDF itself is returned (URL and project id in X-PDF-URL / X-Project-Id),
+    saving the separate /downloads request.
+    """
+    started = time.perf_counter()
+    timings = {}
     try:
         from write_to_pdf import generate_project_description_pdf as generate_pdf
-        import uuid
-        import os
         
-        project_id = str(uuid.uuid4())
+        # Identical requests (same content and same image bytes) reuse the earlier render
+        project_id = render_cache.project_description_key(request)
+        cached_pdf = render_cache.get_cached_pdf(project_id)
+        timings["cache_lookup"] = round((time.perf_counter() - started) * 1000, 1)
+        if cached_pdf:
+            print(f"♻️ Render cache hit for project: {request.project_name} ({project_id[:12]})")
+            janitor.mark_accessed(cached_pdf["key"])
+            for image in request.images:
+                janitor.mark_accessed(upload_store.upload_key(image.filename))
+            _record_project_description(current_user, request, project_id, inline, cached_pdf["size"],
+                                        timings, started, cache_hit=True)
+            if inline:
+                return _inline_pdf_response(http_request, cached_pdf["key"], project_id, cached=True)
+            return ProjectDescriptionResponse(
+                **_signed_pdf_url(cached_pdf["key"]),
+                project_id=project_id,
+                created_at=datetime.fromtimestamp(cached_pdf["modified"]),
+                cached=True
+            )
         
         print(f"📄 Generating PDF for project: {request.project_name}")
         print(f"📊 Content sections: {len(request.generated_content.dict())}")
@@ -552,76 +857,155 @@ async def generate_project_description_pdf(
         for i, img in enumerate(request.images):
             print(f"  🖼️ Image {i+1}: {img.filename} ({img.placeholder_type}) - {img.url}")
         
-        # Generate PDF using the new function
-        pdf_buffer = generate_pdf(
-            project_type=request.project_type,
-            project_name=request.project_name,
-            generated_content=request.generated_content.dict(),
-            images=request.images,
-            language=request.language
-        )
-        
-        # Create downloads directory if it doesn't exist
-        download_dir = "downloads"
-        os.makedirs(download_dir, exist_ok=True)
-        
-        # Save PDF to file
-        pdf_filename = f"{project_id}.pdf"
-        pdf_path = os.path.join(download_dir, pdf_filename)
-        
-        with open(pdf_path, "wb") as f:
-            f.write(pdf_buffer.getvalue())
+        # Render straight into a temp file that is moved into storage under its content key
+        pdf_key = render_cache.cached_pdf_key(project_id)
+        with render_cache.pdf_writer(project_id) as pdf_path:
+            generate_pdf(
+                project_type=request.project_type,
+                project_name=request.project_name,
+                generated_content=request.generated_content.dict(),
+                images=request.images,
+                language=request.language,
+                output=pdf_path,
+                timings=timings
+            )
+            pdf_size = os.path.getsize(pdf_path)
         
-        print(f"✅ PDF saved to: {pdf_path}")
-        print(f"📏 File size: {os.path.getsize(pdf_path)} bytes")
+        print(f"✅ PDF saved to: {pdf_key}")
+        print(f"📏 File size: {pdf_size} bytes")
+        _record_project_description(current_user, request, project_id, inline, pdf_size,
+                                    timings, started, cache_hit=False)
         
+        if inline:
+            return _inline_pdf_response(http_request, pdf_key, project_id, cached=False)
         return ProjectDescriptionResponse(
-            pdf_url=f"/downloads/{pdf_filename}",
+            **_signed_pdf_url(pdf_key),
             project_id=project_id,
             created_at=datetime.now()
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ PDF generation error: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Feil ved PDF-generering: {str(e)}")
 
+@app.post("/project-description/layout", response_model=ProjectDescriptionLayout)
+def project_description_layout(
+    request: ProjectDescriptionRequest,
+    current_user: dict = Depends(auth.get_current_user)
+):
+    """Compute frames, crops and text positions of a project description without rendering it"""
+    try:
+        from write_to_pdf import generate_project_description_pdf as generate_pdf
+        
+        return generate_pdf(
+            project_type=request.project_type,
+            project_name=request.project_name,
+            generated_content=request.generated_content.dict(),
+            images=request.images,
+            language=request.language,
+            dry_run=True
+        )
+    except Exception as e:
+        print(f"❌ Layout error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Feil ved beregning av layout: {str(e)}")
+
 # Serve uploaded files
 @app.get("/uploads/{filename}")
-async def serve_upload(filename: str):
-    """Serve uploaded images"""
+def serve_upload(
+    request: Request,
+    filename: str,
+    size: Literal["thumb", "preview", "master"] = "master",
+    accept: str = Header("")
+):
+    """Serve uploaded images, resized to the requested rendition and as WebP when the browser accepts it"""
     import os
-    file_path = os.path.join("uploads", filename)
-    if os.path.exists(file_path):
-        return FileResponse(file_path)
-    raise HTTPException(status_code=404, detail="Fil ikke funnet")
+    backend = storage.get_storage()
+    file_key = f"uploads/{filename}"
+    if not backend.exists(file_key):
+        raise HTTPException(status_code=404, detail="Fil ikke funnet")
+    
+    webp = "image/webp" in accept
+    rendition_key = image_processing.rendition_key(filename, size, webp)
+    if not backend.exists(rendition_key):
+        # Renditions are created at upload time; older uploads get them on first request
+        try:
+            rendition_key = image_processing.create_rendition(filename, size, webp) or file_key
+        except Exception as e:
+            print(f"⚠️ Could not create {size} rendition of {filename}: {e}")
+            rendition_key = file_key
+    janitor.mark_accessed(rendition_key)
+    if rendition_key != file_key:
+        janitor.mark_accessed(file_key)
+    
+    # Renditions of content-addressed images are named after the content hash as well
+    etag = None
+    if http_cache.is_content_addressed(filename):
+        etag = f'"{os.path.basename(rendition_key)}"'
+    response = http_cache.cached_storage_response(request, rendition_key, etag=etag, headers={"Vary": "Accept"})
+    if response is None:
+        raise HTTPException(status_code=404, detail="Fil ikke funnet")
+    return response
 
 # Serve downloaded PDFs
 @app.get("/downloads/{filename}")
-async def serve_download(
+def serve_download(
+    request: Request,
     filename: str,
-    current_user: dict = Depends(auth.get_current_user)
+    expires: Optional[int] = None,
+    signature: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(auth.optional_security)
 ):
-    """Serve generated PDFs (requires authentication)"""
-    import os
-    file_path = os.path.join("downloads", filename)
+    """
+    Serve generated PDFs.
+
+    Signed URLs (?expires=...&signature=..., as returned by /generate-project-description) are
+    verified without touching the database and may be cached publicly until they expire.
+    Unsigned requests require authentication; the bearer token is only checked for those, so
+    a signed URL works even when the client sends an expired token along.
+    """
+    file_key = f"downloads/{filename}"
+    signed = expires is not None and signature is not None
+    current_user = None
+    if signed:
+        if not auth.verify_download_signature(f"/{file_key}", expires, signature):
+            raise HTTPException(status_code=403, detail="Nedlastingslenken er ugyldig eller utløpt")
+    else:
+        current_user = auth.get_optional_user(credentials)
+    if not signed and current_user is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
     
-    if not os.path.exists(file_path):
+    backend = storage.get_storage()
+    stat = backend.stat(file_key)
+    if stat is None:
         raise HTTPException(status_code=404, detail="PDF ikke funnet")
     
     # Check file size
-    file_size = os.path.getsize(file_path)
+    file_size = stat["size"]
     if file_size == 0:
         raise HTTPException(status_code=500, detail="PDF-fil er tom")
     
-    print(f"📥 Serving PDF: {filename} (size: {file_size} bytes) for user: {current_user.get('email')}")
+    requested_by = "signed URL" if signed else current_user.get('email')
+    print(f"📥 Serving PDF: {filename} (size: {file_size} bytes) for: {requested_by}")
+    janitor.mark_accessed(file_key)
     
-    return FileResponse(
-        file_path, 
-        media_type='application/pdf', 
-        filename=filename,
+    response = http_cache.cached_storage_response(
+        request,
+        file_key,
+        private=not signed,
+        max_age=max(0, int(expires - time.time())) if signed else None,
+        media_type='application/pdf',
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
+    if response is None:
+        raise HTTPException(status_code=404, detail="PDF ikke funnet")
+    return response
 
 # Root endpoint (shows login form)
 @app.get("/", response_class=HTMLResponse)
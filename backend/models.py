@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Literal
+from typing import Optional, List, Literal, Dict, Any
 from datetime import datetime
 
 # Authentication models
@@ -41,6 +41,10 @@ class UserResponse(BaseModel):
 class UserListResponse(BaseModel):
     users: List[UserResponse]
 
+class UserPageResponse(BaseModel):
+    users: List[Dict[str, Any]]  # only the requested columns
+    next_cursor: Optional[str] = None  # pass as ?cursor= for the next page; None on the last page
+
 # Rate limiting models
 class RateLimitInfo(BaseModel):
     endpoint: str
@@ -90,6 +94,15 @@ class ImageUploadResponse(BaseModel):
     url: str
     placeholder_type: str
 
+class BatchImageUploadResult(BaseModel):
+    filename: Optional[str] = None
+    status_code: int
+    image: Optional[ImageUploadResponse] = None
+    error: Optional[str] = None
+
+class BatchImageUploadResponse(BaseModel):
+    results: List[BatchImageUploadResult]
+
 class ProjectDescriptionRequest(BaseModel):
     project_type: str
     project_name: str
@@ -98,6 +111,74 @@ class ProjectDescriptionRequest(BaseModel):
     language: Literal["NO", "EN"] = "NO"
 
 class ProjectDescriptionResponse(BaseModel):
-    pdf_url: str
+    pdf_url: str  # Signed, works without an Authorization header until pdf_url_expires_at
+    pdf_url_expires_at: Optional[datetime] = None
     project_id: str
     created_at: datetime
+    cached: bool = False
+
+class LayoutRect(BaseModel):
+    x: float
+    y: float
+    width: float
+    height: float
+
+class LayoutSize(BaseModel):
+    width: float
+    height: float
+
+class LayoutFrame(BaseModel):
+    role: Literal["logo", "left", "right", "single"]
+    image_id: str
+    filename: str
+    placeholder_type: str
+    frame: LayoutRect
+    image: Optional[LayoutRect] = None
+    crop: Optional[LayoutRect] = None
+    scale: Optional[float] = None
+    source_size: Optional[LayoutSize] = None
+    missing: bool = False
+
+class LayoutText(BaseModel):
+    role: str
+    text: str
+    x: float
+    y: float
+    font: str
+    size: float
+    color: Optional[List[float]] = None
+
+class ProjectDescriptionLayout(BaseModel):
+    page: LayoutSize
+    frames: List[LayoutFrame]
+    texts: List[LayoutText]
+    lea_logo: LayoutRect
+
+class UsageStats(BaseModel):
+    events: int
+    cache_hits: int
+    cache_hit_rate: Optional[float] = None
+    bytes: int
+    avg_duration_ms: Optional[float] = None
+    render_ms: Dict[str, Optional[float]]  # render time percentiles of cache misses (p50, p90, p99)
+
+class UsageBucket(UsageStats):
+    bucket_start: datetime  # UTC
+    generator: str
+
+class UsageTotal(UsageStats):
+    generator: str
+
+class UserUsage(BaseModel):
+    bucket_start: datetime  # UTC
+    user_id: Optional[int] = None
+    generator: str
+    events: int
+
+class UsageResponse(BaseModel):
+    period: Literal["hour", "day"]
+    since: datetime
+    buckets: List[UsageBucket]
+    totals: List[UsageTotal]
+    users: List[UserUsage]
+    log: Dict[str, Any]  # usage log buffer counters of this process
@@ -0,0 +1,124 @@
+# Shared cache of encoded PDF image streams
+# Images are embedded as XObjects named by content hash: every use of the same image inside
+# one PDF references a single object, and the encoded stream (DCT passthrough for JPEG,
+# Flate + soft mask for transparent PNG) is reused across renders instead of re-encoded.
+import os
+import threading
+from collections import OrderedDict
+from reportlab.pdfbase import pdfdoc
+
+# Upper bound for encoded image data kept in memory (per process)
+MAX_CACHE_BYTES = int(os.getenv("IMAGE_STREAM_CACHE_MB", "256")) * 1024 * 1024
+
+# ReportLab internals draw_image relies on (checked, so an upgrade that renames them falls back
+# to c.drawImage instead of writing a broken PDF; requirements.txt pins the tested version)
+_CANVAS_INTERNALS = ("_setXObjects", "_code", "_formsinuse")
+_DOC_INTERNALS = ("getXObjectName", "idToObject", "Reference", "addForm")
+
+# Attributes of PDFImageXObject that make up an encoded image
+_ENCODED_FIELDS = ("width", "height", "bitsPerComponent", "colorSpace", "_filters",
+                   "streamContent", "mask", "_decode", "_dotrans")
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_lock = threading.Lock()
+
+
+def _encoded_fields(img_obj):
+    """Extract the encoded stream and its dictionary values from a PDFImageXObject"""
+    return {field: getattr(img_obj, field) for field in _ENCODED_FIELDS if hasattr(img_obj, field)}
+
+
+def _entry_size(entry):
+    size = len(entry["image"]["streamContent"])
+    if entry["smask"]:
+        size += len(entry["smask"]["streamContent"])
+    return size
+
+
+def get_encoded_image(content_hash: str, image_path: str, mask=None) -> dict:
+    """
+    Get the encoded PDF stream for an image, encoding it only on the first request.
+    Safe to call from worker threads; encoding happens outside the lock.
+    """
+    global _cache_bytes
+    key = (content_hash, str(mask))
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+            return entry
+
+    name = f"img{content_hash[:40]}{'m' if mask else ''}"
+    img_obj = pdfdoc.PDFImageXObject(name, image_path, mask=mask)
+    smask = getattr(img_obj, "_smask", None)
+    entry = {
+        "name": name,
+        "path": image_path,
+        "mask": mask,
+        "image": _encoded_fields(img_obj),
+        "smask": _encoded_fields(smask) if smask else None,
+    }
+
+    with _lock:
+        if key not in _cache:
+            _cache[key] = entry
+            _cache_bytes += _entry_size(entry)
+            while _cache_bytes > MAX_CACHE_BYTES and len(_cache) > 1:
+                _, evicted = _cache.popitem(last=False)
+                _cache_bytes -= _entry_size(evicted)
+        return _cache[key]
+
+
+def _build_xobject(name, fields):
+    """Create a PDFImageXObject for one document from cached encoded fields (no re-encoding)"""
+    img_obj = pdfdoc.PDFImageXObject(name)
+    for field, value in fields.items():
+        setattr(img_obj, field, value)
+    return img_obj
+
+
+def _supports_cached_xobjects(c) -> bool:
+    doc = getattr(c, "_doc", None)
+    return (all(hasattr(c, attr) for attr in _CANVAS_INTERNALS)
+            and all(hasattr(doc, attr) for attr in _DOC_INTERNALS))
+
+
+def draw_image(c, entry: dict, x, y, width, height):
+    """
+    Draw a cached image on the canvas.
+    The XObject is registered once per document under its content name and referenced from every use.
+    """
+    if not _supports_cached_xobjects(c):
+        c.drawImage(entry["path"], x, y, width, height, mask=entry["mask"])
+        return
+
+    name = entry["name"]
+    reg_name = c._doc.getXObjectName(name)
+    if not c._doc.idToObject.get(reg_name):
+        img_obj = _build_xobject(name, entry["image"])
+        c._setXObjects(img_obj)
+        c._doc.Reference(img_obj, reg_name)
+        c._doc.addForm(name, img_obj)
+        if entry["smask"]:
+            smask_name = f"{name}a"
+            smask_obj = _build_xobject(smask_name, entry["smask"])
+            c._setXObjects(smask_obj)
+            img_obj.smask = c._doc.Reference(smask_obj, c._doc.getXObjectName(smask_name))
+
+    c._currentPageHasImages = 1
+    c.saveState()
+    c.translate(x, y)
+    c.scale(width, height)
+    c._code.append(f"/{reg_name} Do")
+    c.restoreState()
+    # track what's been used on this page so it ends up in the page resources
+    c._formsinuse.append(name)
+
+
+def clear():
+    """Drop all cached image streams"""
+    global _cache_bytes
+    with _lock:
+        _cache.clear()
+        _cache_bytes = 0
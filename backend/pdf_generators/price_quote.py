@@ -3,6 +3,7 @@ from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import simpleSplit
 from io import BytesIO
+import time
 import from_google
 from .common import BASE_DIR, LOGO_PATH, _sanitize_filename, _extract_sheet_id
 
@@ -262,7 +263,8 @@ def _totals_block(c, language, total_excl_mva, total_incl_mva, mva, discount_per
     return y
 
 
-def generate_pdf(google_url: str, language: str, reise: str, mva: str, discount_percent: float = 0):
+def generate_pdf(google_url: str, language: str, reise: str, mva: str, discount_percent: float = 0,
+                 timings: dict = None):
     """
     Generate price quote PDF
     
@@ -272,6 +274,7 @@ def generate_pdf(google_url: str, language: str, reise: str, mva: str, discount_
         reise: 'y' eller 'n'
         mva: 'y' eller 'n'
         discount_percent: Rabatt i prosent (0-100), standard 0
+        timings: Optional dict that receives the duration of each stage in ms (fetch, render)
     
     Returns:
         Tuple of (BytesIO buffer, filename)
@@ -283,7 +286,9 @@ def generate_pdf(google_url: str, language: str, reise: str, mva: str, discount_
     sheet_id = _extract_sheet_id(google_url)
 
     # Hent data fra Google
+    started = time.perf_counter()
     data = from_google.fetch_google_data(SPREADSHEET_ID=sheet_id)
+    fetched = time.perf_counter()
     grouped_sums = data["grouped_sums"]
     total_days = data["total_days"]
     post_prod_days = data["post_prod_days"]
@@ -339,4 +344,7 @@ def generate_pdf(google_url: str, language: str, reise: str, mva: str, discount_
 
     c.save()
     buf.seek(0)
+    if timings is not None:
+        timings["fetch"] = round((fetched - started) * 1000, 1)
+        timings["render"] = round((time.perf_counter() - fetched) * 1000, 1)
     return buf, filename
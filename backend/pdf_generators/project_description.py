@@ -1,21 +1,36 @@
 # Project description PDF generation
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 import os
+import time
 from .common import BASE_DIR, LOGO_PATH
+from . import image_cache
+from image_processing import get_image_info, get_stored_image_info, image_mask, file_sha256
+import storage
 
+# Worker threads used to prepare the images of one document (PIL decoding releases the GIL)
+IMAGE_PREPARE_WORKERS = 4
 
-def _draw_fallback_subtitle(c, y_position, project_type, language, page_width):
-    """Draw fallback subtitle text when no customer logo is provided"""
-    c.setFont("Helvetica", 20)
-    subtitle = f"{project_type.upper()} PRODUKSJON 2025"
-    if language == "EN":
-        subtitle = f"{project_type.upper()} PRODUCTION 2025"
-    
-    subtitle_width = c.stringWidth(subtitle, "Helvetica", 20)
-    subtitle_x = (page_width - subtitle_width) / 2
-    c.drawString(subtitle_x, y_position, subtitle)
+# Use 1920x1080 format (16:9 ratio)
+PAGE_WIDTH = 1920
+PAGE_HEIGHT = 1080
+PAGE_MARGIN = 60
+
+# Customer logo frame (centered under the top margin)
+LOGO_WIDTH = 200
+LOGO_HEIGHT = 80
+
+# LEA FILMS logo (top right)
+LEA_LOGO_WIDTH = 100
+LEA_LOGO_HEIGHT = 50
+
+# Main images: same height, left 4:5 and right 5:4, 10px apart
+BASE_IMAGE_HEIGHT = 650
+IMAGE_SPACING = 10
+SINGLE_IMAGE_HEIGHT = 500
 
 
 def _draw_logo_placeholder(c, x, y, width, height):
@@ -24,7 +39,7 @@ def _draw_logo_placeholder(c, x, y, width, height):
     c.setStrokeColorRGB(1, 1, 1)  # White border
     c.setLineWidth(2)
     c.rect(x, y, width, height)
-    
+
     # Draw placeholder text
     c.setFillColorRGB(1, 1, 1)  # White text
     c.setFont("Helvetica", 12)
@@ -35,72 +50,339 @@ def _draw_logo_placeholder(c, x, y, width, height):
     c.drawString(text_x, text_y, placeholder_text)
 
 
-def _calculate_image_fit(image_path, target_width, target_height):
+def _draw_image_placeholder(c, frame, placeholder_type):
+    """Draw a grey box where an image could not be loaded"""
+    c.setFillColorRGB(0.9, 0.9, 0.9)
+    c.rect(frame["x"], frame["y"], frame["width"], frame["height"], fill=1)
+    if placeholder_type:
+        c.setFillColorRGB(0.5, 0.5, 0.5)
+        c.drawString(frame["x"] + 10, frame["y"] + frame["height"]/2, f"Image: {placeholder_type}")
+
+
+def _rect(x, y, width, height):
+    return {"x": x, "y": y, "width": width, "height": height}
+
+
+def _text(role, text, x, y, font, size, color=None):
+    return {"role": role, "text": text, "x": x, "y": y, "font": font, "size": size, "color": color}
+
+
+def _centered_text(role, text, y, font, size, color=None):
+    """Text item centered horizontally on the page"""
+    text_x = (PAGE_WIDTH - stringWidth(text, font, size)) / 2
+    return _text(role, text, text_x, y, font, size, color)
+
+
+def _fit_image_to_frame(img_width, img_height, frame, center_vertical=False):
+    """
+    Scale an image to fill a frame while preserving aspect ratio.
+    Wide images are scaled to the frame height, tall images to the frame width. The image is
+    anchored at the frame's bottom-left corner (tall images can optionally be centered vertically).
+
+    Returns the rectangle the image is drawn in, the scale factor and the crop rectangle:
+    the part of the source image (in pixels, top-left origin) that falls inside the frame.
+    """
+    img_ratio = img_width / img_height
+    target_ratio = frame["width"] / frame["height"]
+
+    if img_ratio > target_ratio:
+        # Image is wider - scale to fit height, then crop width
+        scale_factor = frame["height"] / img_height
+        placement = _rect(frame["x"], frame["y"], img_width * scale_factor, frame["height"])
+    else:
+        # Image is taller - scale to fit width, then crop height
+        scale_factor = frame["width"] / img_width
+        scaled_height = img_height * scale_factor
+        overflow = scaled_height - frame["height"]
+        offset_y = frame["y"] - overflow / 2 if center_vertical and overflow > 0 else frame["y"]
+        placement = _rect(frame["x"], offset_y, frame["width"], scaled_height)
+
+    # Visible part of the image inside the frame, mapped back to source pixels
+    visible_left = max(placement["x"], frame["x"])
+    visible_right = min(placement["x"] + placement["width"], frame["x"] + frame["width"])
+    visible_bottom = max(placement["y"], frame["y"])
+    visible_top = min(placement["y"] + placement["height"], frame["y"] + frame["height"])
+    crop = _rect(
+        (visible_left - placement["x"]) / scale_factor,
+        (placement["y"] + placement["height"] - visible_top) / scale_factor,
+        (visible_right - visible_left) / scale_factor,
+        (visible_top - visible_bottom) / scale_factor,
+    )
+    return placement, scale_factor, crop
+
+
+def _select_content_images(images):
+    """Pick the left and right main images, preferring images uploaded as "content" """
+    # Find content images (frontend uses "content" for main images)
+    content_images = [img for img in images if img.placeholder_type == "content"]
+    print(f"🔍 Found {len(content_images)} content images")
+    for i, img in enumerate(content_images):
+        print(f"  📸 Content image {i+1}: {img.filename} ({img.placeholder_type})")
+
+    if len(content_images) >= 2:
+        print(f"✅ Using content images: {content_images[0].filename} and {content_images[1].filename}")
+        return content_images[0], content_images[1]
+
+    # Fallback to first two non-logo images if no content images found
+    non_logo_images = [img for img in images if img.placeholder_type != "logo"]
+    print(f"🔍 Found {len(non_logo_images)} non-logo images for fallback")
+
+    if len(non_logo_images) >= 2:
+        print(f"⚠️ Fallback to non-logo images: {non_logo_images[0].filename} and {non_logo_images[1].filename}")
+        return non_logo_images[0], non_logo_images[1]
+    elif len(non_logo_images) == 1:
+        print(f"⚠️ Only one non-logo image available, using for both: {non_logo_images[0].filename}")
+        return non_logo_images[0], non_logo_images[0]  # Use same image for both
+
+    # No suitable images found, create placeholders
+    print(f"⚠️ No suitable images found, will show placeholders")
+    return None, None
+
+
+def _select_images(images):
+    """Decide which uploaded image goes in which frame (logo, left, right or single)"""
+    # Look for logo in images list
+    logo_image = None
+    print(f"🔍 Looking for logo among {len(images)} images:")
+    for i, img in enumerate(images):
+        print(f"  📸 Image {i+1}: {img.filename} ({img.placeholder_type})")
+        if img.placeholder_type == "logo":
+            logo_image = img
+            print(f"✅ Found logo: {img.filename}")
+            break
+
+    if logo_image:
+        print(f"🎯 Using logo: {logo_image.filename}")
+    else:
+        print("⚠️ No logo found, will use fallback text")
+
+    selection = {"logo": logo_image, "left": None, "right": None, "single": None}
+    if images and len(images) >= 2:
+        selection["left"], selection["right"] = _select_content_images(images)
+    elif images and len(images) == 1:
+        non_logo_images = [img for img in images if img.placeholder_type != "logo"]
+        if non_logo_images:
+            selection["single"] = non_logo_images[0]
+        else:
+            print("⚠️ Only logo image available, skipping single image display")
+    return selection
+
+
+def _prepare_image(filename):
     """
-    Calculate image dimensions to fit target area while preserving aspect ratio.
-    Returns (crop_x, crop_y, crop_width, crop_height, target_width, target_height).
+    Look up everything needed to draw an uploaded image.
+    Runs in a worker thread: fetching the file from storage (a no-op for local storage),
+    metadata lookup and fetching (or, on first use, encoding) the PDF image stream from the shared cache.
     """
+    backend = storage.get_storage()
+    image_path = backend.local_path(f"uploads/{filename}")
+    prepared = {"path": image_path, "exists": image_path is not None, "info": None, "xobject": None}
+    if not prepared["exists"]:
+        return prepared
+    # Keeps images used in documents from expiring (see janitor)
+    backend.touch(f"uploads/{filename}")
+
     try:
-        from PIL import Image
-        print(f"🔍 Opening image: {image_path}")
-        with Image.open(image_path) as img:
-            img_width, img_height = img.size
-            print(f"📏 Image dimensions: {img_width}x{img_height}")
-            print(f"🎯 Target dimensions: {target_width}x{target_height}")
-            
-            img_ratio = img_width / img_height
-            target_ratio = target_width / target_height
-            print(f"📐 Image ratio: {img_ratio:.2f}, Target ratio: {target_ratio:.2f}")
-            
-            if img_ratio > target_ratio:
-                # Image is wider than target - fit to height and crop width
-                # Scale image to fit target height, then crop width
-                scale_factor = target_height / img_height
-                scaled_width = img_width * scale_factor
-                scaled_height = target_height
-                
-                # Calculate how much to crop from left and right
-                crop_amount = (scaled_width - target_width) / 2
-                crop_x = crop_amount / scale_factor
-                crop_width = target_width / scale_factor
-                
-                result = (crop_x, 0, crop_width, img_height, target_width, target_height)
-                print(f"✂️ Wide image - Crop: x={crop_x:.1f}, y=0, w={crop_width:.1f}, h={img_height}")
-                return result
-            else:
-                # Image is taller than target - fit to width and crop height
-                # Scale image to fit target width, then crop height
-                scale_factor = target_width / img_width
-                scaled_width = target_width
-                scaled_height = img_height * scale_factor
-                
-                # Calculate how much to crop from top and bottom
-                crop_amount = (scaled_height - target_height) / 2
-                crop_y = crop_amount / scale_factor
-                crop_height = target_height / scale_factor
-                
-                result = (0, crop_y, img_width, crop_height, target_width, target_height)
-                print(f"✂️ Tall image - Crop: x=0, y={crop_y:.1f}, w={img_width}, h={crop_height:.1f}")
-                return result
-    except ImportError as e:
-        print(f"⚠️ PIL not available: {e}")
-        # PIL not available, fallback to simple centering
-        return (0, 0, target_width, target_height, target_width, target_height)
+        prepared["info"] = get_image_info(image_path)
+        content_hash = prepared["info"].get("sha256") or file_sha256(image_path)
+        prepared["xobject"] = image_cache.get_encoded_image(content_hash, image_path, image_mask(prepared["info"]))
     except Exception as e:
-        print(f"❌ Error in _calculate_image_fit: {e}")
-        # Any error, fallback to simple centering
-        return (0, 0, target_width, target_height, target_width, target_height)
+        print(f"⚠️ Could not prepare image {filename}: {e}")
+    return prepared
 
 
-def _draw_project_text(c, project_text, logo_y, page_width):
-    """Draw project text under logo with consistent styling"""
-    c.setFont("Helvetica", 32)
-    c.setFillColorRGB(1, 1, 1)  # White text
-    project_text_width = c.stringWidth(project_text, "Helvetica", 32)
-    project_text_x = (page_width - project_text_width) / 2
-    project_text_y = logo_y - 80  # Plassering kan endres her
-    c.drawString(project_text_x, project_text_y, project_text)
-    return project_text_y
+def _prepare_images(images):
+    """Prepare all distinct images of a document concurrently, keyed by filename"""
+    filenames = list(dict.fromkeys(img.filename for img in images if img is not None))
+    if not filenames:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(IMAGE_PREPARE_WORKERS, len(filenames))) as executor:
+        return dict(zip(filenames, executor.map(_prepare_image, filenames)))
+
+
+def _image_frame(role, image, frame, info, center_vertical=False):
+    """Layout entry for one image frame"""
+    entry = {
+        "role": role,
+        "image_id": image.image_id,
+        "filename": image.filename,
+        "placeholder_type": image.placeholder_type,
+        "frame": frame,
+        "image": None,
+        "crop": None,
+        "scale": None,
+        "source_size": None,
+        "missing": info is None,
+    }
+    if info:
+        placement, scale_factor, crop = _fit_image_to_frame(info["width"], info["height"], frame, center_vertical)
+        entry.update(image=placement, crop=crop, scale=scale_factor,
+                     source_size={"width": info["width"], "height": info["height"]})
+    return entry
+
+
+def compute_project_description_layout(
+    project_type: str,
+    generated_content: dict,
+    images: list,
+    project_text: str = "Content Production 25",
+    language: str = "NO",
+    image_info: dict = None,
+    selection: dict = None
+) -> dict:
+    """
+    Compute the geometry of the project description's first page.
+
+    Only image metadata (dimensions) is needed, no pixel data and no canvas. Coordinates are
+    PDF points with the origin in the bottom-left corner of the 1920x1080 page.
+
+    Args:
+        image_info: Optional mapping of filename to image metadata; looked up from the
+            metadata index when not given. Missing images map to None.
+        selection: Optional result of _select_images, to avoid selecting twice
+    """
+    if selection is None:
+        selection = _select_images(images)
+    if image_info is None:
+        image_info = {}
+        for image in selection.values():
+            if image is not None and image.filename not in image_info:
+                image_info[image.filename] = get_stored_image_info(image.filename)
+
+    top_margin = PAGE_HEIGHT - PAGE_MARGIN
+    frames = []
+    texts = []
+
+    # Header section - BILLABONG style, customer logo replaces main title and subtitle
+    y_position = top_margin - 40 - 20
+
+    logo_image = selection["logo"]
+    if logo_image:
+        # Customer logo (centered, reasonable size) with project text under it
+        logo_frame = _rect((PAGE_WIDTH - LOGO_WIDTH) / 2, y_position - LOGO_HEIGHT, LOGO_WIDTH, LOGO_HEIGHT)
+        frames.append(_image_frame("logo", logo_image, logo_frame, image_info.get(logo_image.filename)))
+        project_text_y = logo_frame["y"] - 80  # Plassering kan endres her
+        texts.append(_centered_text("project_text", project_text, project_text_y, "Helvetica", 32, (1, 1, 1)))
+        y_position = project_text_y - 40  # Mer plass til neste element
+    else:
+        # No logo in images, show fallback subtitle
+        subtitle = f"{project_type.upper()} PRODUKSJON 2025"
+        if language == "EN":
+            subtitle = f"{project_type.upper()} PRODUCTION 2025"
+        texts.append(_centered_text("subtitle", subtitle, y_position, "Helvetica", 20))
+
+    y_position -= 620  # Reduced space after logo
+
+    # LEA FILMS logo (top right)
+    lea_logo = _rect(PAGE_WIDTH - LEA_LOGO_WIDTH - 60, top_margin - LEA_LOGO_HEIGHT, LEA_LOGO_WIDTH, LEA_LOGO_HEIGHT)
+
+    # Main content area - Two large images side by side (like BILLABONG slide)
+    content_start_y = y_position
+    left_image, right_image, single_image = selection["left"], selection["right"], selection["single"]
+
+    if left_image and right_image:
+        # Left image: 4:5 ratio (høyere enn bredt), right image: 5:4 ratio (bredere enn høyt)
+        left_image_width = (BASE_IMAGE_HEIGHT * 4) / 5
+        right_image_width = (BASE_IMAGE_HEIGHT * 5) / 4
+
+        # Center both images on the page
+        total_images_width = left_image_width + IMAGE_SPACING + right_image_width
+        start_x = (PAGE_WIDTH - total_images_width) / 2
+
+        left_frame = _rect(start_x, content_start_y, left_image_width, BASE_IMAGE_HEIGHT)
+        right_frame = _rect(start_x + left_image_width + IMAGE_SPACING, content_start_y, right_image_width, BASE_IMAGE_HEIGHT)
+        frames.append(_image_frame("left", left_image, left_frame, image_info.get(left_image.filename)))
+        frames.append(_image_frame("right", right_image, right_frame, image_info.get(right_image.filename)))
+        y_position = content_start_y - BASE_IMAGE_HEIGHT - 60
+    elif single_image:
+        # Single image - center it (4:5 ratio)
+        image_width = (SINGLE_IMAGE_HEIGHT * 4) / 5
+        single_frame = _rect((PAGE_WIDTH - image_width) / 2, content_start_y, image_width, SINGLE_IMAGE_HEIGHT)
+        frames.append(_image_frame("single", single_image, single_frame, image_info.get(single_image.filename),
+                                   center_vertical=True))
+        y_position = content_start_y - SINGLE_IMAGE_HEIGHT - 60
+    else:
+        # No images, add content sections
+        y_position = content_start_y - 100
+
+    # Content sections below images (if space allows)
+    if y_position > 200:
+        content_sections = [
+            ("Mål", generated_content.get("goals", "")),
+            ("Konsept", generated_content.get("concept", ""))
+        ]
+
+        for section_title, content in content_sections:
+            if y_position < 150:
+                break
+
+            texts.append(_text("section_title", section_title, PAGE_MARGIN, y_position, "Helvetica-Bold", 16, (1, 1, 1)))
+            y_position -= 25
+
+            # Section content (truncated for space)
+            content_preview = content[:80] + "..." if len(content) > 80 else content
+            texts.append(_text("section_body", content_preview, PAGE_MARGIN, y_position, "Helvetica", 11, (1, 1, 1)))
+            y_position -= 40
+
+    # Footer with website
+    texts.append(_centered_text("website", "www.leafilms.no", 30, "Helvetica", 20, (0.3, 0.3, 0.3)))
+
+    return {
+        "page": {"width": PAGE_WIDTH, "height": PAGE_HEIGHT},
+        "frames": frames,
+        "texts": texts,
+        "lea_logo": lea_logo,
+    }
+
+
+def _draw_text(c, item):
+    """Draw a text item from the layout"""
+    c.setFont(item["font"], item["size"])
+    if item["color"]:
+        c.setFillColorRGB(*item["color"])
+    c.drawString(item["x"], item["y"], item["text"])
+
+
+def _draw_frame(c, frame, prepared):
+    """Draw one image frame from the layout, falling back to placeholders"""
+    bounds = frame["frame"]
+    if frame["role"] == "logo":
+        print(f"🔍 Looking for logo at: {prepared['path']}")
+        print(f"📁 File exists: {prepared['exists']}")
+
+    if not prepared["exists"] or frame["missing"]:
+        if frame["role"] == "logo":
+            _draw_logo_placeholder(c, bounds["x"], bounds["y"], bounds["width"], bounds["height"])
+        else:
+            _draw_image_placeholder(c, bounds, frame["placeholder_type"])
+        return
+
+    try:
+        placement = frame["image"]
+        # Clip to the frame, so only the crop reported by the layout is visible
+        c.saveState()
+        clip = c.beginPath()
+        clip.rect(bounds["x"], bounds["y"], bounds["width"], bounds["height"])
+        c.clipPath(clip, stroke=0, fill=0)
+        try:
+            image_cache.draw_image(c, prepared["xobject"], placement["x"], placement["y"],
+                                   placement["width"], placement["height"])
+        finally:
+            c.restoreState()
+        print(f"✂️ {frame['role'].capitalize()} image scaled to fill frame: {placement['width']:.1f}x{placement['height']:.1f} "
+              f"at ({placement['x']:.1f}, {placement['y']:.1f})")
+    except Exception as e:
+        print(f"⚠️ {frame['role'].capitalize()} image scaling failed: {e}, using simple scaling")
+        try:
+            c.drawImage(prepared["path"], bounds["x"], bounds["y"], width=bounds["width"], height=bounds["height"],
+                        preserveAspectRatio=True, mask='auto')
+        except Exception as e:
+            print(f"Error loading {frame['role']} image: {e}")
+            if frame["role"] == "logo":
+                _draw_logo_placeholder(c, bounds["x"], bounds["y"], bounds["width"], bounds["height"])
+            else:
+                _draw_image_placeholder(c, bounds, None)
 
 
 def generate_project_description_pdf(
@@ -109,43 +391,53 @@ def generate_project_description_pdf(
     generated_content: dict,
     images: list,
     project_text: str = "Content Production 25",  # New parameter for project text under logo
-    language: str = "NO"
-) -> BytesIO:
-    # Check if PIL is available
-    try:
-        from PIL import Image
-        print("✅ PIL is available for image processing")
-    except ImportError as e:
-        print(f"⚠️ PIL not available: {e}")
-        print("⚠️ Images will use fallback scaling")
+    language: str = "NO",
+    dry_run: bool = False,
+    output=None,
+    timings: dict = None
+):
     """
     Generate a project description PDF with AI content and images
     Matches the professional InDesign presentation style with gradient background
-    
+
     Args:
         project_type: Type of project (event, advertising, product, branding)
         project_name: Name of the project
         generated_content: AI-generated content dictionary
         images: List of image objects with url and placeholder_type
         language: Language for the PDF (NO or EN)
-    
+        dry_run: Only compute the layout (frames, crops, scale factors and text positions)
+            from image metadata, without reading pixels or creating a canvas
+        output: File path or binary file object to write the PDF to instead of an in-memory buffer
+        timings: Optional dict that receives the duration of each stage in ms (prepare_images, layout, render)
+
     Returns:
-        BytesIO object containing the PDF
+        BytesIO object containing the PDF (or output, when given), or the layout dict when dry_run is set
     """
-    buffer = BytesIO()
-    
-    # Use 1920x1080 format (16:9 ratio)
-    page_width = 1920
-    page_height = 1080
-    
+    selection = _select_images(images)
+
+    if dry_run:
+        return compute_project_description_layout(project_type, generated_content, images, project_text,
+                                                  language, selection=selection)
+
+    # Metadata lookup and image encoding for every frame run concurrently before drawing starts
+    started = time.perf_counter()
+    prepared_images = _prepare_images(list(selection.values()))
+    prepared_at = time.perf_counter()
+    layout = compute_project_description_layout(
+        project_type, generated_content, images, project_text, language,
+        image_info={filename: prepared["info"] for filename, prepared in prepared_images.items()},
+        selection=selection
+    )
+    laid_out_at = time.perf_counter()
+
+    buffer = output if output is not None else BytesIO()
+
+    page_width = PAGE_WIDTH
+    page_height = PAGE_HEIGHT
+
     c = canvas.Canvas(buffer, pagesize=(page_width, page_height))
-    
-    # Page dimensions for landscape
-    left_margin = 60
-    right_margin = page_width - 60
-    top_margin = page_height - 60
-    content_width = right_margin - left_margin
-    
+
     # Add paper texture as base layer (under gradient background)
     paper_texture_paths = [
         os.path.join(BASE_DIR, "assets", "backgrounds", "texture_papir.jpg"),
@@ -158,13 +450,13 @@ def generate_project_description_pdf(
         os.path.join(BASE_DIR, "assets", "backgrounds", "texture.jpg"),
         os.path.join(BASE_DIR, "assets", "backgrounds", "texture.png")
     ]
-    
+
     paper_texture_path = None
     for path in paper_texture_paths:
         if os.path.exists(path):
             paper_texture_path = path
             break
-    
+
     # Draw paper texture first (base layer) - covers entire page
     if paper_texture_path:
         c.drawImage(paper_texture_path, 0, 0, width=page_width, height=page_height)
@@ -174,7 +466,7 @@ def generate_project_description_pdf(
         # Fallback: solid paper-like color
         c.setFillColorRGB(0.95, 0.95, 0.93)  # Light paper color
         c.rect(0, 0, page_width, page_height, fill=1)
-    
+
     # Add gradient background image on top (with transparency effect)
     background_paths = [
         os.path.join(BASE_DIR, "assets", "backgrounds", "Grainy Gradient Background 10.jpg"),
@@ -182,7 +474,7 @@ def generate_project_description_pdf(
         os.path.join(BASE_DIR, "assets", "backgrounds", "gradient_background.jpg"),
         os.path.join(BASE_DIR, "assets", "backgrounds", "gradient_background.png")
     ]
-    
+
     # Check if PSD file exists and warn user
     psd_path = os.path.join(BASE_DIR, "assets", "backgrounds", "Grainy Gradient Background 10.psd")
     if os.path.exists(psd_path):
@@ -190,13 +482,13 @@ def generate_project_description_pdf(
         print(f"   Found: {psd_path}")
         print("   Convert to: assets/backgrounds/Grainy Gradient Background 10.jpg")
         print("   Or use: assets/backgrounds/Grainy Gradient Background 10.png")
-    
+
     background_path = None
     for path in background_paths:
         if os.path.exists(path):
             background_path = path
             break
-    
+
     if background_path:
         # Draw gradient background with semi-transparency effect
         # Create a semi-transparent overlay effect
@@ -204,7 +496,7 @@ def generate_project_description_pdf(
         c.setFillColorRGB(1, 1, 1, 0.7)  # White with 70% opacity
         c.rect(0, 0, page_width, page_height, fill=1)
         c.restoreState()
-        
+
         # Draw gradient background with 15pt margin
         margin = 20
         c.drawImage(background_path, margin, margin, width=page_width-2*margin, height=page_height-2*margin)
@@ -214,7 +506,7 @@ def generate_project_description_pdf(
         print("⚠️ No supported background image found, using fallback gradient")
         print("💡 Supported formats: JPG, PNG, GIF, TIFF")
         print("💡 PSD files must be converted to JPG or PNG")
-        
+
         # Semi-transparent gradient overlay
         c.saveState()
         c.setFillColorRGB(1, 0.6, 0.2, 0.6)  # Orange with 60% opacity
@@ -222,463 +514,35 @@ def generate_project_description_pdf(
         c.setFillColorRGB(0.2, 0.4, 0.8, 0.6)  # Blue with 60% opacity
         c.rect(page_width/2, 0, page_width/2, page_height, fill=1)
         c.restoreState()
-    
-    # Header section - BILLABONG style
-    y_position = top_margin - 40
-    
-    # Customer logo placeholder (replaces main title and subtitle)
-    y_position -= 20
-    
-    # Look for logo in images list
-    logo_image = None
-    print(f"🔍 Looking for logo among {len(images)} images:")
-    for i, img in enumerate(images):
-        print(f"  📸 Image {i+1}: {img.filename} ({img.placeholder_type})")
-        if img.placeholder_type == "logo":
-            logo_image = img
-            print(f"✅ Found logo: {img.filename}")
-            break
-    
-    if logo_image:
-        print(f"🎯 Using logo: {logo_image.filename}")
-    else:
-        print("⚠️ No logo found, will use fallback text")
-    
-    if logo_image:
-        # Draw customer logo (centered, reasonable size)
-        logo_width = 200
-        logo_height = 80
-        logo_x = (page_width - logo_width) / 2
-        logo_y = y_position - logo_height
-        
-        try:
-            logo_path = os.path.join(BASE_DIR, "uploads", logo_image.filename)
-            print(f"🔍 Looking for logo at: {logo_path}")
-            print(f"📁 File exists: {os.path.exists(logo_path)}")
-            if os.path.exists(logo_path):
-                print(f"📏 File size: {os.path.getsize(logo_path)} bytes")
-                # Calculate image fit to fill the logo area completely
-                print(f"🎨 Processing logo image: {logo_path}")
-                crop_result = _calculate_image_fit(logo_path, logo_width, logo_height)
-                print(f"📊 Crop result: {crop_result}")
-                
-                # Use PIL to calculate proper scaling without stretching
-                try:
-                    from PIL import Image
-                    with Image.open(logo_path) as img:
-                        img_width, img_height = img.size
-                        img_ratio = img_width / img_height
-                        target_ratio = logo_width / logo_height
-                        
-                        if img_ratio > target_ratio:
-                            # Image is wider - scale to fit height, then crop width
-                            scale_factor = logo_height / img_height
-                            scaled_width = img_width * scale_factor
-                            scaled_height = logo_height
-                            
-                            # Ensure the image stays within the frame bounds
-                            # Calculate how much extends beyond the frame
-                            overflow = scaled_width - logo_width
-                            if overflow > 0:
-                                # Crop from both sides equally
-                                offset_x = logo_x - overflow / 2
-                                # Ensure we don't go negative
-                                if offset_x < logo_x:
-                                    offset_x = logo_x
-                            else:
-                                offset_x = logo_x
-                            
-                            c.drawImage(logo_path, offset_x, logo_y, width=scaled_width, height=scaled_height)
-                            print(f"✂️ Logo - Wide image scaled to fill: {scaled_width:.1f}x{scaled_height}, offset_x: {offset_x:.1f}")
-                        else:
-                            # Image is taller - scale to fit width, then crop height
-                            scale_factor = logo_width / img_width
-                            scaled_width = logo_width
-                            scaled_height = img_height * scale_factor
-                            
-                            # Ensure the image stays within the frame bounds
-                            # Calculate how much extends beyond the frame
-                            overflow = scaled_height - logo_height
-                            if overflow > 0:
-                                # Crop from top and bottom equally
-                                offset_y = logo_y - overflow / 2
-                                # Ensure we don't go negative
-                                if offset_y < logo_y:
-                                    offset_y = logo_y
-                            else:
-                                offset_y = logo_y
-                            
-                            c.drawImage(logo_path, logo_x, offset_y, width=scaled_width, height=scaled_height)
-                            print(f"✂️ Logo - Tall image scaled to fill: {scaled_width:.1f}x{scaled_height}, offset_y: {offset_y:.1f}")
-                except Exception as e:
-                    print(f"⚠️ Logo scaling failed: {e}, using simple scaling")
-                    c.drawImage(logo_path, logo_x, logo_y, width=logo_width, height=logo_height, 
-                               preserveAspectRatio=True, mask='auto')
-                print(f"✅ Customer logo applied: {logo_path}")
-                
-                # Draw project text under the logo
-                project_text_y = _draw_project_text(c, project_text, logo_y, page_width)
-                y_position = project_text_y - 40  # Mer plass til neste element
-            else:
-                # Logo file not found, show placeholder
-                _draw_logo_placeholder(c, logo_x, logo_y, logo_width, logo_height)
-                
-                # Draw project text under the logo placeholder
-                project_text_y = _draw_project_text(c, project_text, logo_y, page_width)
-                y_position = project_text_y - 40  # Mer plass til neste element
-        except Exception as e:
-            print(f"Error loading logo: {e}")
-            _draw_logo_placeholder(c, logo_x, logo_y, logo_width, logo_height)
-            
-            # Draw project text under the logo placeholder
-            project_text_y = _draw_project_text(c, project_text, logo_y, page_width)
-            y_position = project_text_y - 40  # Mer plass til neste element
-    else:
-        # No logo in images, show fallback text
-        _draw_fallback_subtitle(c, y_position, project_type, language, page_width)
-    
-    y_position -= 620  # Reduced space after logo
-    
+
+    # Header text (project text under the logo, or fallback subtitle)
+    for item in layout["texts"]:
+        if item["role"] in ("project_text", "subtitle"):
+            _draw_text(c, item)
+
     # LEA FILMS logo (top right)
     if os.path.exists(LOGO_PATH):
-        logo_width = 100
-        logo_height = 50
-        c.drawImage(LOGO_PATH, page_width - logo_width - 60, top_margin - logo_height, 
-                   width=logo_width, height=logo_height, preserveAspectRatio=True, mask='auto')
-    
-    # Main content area - Two large images side by side (like BILLABONG slide)
-    content_start_y = y_position
-    
-    if images and len(images) >= 2:
-        # Calculate image dimensions with same height but different ratios
-        # Base height for both images (same height)
-        base_height = 650
-        
-        # Find content images (frontend uses "content" for main images)
-        content_images = [img for img in images if img.placeholder_type == "content"]
-        print(f"🔍 Found {len(content_images)} content images")
-        for i, img in enumerate(content_images):
-            print(f"  📸 Content image {i+1}: {img.filename} ({img.placeholder_type})")
-        
-        # Debug: Show all images and their types
-        print(f"🔍 ALL IMAGES RECEIVED:")
-        for i, img in enumerate(images):
-            print(f"  📸 Image {i+1}: {img.filename} (type: {img.placeholder_type})")
-        
-        if len(content_images) >= 2:
-            left_image = content_images[0]
-            right_image = content_images[1]
-            print(f"✅ Using content images: {left_image.filename} and {right_image.filename}")
-        else:
-            # Fallback to first two non-logo images if no content images found
-            non_logo_images = [img for img in images if img.placeholder_type != "logo"]
-            print(f"🔍 Found {len(non_logo_images)} non-logo images for fallback")
-            
-            if len(non_logo_images) >= 2:
-                left_image = non_logo_images[0]
-                right_image = non_logo_images[1]
-                print(f"⚠️ Fallback to non-logo images: {left_image.filename} and {right_image.filename}")
-            elif len(non_logo_images) == 1:
-                left_image = non_logo_images[0]
-                right_image = non_logo_images[0]  # Use same image for both
-                print(f"⚠️ Only one non-logo image available, using for both: {left_image.filename}")
-            else:
-                # No suitable images found, create placeholders
-                left_image = None
-                right_image = None
-                print(f"⚠️ No suitable images found, will show placeholders")
-        
-        if left_image and right_image:
-            print(f"🎯 Final selection - Left: {left_image.filename} ({left_image.placeholder_type}), Right: {right_image.filename} ({right_image.placeholder_type})")
-            
-            # Left image: 4:5 ratio (høyere enn bredt)
-            left_image_height = base_height
-            left_image_width = (left_image_height * 4) / 5  # 4:5 ratio
-            
-            # Right image: 5:4 ratio (bredere enn høyt) - same height as left
-            right_image_height = base_height  # Same height as left image
-            right_image_width = (right_image_height * 5) / 4  # 5:4 ratio
-        else:
-            print("⚠️ No suitable images for main content, skipping image drawing")
-            y_position = content_start_y - 100
-            return
-        
-        # Calculate total width of both images plus spacing (10px margin)
-        total_images_width = left_image_width + 10 + right_image_width
-        print(f"📏 Image dimensions - Left: {left_image_width:.1f}x{left_image_height}, Right: {right_image_width:.1f}x{right_image_height}")
-        print(f"📐 Total width with spacing: {total_images_width:.1f}")
-        
-        # Center both images on the page
-        start_x = (page_width - total_images_width) / 2
-        print(f"🎯 Page width: {page_width}, Start X: {start_x:.1f}")
-        
-        # Left image position
-        left_image_x = start_x
-        print(f"📍 Left image position: {left_image_x:.1f}")
-        
-        # Right image position
-        right_image_x = start_x + left_image_width + 10
-        print(f"📍 Right image position: {right_image_x:.1f}")
-        
-        # Debug: Show frame boundaries
-        print(f"🎯 FRAME BOUNDARIES:")
-        print(f"  📐 Left frame: x={left_image_x:.1f}, width={left_image_width:.1f}, right edge={left_image_x + left_image_width:.1f}")
-        print(f"  📐 Right frame: x={right_image_x:.1f}, width={right_image_width:.1f}, right edge={right_image_x + right_image_width:.1f}")
-        print(f"  📐 Page width: {page_width}, Total content width: {total_images_width:.1f}")
-        
-        # Draw images with white borders
-        c.setStrokeColorRGB(1, 1, 1)
-        c.setLineWidth(3)
-        
-        # Left image
-        try:
-            image_path = os.path.join(BASE_DIR, "uploads", left_image.filename)
-            if os.path.exists(image_path):
-                # White border removed - no more c.rect call
-                
-                # Use PIL to calculate proper scaling without stretching
-                try:
-                    from PIL import Image
-                    with Image.open(image_path) as img:
-                        img_width, img_height = img.size
-                        img_ratio = img_width / img_height
-                        target_ratio = left_image_width / left_image_height
-                        
-                        if img_ratio > target_ratio:
-                            # Image is wider - scale to fit height, then crop width
-                            scale_factor = left_image_height / img_height
-                            scaled_width = img_width * scale_factor
-                            scaled_height = left_image_height
-                            
-                            # Place image to fill the frame from left to right
-                            offset_x = left_image_x
-                            
-                            c.drawImage(image_path, offset_x, content_start_y, width=scaled_width, height=scaled_height)
-                            print(f"✂️ Left image - Wide image scaled to fill frame: {scaled_width:.1f}x{scaled_height}, offset_x: {offset_x:.1f}")
-                        else:
-                            # Image is taller - scale to fit width, then crop height
-                            scale_factor = left_image_width / img_width
-                            scaled_width = left_image_width
-                            scaled_height = img_height * scale_factor
-                            
-                            # Ensure the image stays within the frame bounds
-                            # Calculate how much extends beyond the frame
-                            overflow = scaled_height - left_image_height
-                            if overflow > 0:
-                                # Crop from top and bottom equally
-                                offset_y = content_start_y - overflow / 2
-                                # Ensure we don't go negative
-                                if offset_y < content_start_y:
-                                    offset_y = content_start_y
-                            else:
-                                offset_y = content_start_y
-                            
-                            c.drawImage(image_path, left_image_x, offset_y, width=scaled_width, height=scaled_height)
-                            print(f"✂️ Left image - Tall image scaled to fill frame: {scaled_width:.1f}x{scaled_height}, offset_y: {offset_y:.1f}")
-                except Exception as e:
-                    print(f"⚠️ Left image scaling failed: {e}, using simple scaling")
-                    c.drawImage(image_path, left_image_x, content_start_y, width=left_image_width, height=left_image_height, 
-                               preserveAspectRatio=True, mask='auto')
-            else:
-                # Placeholder
-                c.setFillColorRGB(0.9, 0.9, 0.9)
-                c.rect(left_image_x, content_start_y, left_image_width, left_image_height, fill=1)
-                c.setFillColorRGB(0.5, 0.5, 0.5)
-                c.drawString(left_image_x + 10, content_start_y + left_image_height/2, f"Image: {left_image.placeholder_type}")
-        except Exception as e:
-            print(f"Error loading left image: {e}")
-            c.setFillColorRGB(0.9, 0.9, 0.9)
-            c.rect(left_image_x, content_start_y, left_image_width, left_image_height, fill=1)
-        
-        # Right image
-        try:
-            image_path = os.path.join(BASE_DIR, "uploads", right_image.filename)
-            if os.path.exists(image_path):
-                # White border removed - no more c.rect call
-                
-                # Use PIL to calculate proper scaling without stretching
-                try:
-                    from PIL import Image
-                    with Image.open(image_path) as img:
-                        img_width, img_height = img.size
-                        img_ratio = img_width / img_height
-                        target_ratio = right_image_width / right_image_height
-                        
-                        if img_ratio > target_ratio:
-                            # Image is wider - scale to fit height, then crop width
-                            scale_factor = right_image_height / img_height
-                            scaled_width = img_width * scale_factor
-                            scaled_height = right_image_height
-                            
-                            # Place image to fill the frame from left to right
-                            offset_x = right_image_x
-                            print(f"🔍 Right image - Wide image fills frame:")
-                            print(f"  📏 scaled_width: {scaled_width:.1f}, frame_width: {right_image_width:.1f}")
-                            print(f"  📍 right_image_x: {right_image_x:.1f}, offset_x: {offset_x:.1f}")
-                            print(f"  ✂️ Image will be cropped on the right side")
-                            
-                            c.drawImage(image_path, offset_x, content_start_y, width=scaled_width, height=scaled_height)
-                            print(f"✂️ Right image - Wide image scaled to fill frame: {scaled_width:.1f}x{scaled_height}, offset_x: {offset_x:.1f}")
-                        else:
-                            # Image is taller - scale to fit width, then crop height
-                            scale_factor = right_image_width / img_width
-                            scaled_width = right_image_width
-                            scaled_height = img_height * scale_factor
-                            
-                            # Ensure the image stays within the frame bounds
-                            # Calculate how much extends beyond the frame
-                            overflow = scaled_height - right_image_height
-                            if overflow > 0:
-                                # Crop from top and bottom equally
-                                offset_y = content_start_y - overflow / 2
-                                # Ensure we don't go negative
-                                if offset_y < content_start_y:
-                                    offset_y = content_start_y
-                            else:
-                                offset_y = content_start_y
-                            
-                            c.drawImage(image_path, right_image_x, offset_y, width=scaled_width, height=scaled_height)
-                            print(f"✂️ Right image - Tall image scaled to fill frame: {scaled_width:.1f}x{scaled_height}, offset_y: {offset_y:.1f}")
-                except Exception as e:
-                    print(f"⚠️ Right image scaling failed: {e}, using simple scaling")
-                    c.drawImage(image_path, right_image_x, content_start_y, width=right_image_width, height=right_image_height, 
-                               preserveAspectRatio=True, mask='auto')
-            else:
-                # Placeholder
-                c.setFillColorRGB(0.9, 0.9, 0.9)
-                c.rect(right_image_x, content_start_y, right_image_width, right_image_height, fill=1)
-                c.setFillColorRGB(0.5, 0.5, 0.5)
-                c.drawString(right_image_x + 10, content_start_y + right_image_height/2, f"Image: {right_image.placeholder_type}")
-        except Exception as e:
-            print(f"Error loading right image: {e}")
-            c.setFillColorRGB(0.9, 0.9, 0.9)
-            c.rect(right_image_x, content_start_y, right_image_width, right_image_height, fill=1)
-        
-        y_position = content_start_y - right_image_height - 60
-    elif images and len(images) == 1:
-        # Single image - center it (but not logo)
-        non_logo_images = [img for img in images if img.placeholder_type != "logo"]
-        if non_logo_images:
-            single_image = non_logo_images[0]
-        else:
-            # Only logo image available, skip single image display
-            print("⚠️ Only logo image available, skipping single image display")
-            y_position = content_start_y - 100
-            return
-        image_height = 500
-        image_width = (image_height * 4) / 5  # 4:5 ratio
-        
-        image_x = (page_width - image_width) / 2
-        image_y = content_start_y
-        
-        # Draw image with white border
-        c.setStrokeColorRGB(1, 1, 1)
-        c.setLineWidth(3)
-        
-        try:
-            image_path = os.path.join(BASE_DIR, "uploads", single_image.filename)
-            if os.path.exists(image_path):
-                # White border removed - no more c.rect call
-                
-                # Use PIL to calculate proper scaling without stretching
-                try:
-                    from PIL import Image
-                    with Image.open(image_path) as img:
-                        img_width, img_height = img.size
-                        img_ratio = img_width / img_height
-                        target_ratio = image_width / image_height
-                        
-                        if img_ratio > target_ratio:
-                            # Image is wider - scale to fit height, then crop width
-                            scale_factor = image_height / img_height
-                            scaled_width = img_width * scale_factor
-                            scaled_height = image_height
-                            
-                            # Place image to fill the frame from left to right
-                            offset_x = image_x
-                            
-                            c.drawImage(image_path, offset_x, image_y, width=scaled_width, height=scaled_height)
-                            print(f"✂️ Single image - Wide image scaled to fill: {scaled_width:.1f}x{scaled_height}, offset_x: {offset_x:.1f}")
-                        else:
-                            # Image is taller - scale to fit width, then crop height
-                            scale_factor = image_width / img_width
-                            scaled_width = image_width
-                            scaled_height = img_height * scale_factor
-                            
-                            # Ensure the image stays within the frame bounds
-                            # Calculate how much extends beyond the frame
-                            overflow = scaled_height - image_height
-                            if overflow > 0:
-                                # Crop from top and bottom equally
-                                offset_y = image_y - overflow / 2
-                            else:
-                                offset_y = image_y
-                            
-                            c.drawImage(image_path, image_x, offset_y, width=scaled_width, height=scaled_height)
-                            print(f"✂️ Single image - Tall image scaled to fill: {scaled_width:.1f}x{scaled_height}, offset_y: {offset_y:.1f}")
-                except Exception as e:
-                    print(f"⚠️ Single image scaling failed: {e}, using simple scaling")
-                    c.drawImage(image_path, image_x, image_y, width=image_width, height=image_height, 
-                               preserveAspectRatio=True, mask='auto')
-            else:
-                # Placeholder
-                c.setFillColorRGB(0.9, 0.9, 0.9)
-                c.rect(image_x, image_y, image_width, image_height, fill=1)
-                c.setFillColorRGB(0.5, 0.5, 0.5)
-                c.drawString(image_x + 10, image_y + image_height/2, f"Image: {single_image.placeholder_type}")
-        except Exception as e:
-            print(f"Error loading single image: {e}")
-            c.setFillColorRGB(0.9, 0.9, 0.9)
-            c.rect(image_x, image_y, image_width, image_height, fill=1)
-        
-        y_position = content_start_y - image_height - 60
-    else:
-        # No images, add content sections
-        y_position = content_start_y - 100
-    
-    # Content sections below images (if space allows)
-    if y_position > 200:
-        # Add some key content points
-        c.setFont("Helvetica-Bold", 16)
-        c.setFillColorRGB(1, 1, 1)  # White text
-        
-        content_sections = [
-            ("Mål", generated_content.get("goals", "")),
-            ("Konsept", generated_content.get("concept", ""))
-        ]
-        
-        for section_title, content in content_sections:
-            if y_position < 150:
-                break
-                
-            # Section title
-            c.drawString(left_margin, y_position, section_title)
-            y_position -= 25
-            
-            # Section content (truncated for space)
-            c.setFont("Helvetica", 11)
-            content_preview = content[:80] + "..." if len(content) > 80 else content
-            c.drawString(left_margin, y_position, content_preview)
-            y_position -= 40
-    
-    # Footer with website and page number
-    c.setFillColorRGB(0.3, 0.3, 0.3)  # Darker gray color
-    website = "www.leafilms.no"
-    
-    # Set font and get exact width for proper centering
-    c.setFont("Helvetica", 20)
-    website_width = c.stringWidth(website, "Helvetica", 20)
-    website_x = (page_width - website_width) / 2
-    c.drawString(website_x, 30, website)
+        lea_logo = layout["lea_logo"]
+        c.drawImage(LOGO_PATH, lea_logo["x"], lea_logo["y"], width=lea_logo["width"], height=lea_logo["height"],
+                    preserveAspectRatio=True, mask='auto')
+
+    # Customer logo and main images
+    for frame in layout["frames"]:
+        _draw_frame(c, frame, prepared_images[frame["filename"]])
+
+    # Content sections and footer with website
+    for item in layout["texts"]:
+        if item["role"] not in ("project_text", "subtitle"):
+            _draw_text(c, item)
 
     c.showPage()
     c.setPageSize((1920, 1080))
-    
+
     # Apply background to footer page too
     if paper_texture_path:
         # Draw paper texture as base layer (covers entire page)
         c.drawImage(paper_texture_path, 0, 0, width=page_width, height=page_height)
-    
+
     if background_path:
         # Draw gradient background as overlay on top (covers entire page)
         c.drawImage(background_path, 0, 0, width=page_width, height=page_height)
@@ -690,15 +554,20 @@ def generate_project_description_pdf(
         c.setFillColorRGB(0.2, 0.4, 0.8, 0.6)
         c.rect(page_width/2, 0, page_width/2, page_height, fill=1)
         c.restoreState()
-    
+
     # Footer content (white text)
     c.setFillColorRGB(1, 1, 1)
     c.setFont("Helvetica", 12)
-    
+
     # Page number (bottom left)
     page_text = "1"
     c.drawString(20, 20, page_text)
-    
+
     c.save()
-    buffer.seek(0)
+    if output is None:
+        buffer.seek(0)
+    if timings is not None:
+        timings["prepare_images"] = round((prepared_at - started) * 1000, 1)
+        timings["layout"] = round((laid_out_at - prepared_at) * 1000, 1)
+        timings["render"] = round((time.perf_counter() - laid_out_at) * 1000, 1)
     return buffer
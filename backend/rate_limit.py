@@ -0,0 +1,148 @@
+# Rate limiting with token buckets per (user, endpoint)
+# A bucket holds up to max_requests tokens and refills at max_requests per window, so a user
+# can burst up to the limit and then continues at the average rate.
+# RATE_LIMIT_BACKEND=memory (default) keeps buckets in process: O(1) per request, no disk writes.
+# RATE_LIMIT_BACKEND=redis shares the buckets between workers and instances (requires redis).
+# The settings are read when the limiter is created (on the first request), after .env is loaded.
+import os
+import threading
+import time
+from typing import Dict, Tuple, Optional
+
+# Defaults of RATE_LIMIT_BACKEND, REDIS_URL and RATE_LIMIT_KEY_PREFIX
+DEFAULT_RATE_LIMIT_BACKEND = "memory"
+DEFAULT_REDIS_URL = "redis://localhost:6379/0"
+DEFAULT_KEY_PREFIX = "ratelimit:"
+
+# Idle buckets are dropped once this many are kept in memory (a full bucket carries no state)
+MAX_MEMORY_BUCKETS = 100_000
+
+
+class RateLimitError(Exception):
+    """Raised when the rate limit backend is misconfigured or unavailable"""
+
+
+class RateLimiter:
+    """Interface of a rate limit backend"""
+
+    def acquire(self, key: str, capacity: int, window_seconds: float) -> Tuple[bool, float]:
+        """
+        Take one token from the bucket for key.
+        Returns whether the request is allowed, and if not, seconds until a token is available.
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget all buckets"""
+
+
+class MemoryRateLimiter(RateLimiter):
+    """Token buckets in a dict (per process)"""
+
+    def __init__(self, max_buckets: int = MAX_MEMORY_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}  # key -> (tokens, updated_at, full_at)
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, capacity: int, window_seconds: float) -> Tuple[bool, float]:
+        rate = capacity / window_seconds
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            if len(self._buckets) > self.max_buckets:
+                self._evict_full(now)
+        return (True, 0.0) if allowed else (False, (1 - tokens) / rate)
+
+    def _evict_full(self, now: float):
+        # A bucket that has refilled completely behaves exactly like a missing one
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# Atomic token bucket in Redis: KEYS[1] = bucket, ARGV = capacity, rate (tokens/s), now (s)
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Token buckets in Redis, shared by all workers. Each check is one round trip running
+    a Lua script, so concurrent requests cannot overdraw a bucket. Buckets expire once full.
+    """
+
+    def __init__(self, url: str = DEFAULT_REDIS_URL, prefix: str = DEFAULT_KEY_PREFIX, client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RateLimitError("redis er ikke installert (pip install redis)") from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(_REDIS_TOKEN_BUCKET)
+
+    def acquire(self, key: str, capacity: int, window_seconds: float) -> Tuple[bool, float]:
+        rate = capacity / window_seconds
+        allowed, tokens = self._script(keys=[f"{self.prefix}{key}"], args=[capacity, rate, time.time()])
+        if int(allowed):
+            return True, 0.0
+        return False, (1 - float(tokens)) / rate
+
+    def reset(self):
+        for key in self.client.scan_iter(match=f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def create_limiter() -> RateLimiter:
+    """Create the rate limit backend configured by RATE_LIMIT_BACKEND (read from the environment now)"""
+    backend = os.getenv("RATE_LIMIT_BACKEND", DEFAULT_RATE_LIMIT_BACKEND)
+    if backend == "memory":
+        return MemoryRateLimiter()
+    if backend == "redis":
+        return RedisRateLimiter(os.getenv("REDIS_URL", DEFAULT_REDIS_URL),
+                                prefix=os.getenv("RATE_LIMIT_KEY_PREFIX", DEFAULT_KEY_PREFIX))
+    raise RateLimitError(f"Ukjent RATE_LIMIT_BACKEND: {backend}")
+
+
+def get_limiter() -> RateLimiter:
+    """Get the process-wide rate limit backend"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = create_limiter()
+    return _limiter
+
+
+def set_limiter(limiter: Optional[RateLimiter]):
+    """Replace the process-wide rate limit backend (None recreates it from the environment)"""
+    global _limiter
+    _limiter = limiter
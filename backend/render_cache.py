@@ -0,0 +1,64 @@
+# Content-addressed cache for rendered project description PDFs
+# A render is identified by a hash of the request and the content of every referenced image,
+# so an identical request can reuse the PDF that is already stored under downloads/.
+import hashlib
+import json
+from functools import lru_cache
+import database
+import storage
+from image_processing import file_sha256
+
+# Bump when the project description layout changes so old renders are not reused
+RENDER_VERSION = 1
+
+
+@lru_cache(maxsize=1024)
+def _hash_object(key: str, modified: float, size: int) -> str:
+    """Hash a stored object, memoized on its key, modification time and size"""
+    return file_sha256(storage.get_storage().local_path(key))
+
+
+def image_content_hash(filename: str) -> str:
+    """Get the content hash of an uploaded image (recorded at upload, or hashed for older files)"""
+    image = database.get_image_by_filename(filename)
+    if image:
+        return image["sha256"]
+
+    key = f"uploads/{filename}"
+    stat = storage.get_storage().stat(key)
+    if stat is None:
+        return "missing"
+    return _hash_object(key, stat["modified"], stat["size"])
+
+
+def project_description_key(request) -> str:
+    """Canonical hash of a ProjectDescriptionRequest plus the content of its images"""
+    payload = {
+        "version": RENDER_VERSION,
+        "request": request.model_dump(mode="json"),
+        "image_hashes": [image_content_hash(img.filename) for img in request.images],
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def cached_pdf_key(key: str) -> str:
+    """Storage key of the PDF for a render key"""
+    return f"downloads/{key}.pdf"
+
+
+def get_cached_pdf(key: str):
+    """Return storage key and stat values of an earlier render for this key, or None"""
+    pdf_key = cached_pdf_key(key)
+    stat = storage.get_storage().stat(pdf_key)
+    if stat and stat["size"] > 0:
+        return {"key": pdf_key, **stat}
+    return None
+
+
+def pdf_writer(key: str):
+    """
+    Context manager yielding a local temp path to render the PDF for a render key into.
+    The file is moved into storage atomically when rendering succeeds, so readers never see a partial PDF.
+    """
+    return storage.get_storage().write_file(cached_pdf_key(key))
@@ -0,0 +1,385 @@
+# Storage for uploaded images and generated PDFs
+# Files are addressed by keys such as "uploads/{sha256}.jpg" or "downloads/{key}.pdf".
+# STORAGE_BACKEND=local (default) keeps them on the local filesystem under STORAGE_ROOT.
+# STORAGE_BACKEND=s3 keeps them in an S3-compatible bucket (AWS S3, MinIO, GCS interop), so that
+# every instance sees the same files and the service can scale out without shared disks.
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator, BinaryIO, Tuple
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STORAGE_ROOT = os.getenv("STORAGE_ROOT", ".")
+
+# S3-compatible backend (requires boto3)
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://minio:9000 for MinIO
+S3_REGION = os.getenv("S3_REGION")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+
+# Local copies of remote objects (rendering and PIL need real files)
+STORAGE_CACHE_DIR = os.getenv("STORAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pristilbud-storage"))
+# Local copies beyond this are evicted least-recently-used first (by the janitor). On Cloud Run
+# /tmp is held in memory, so keep this well below the instance memory.
+STORAGE_CACHE_MAX_MB = float(os.getenv("STORAGE_CACHE_MAX_MB", "256"))
+# Local copies still being written are never evicted before they are this old
+STORAGE_CACHE_TEMP_GRACE_SECONDS = 3600
+
+
+class StorageError(Exception):
+    """Raised when the storage backend is misconfigured or unavailable"""
+
+
+class Storage:
+    """
+    Interface of a storage backend.
+
+    Reads and writes are streamed: put_file uploads from a local file and open returns a
+    file-like object that is read in chunks.
+    """
+
+    # Whether touch() is recorded in the "accessed" stat value (otherwise it is the modification time)
+    tracks_access = False
+    # Whether local_path() is the stored file itself (otherwise a downloaded copy; stream with open())
+    stores_locally = False
+
+    def open(self, key: str, byte_range: Optional[Tuple[int, int]] = None) -> BinaryIO:
+        """
+        Open an object for streaming reads (raises FileNotFoundError).
+        With byte_range (first, last), inclusive, reading starts at the first byte; read at most
+        last - first + 1 bytes.
+        """
+        raise NotImplementedError
+
+    def put_file(self, key: str, local_path: str):
+        """Store a local file under key, replacing any existing object atomically"""
+        raise NotImplementedError
+
+    def put_bytes(self, key: str, data: bytes):
+        """Store bytes under key"""
+        raise NotImplementedError
+
+    @contextmanager
+    def write_file(self, key: str) -> Iterator[str]:
+        """
+        Yield a local temp path to write an object to; it is stored under key when the block
+        exits without error and discarded otherwise. Readers never see a partial object.
+        """
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp")
+        os.close(fd)
+        try:
+            yield temp_path
+            self.put_file(key, temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def stat(self, key: str) -> Optional[Dict[str, Any]]:
+        """Size, modification and last access time of an object, or None if it does not exist"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def delete(self, key: str) -> bool:
+        """Delete an object; returns False if it did not exist"""
+        raise NotImplementedError
+
+    def list(self, prefix: str) -> Iterator[Dict[str, Any]]:
+        """Objects directly under a prefix ending in "/" (not recursive), with their stat values"""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Path of a local file with the object's content, or None if it does not exist"""
+        raise NotImplementedError
+
+    def touch(self, key: str):
+        """Record that an object was used (for least-recently-used eviction)"""
+
+    def trim_cache(self) -> int:
+        """Delete least-recently-used local copies beyond the cache limit; returns the bytes freed"""
+        return 0
+
+
+class LocalStorage(Storage):
+    """Files on the local filesystem under a root directory"""
+
+    tracks_access = True
+    stores_locally = True
+
+    def __init__(self, root: str = "."):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def open(self, key: str, byte_range: Optional[Tuple[int, int]] = None) -> BinaryIO:
+        f = open(self.path(key), "rb")
+        if byte_range:
+            f.seek(byte_range[0])
+        return f
+
+    def put_file(self, key: str, local_path: str):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            shutil.copyfile(local_path, temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def put_bytes(self, key: str, data: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @contextmanager
+    def write_file(self, key: str) -> Iterator[str]:
+        # Temp file next to the destination, so the final rename is atomic and nothing is copied
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            yield temp_path
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def _stat_values(stat) -> Dict[str, Any]:
+        return {
+            "size": stat.st_size,
+            "modified": stat.st_mtime,
+            "accessed": max(stat.st_atime, stat.st_mtime),
+        }
+
+    def stat(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            stat = os.stat(self.path(key))
+        except FileNotFoundError:
+            return None
+        return self._stat_values(stat)
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def list(self, prefix: str) -> Iterator[Dict[str, Any]]:
+        directory = self.path(prefix.rstrip("/"))
+        if not os.path.isdir(directory):
+            return
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    yield {"key": f"{prefix}{entry.name}", **self._stat_values(entry.stat())}
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = self.path(key)
+        return path if os.path.exists(path) else None
+
+    def touch(self, key: str):
+        # Sets atime explicitly, so it also works on noatime/relatime mounts
+        path = self.path(key)
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+
+def _is_not_found(error: Exception) -> bool:
+    code = getattr(error, "response", {}).get("Error", {}).get("Code")
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+class S3Storage(Storage):
+    """
+    Objects in an S3-compatible bucket.
+
+    Responses stream objects with open(). Local copies (for rendering) are kept in
+    STORAGE_CACHE_DIR, bounded by cache_max_bytes (see trim_cache). Most keys are
+    content-addressed and never change, so a cached copy is reused as long as its size matches.
+    S3 has no access time, so the object's LastModified is used for eviction.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 prefix: str = "", cache_dir: str = STORAGE_CACHE_DIR,
+                 cache_max_bytes: float = STORAGE_CACHE_MAX_MB * 1024 * 1024, client=None):
+        if not bucket:
+            raise StorageError("S3_BUCKET må settes for S3-lagring")
+        if client is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise StorageError("boto3 er ikke installert (pip install boto3)") from e
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def open(self, key: str, byte_range: Optional[Tuple[int, int]] = None) -> BinaryIO:
+        extra = {"Range": f"bytes={byte_range[0]}-{byte_range[1]}"} if byte_range else {}
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key), **extra)["Body"]
+        except Exception as e:
+            if _is_not_found(e):
+                raise FileNotFoundError(key) from e
+            raise
+
+    def put_file(self, key: str, local_path: str):
+        # upload_file streams from disk (multipart for large files)
+        self.client.upload_file(local_path, self.bucket, self._object_key(key))
+
+    def put_bytes(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data)
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, *key.split("/"))
+
+    @contextmanager
+    def write_file(self, key: str) -> Iterator[str]:
+        # Written in the local cache, uploaded, and then kept as the cached copy
+        path = self._cache_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            yield temp_path
+            self.put_file(key, temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def stat(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except Exception as e:
+            if _is_not_found(e):
+                return None
+            raise
+        modified = head["LastModified"].timestamp()
+        return {"size": head["ContentLength"], "modified": modified, "accessed": modified, "etag": head.get("ETag")}
+
+    def delete(self, key: str) -> bool:
+        existed = self.exists(key)
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        cached = self._cache_path(key)
+        if os.path.exists(cached):
+            os.remove(cached)
+        return existed
+
+    def list(self, prefix: str) -> Iterator[Dict[str, Any]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._object_key(prefix), Delimiter="/"):
+            for obj in page.get("Contents", []):
+                modified = obj["LastModified"].timestamp()
+                yield {
+                    "key": obj["Key"][len(self.prefix):],
+                    "size": obj["Size"],
+                    "modified": modified,
+                    "accessed": modified,
+                }
+
+    def local_path(self, key: str) -> Optional[str]:
+        stat = self.stat(key)
+        if stat is None:
+            return None
+
+        path = self._cache_path(key)
+        if os.path.exists(path) and os.path.getsize(path) == stat["size"]:
+            try:
+                os.utime(path)  # Most recently used, for trim_cache
+            except OSError:
+                pass
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            # download_file streams to disk in chunks
+            self.client.download_file(self.bucket, self._object_key(key), temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return path
+
+    def trim_cache(self) -> int:
+        files = []
+        now = time.time()
+        for directory, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith(".tmp") and now - stat.st_mtime < STORAGE_CACHE_TEMP_GRACE_SECONDS:
+                    continue
+                files.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+
+        in_use = sum(size for _, size, _ in files)
+        freed = 0
+        for _, size, path in sorted(files):
+            if in_use <= self.cache_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            in_use -= size
+            freed += size
+        return freed
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def create_storage() -> Storage:
+    """Create the storage backend configured by STORAGE_BACKEND"""
+    if STORAGE_BACKEND == "local":
+        return LocalStorage(STORAGE_ROOT)
+    if STORAGE_BACKEND == "s3":
+        return S3Storage(S3_BUCKET, endpoint_url=S3_ENDPOINT_URL, region=S3_REGION, prefix=S3_PREFIX)
+    raise StorageError(f"Ukjent STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+
+def get_storage() -> Storage:
+    """Get the process-wide storage backend"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+
+def set_storage(backend: Optional[Storage]):
+    """Replace the process-wide storage backend (None recreates it from the environment)"""
+    global _storage
+    _storage = backend
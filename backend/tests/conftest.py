@@ -0,0 +1,20 @@
+# backend/tests/conftest.py
+import pytest
+import database
+import storage
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """A migrated SQLite database in tmp_path instead of app.db"""
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    database.init_database()
+    yield
+    database.close_all_connections()
+
+
+@pytest.fixture
+def local_storage(temp_db, tmp_path, monkeypatch):
+    """temp_db plus LocalStorage rooted at tmp_path (uploads/ and downloads/ are created by the tests)"""
+    monkeypatch.setattr(storage, "_storage", storage.LocalStorage(str(tmp_path)))
+    return tmp_path
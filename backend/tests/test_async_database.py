@@ -0,0 +1,91 @@
+# backend/tests/test_async_database.py
+import asyncio
+import threading
+import pytest
+from fastapi.testclient import TestClient
+import async_database
+import auth
+import database
+from main import app
+
+
+def test_queries_run_on_the_database_thread(temp_db):
+    async def scenario():
+        user_id = await async_database.create_test_user("a@example.com", "A", role="user")
+        user = await async_database.get_user_by_id(user_id)
+        thread = await async_database.run(lambda: threading.current_thread().name)
+        return user, thread
+
+    user, thread = asyncio.run(scenario())
+
+    assert user["email"] == "a@example.com"
+    assert thread.startswith("database")
+    assert async_database.get_user_by_id.__doc__ == database.get_user_by_id.__doc__
+
+
+def test_admin_handler_awaits_query_off_the_event_loop(temp_db, mocker):
+    threads = []
+    mocker.patch.object(database, "get_users_page",
+                        side_effect=lambda *args, **kwargs: threads.append(threading.current_thread().name) or [])
+    app.dependency_overrides[auth.get_current_admin_user] = lambda: {"id": 1, "role": "admin"}
+    try:
+        r = TestClient(app).get("/admin/users")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert r.status_code == 200
+    assert threads[0].startswith("database")
+
+
+def test_admin_users_are_paginated_with_selected_columns(temp_db):
+    for i in range(5):
+        database.create_test_user(f"user{i}@example.com", f"User {i}", role="user")
+    app.dependency_overrides[auth.get_current_admin_user] = lambda: {"id": 1, "role": "admin"}
+    client = TestClient(app)
+    try:
+        first = client.get("/admin/users", params={"limit": 2, "columns": "id,email"}).json()
+        second = client.get("/admin/users", params={"limit": 2, "columns": "id,email", "cursor": first["next_cursor"]}).json()
+        last = client.get("/admin/users", params={"limit": 2, "cursor": second["next_cursor"]}).json()
+        bad = client.get("/admin/users", params={"columns": "google_id"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert first["users"] == [{"id": 5, "email": "user4@example.com"}, {"id": 4, "email": "user3@example.com"}]
+    assert [user["id"] for user in second["users"]] == [3, 2]
+    assert [user["id"] for user in last["users"]] == [1]
+    assert last["users"][0]["is_active"] is True
+    assert last["next_cursor"] is None
+    assert bad.status_code == 400
+
+
+def test_executor_is_sized_for_the_backend(temp_db, monkeypatch):
+    pytest.importorskip("psycopg")
+    assert async_database.get_executor()._max_workers == 1
+
+    postgres = database.PostgresBackend("postgresql://localhost/unused", min_size=1, max_size=7)
+    monkeypatch.setattr(database, "_backend", postgres)
+
+    assert async_database.get_executor()._max_workers == 7
+    assert async_database.get_executor() is async_database.get_executor()
+
+
+def test_google_sign_in_queries_run_on_the_database_thread(temp_db, mocker):
+    threads = {}
+
+    def verify(token):
+        threads["verify"] = threading.current_thread().name
+        return {"sub": "g1", "email": "a@example.com", "name": "A"}
+
+    def lookup(google_id):
+        threads["lookup"] = threading.current_thread().name
+        return None
+
+    mocker.patch.object(auth, "verify_google_token", side_effect=verify)
+    mocker.patch.object(database, "get_user_by_google_id", side_effect=lookup)
+
+    r = TestClient(app).post("/auth/google", json={"google_token": "token"})
+
+    assert r.status_code == 200
+    assert r.json()["user"]["role"] == "admin"
+    assert threads["lookup"].startswith("database")
+    assert not threads["verify"].startswith("database")
@@ -0,0 +1,154 @@
+# backend/tests/test_auth.py
+import json
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+import auth
+import database
+
+
+@pytest.fixture
+def user(temp_db):
+    auth.clear_user_cache()
+    user_id = database.create_test_user("a@example.com", "A", role="user")
+    yield database.get_user_by_id(user_id)
+    auth.clear_user_cache()
+
+
+def _credentials(user):
+    token = auth.create_access_token({"sub": str(user["id"])})
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def test_repeated_requests_skip_token_decode_and_database(user, mocker):
+    credentials = _credentials(user)
+    lookup = mocker.spy(database, "get_user_by_id")
+    decode = mocker.spy(auth, "verify_token")
+
+    first = auth.get_current_user(credentials)
+    first["role"] = "changed by caller"
+    second = auth.get_current_user(credentials)
+
+    assert second["email"] == "a@example.com"
+    assert second["role"] == "user"
+    assert lookup.call_count == 1
+    assert decode.call_count == 1
+
+
+def test_promote_and_delete_invalidate_cached_user(user):
+    credentials = _credentials(user)
+    auth.get_current_user(credentials)
+
+    database.promote_to_admin(user["id"])
+    assert auth.get_current_user(credentials)["role"] == "admin"
+
+    database.delete_user(user["id"])
+    with pytest.raises(HTTPException) as error:
+        auth.get_current_user(credentials)
+    assert error.value.status_code == 401
+
+
+def test_cache_entries_expire(user, monkeypatch, mocker):
+    credentials = _credentials(user)
+    auth.get_current_user(credentials)
+    lookup = mocker.spy(database, "get_user_by_id")
+
+    later = auth.time.time() + auth.USER_CACHE_TTL_SECONDS + 1
+    monkeypatch.setattr(auth.time, "time", lambda: later)
+    auth.get_current_user(credentials)
+
+    assert lookup.call_count == 1
+
+
+def test_cache_is_bounded(user, monkeypatch):
+    monkeypatch.setattr(auth, "USER_CACHE_MAX_ENTRIES", 2)
+    for i in range(3):
+        token = auth.create_access_token({"sub": str(user["id"]), "n": i})
+        auth.get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+
+    assert len(auth._user_cache) == 2
+
+
+@pytest.fixture(scope="module")
+def google_key():
+    from datetime import datetime, timedelta
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "test")])
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(1).not_valid_before(datetime(2020, 1, 1)).not_valid_after(datetime.now() + timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    return {"private_pem": private_pem, "certs": {"kid1": cert.public_bytes(serialization.Encoding.PEM).decode()}}
+
+
+def _google_token(google_key, **claims):
+    import time
+    from google.auth import crypt, jwt
+    signer = crypt.RSASigner.from_string(google_key["private_pem"], key_id="kid1")
+    now = int(time.time())
+    payload = {"iss": "https://accounts.google.com", "aud": auth.GOOGLE_CLIENT_ID, "sub": "123",
+               "email": "a@example.com", "iat": now, "exp": now + 600, **claims}
+    return jwt.encode(signer, payload).decode()
+
+
+class FakeResponse:
+    def __init__(self, certs, headers):
+        self.status = 200
+        self.headers = headers
+        self.data = json.dumps(certs).encode()
+
+
+@pytest.fixture
+def google_certs(monkeypatch):
+    monkeypatch.setattr(auth, "_google_certs", {"certs": None, "expires_at": 0.0})
+    monkeypatch.setattr(auth, "GOOGLE_CERTS_FILE", None)
+
+
+def test_google_token_verified_against_local_certs(google_key, google_certs, tmp_path, monkeypatch):
+    certs_file = tmp_path / "certs.json"
+    certs_file.write_text(json.dumps(google_key["certs"]))
+    monkeypatch.setattr(auth, "GOOGLE_CERTS_FILE", str(certs_file))
+
+    assert auth.verify_google_token(_google_token(google_key))["email"] == "a@example.com"
+    assert auth.verify_google_token(_google_token(google_key, iss="evil.example.com")) is None
+    assert auth.verify_google_token(_google_token(google_key, aud="other-client")) is None
+
+
+def test_google_certs_cached_for_max_age(google_key, google_certs, monkeypatch):
+    transport = []
+
+    def fake_transport(url, method):
+        transport.append(url)
+        return FakeResponse(google_key["certs"], {"Cache-Control": "public, max-age=100", "Age": "40"})
+
+    monkeypatch.setattr(auth, "_google_transport", fake_transport)
+    token = _google_token(google_key)
+
+    assert auth.verify_google_token(token) is not None
+    assert auth.verify_google_token(token) is not None
+    assert len(transport) == 1
+    assert auth._google_certs["expires_at"] == pytest.approx(auth.time.time() + 60, abs=2)
+
+    auth._google_certs["expires_at"] = 0.0
+    assert auth.verify_google_token(token) is not None
+    assert len(transport) == 2
+
+
+def test_google_certs_refetched_for_unknown_key_id(google_key, google_certs, monkeypatch):
+    responses = [{"old": next(iter(google_key["certs"].values()))}, google_key["certs"]]
+    calls = []
+
+    def fake_transport(url, method):
+        calls.append(url)
+        return FakeResponse(responses[len(calls) - 1], {"Cache-Control": "max-age=3600"})
+
+    monkeypatch.setattr(auth, "_google_transport", fake_transport)
+
+    assert auth.verify_google_token(_google_token(google_key)) is not None
+    assert len(calls) == 2
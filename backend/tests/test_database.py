@@ -0,0 +1,91 @@
+# backend/tests/test_database.py
+import os
+import threading
+import pytest
+import database
+
+
+def test_connection_is_reused_within_a_thread_and_tuned(temp_db):
+    conn = database.get_db_connection()
+
+    assert database.get_db_connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == database.DB_BUSY_TIMEOUT_MS
+
+
+def test_each_thread_gets_its_own_connection(temp_db):
+    other = []
+    thread = threading.Thread(target=lambda: other.append(database.get_db_connection()))
+    thread.start()
+    thread.join()
+
+    assert other[0] is not database.get_db_connection()
+
+
+def test_failed_transaction_is_rolled_back(temp_db):
+    user_id = database.create_test_user("a@example.com", "A")
+
+    with pytest.raises(database.IntegrityError):
+        with database.connection() as conn:
+            conn.execute("UPDATE users SET name = 'changed' WHERE id = ?", (user_id,))
+            database.create_test_user("a@example.com", "duplicate")
+
+    assert not database.get_db_connection().in_transaction
+    assert database.get_user_by_id(user_id)["name"] == "A"
+
+
+def test_connections_reopen_after_close_and_follow_database_path(temp_db, tmp_path, monkeypatch):
+    user_id = database.create_test_user("a@example.com", "A")
+    database.close_all_connections()
+    assert database.get_user_by_id(user_id)["email"] == "a@example.com"
+
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "other.db"))
+    database.init_database()
+    assert database.get_user_by_id(user_id) is None
+
+
+def test_nested_blocks_share_the_outer_transaction(temp_db):
+    with pytest.raises(RuntimeError):
+        with database.connection():
+            database.create_test_user("a@example.com", "A")
+            raise RuntimeError("abort")
+
+    assert database.get_user_by_email("a@example.com") is None
+
+
+def test_deleting_a_user_keeps_uploads_and_drops_invitations(temp_db):
+    admin_id = database.create_test_user("admin@example.com", "Admin")
+    database.create_invitation("code", "new@example.com", admin_id)
+    database.create_image("img1", "abc.jpg", "JPEG", 10, 20, False, 100, "abc", uploaded_by=admin_id)
+    database.add_image_ref("img1", "abc", uploaded_by=admin_id)
+
+    assert database.delete_user(admin_id)
+
+    assert database.get_user_by_id(admin_id) is None
+    assert database.get_invitation_by_code("code") is None
+    assert database.get_image_ref("img1")["filename"] == "abc.jpg"
+
+
+def test_foreign_keys_are_enforced(temp_db):
+    with pytest.raises(database.IntegrityError):
+        database.create_invitation("code", "new@example.com", 999)
+
+
+def test_backend_is_chosen_from_dotenv_loaded_after_import(tmp_path, monkeypatch):
+    from dotenv import load_dotenv
+    pytest.importorskip("psycopg")
+    monkeypatch.setattr(os, "environ", {k: v for k, v in os.environ.items() if not k.startswith(("DATABASE_", "DB_"))})
+    assert isinstance(database.create_backend(), database.SQLiteBackend)
+
+    env_file = tmp_path / ".env"
+    env_file.write_text("DATABASE_URL=postgresql://app@db.internal/app\nDB_POOL_MAX_SIZE=3\n")
+    load_dotenv(env_file)
+    backend = database.create_backend()
+
+    assert isinstance(backend, database.PostgresBackend)
+    assert (backend.url, backend.max_size) == ("postgresql://app@db.internal/app", 3)
+
+    os.environ["DATABASE_URL"] = "mysql://app@db.internal/app"
+    with pytest.raises(database.DatabaseError):
+        database.create_backend()
@@ -0,0 +1,68 @@
+# backend/tests/test_health.py
+import os
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+import database
+import main
+from main import app
+
+
+@pytest.fixture
+def client(temp_db, monkeypatch):
+    monkeypatch.setattr(main, "_readiness", {"checked_at": 0.0, "result": None})
+    yield TestClient(app)
+
+
+def test_liveness_has_no_dependencies(client, mocker):
+    ping = mocker.patch.object(database, "ping")
+
+    assert client.get("/livez").json() == {"status": "ok"}
+    ping.assert_not_called()
+
+
+def test_readiness_is_cached(client, mocker):
+    ping = mocker.spy(database, "ping")
+    init = mocker.spy(database, "migrate")
+
+    first = client.get("/readyz")
+    client.get("/readyz")
+    client.get("/health")
+
+    assert first.status_code == 200
+    assert first.json()["database"] == "connected"
+    assert ping.call_count == 1
+    init.assert_not_called()
+    assert client.get("/health").json()["database"] == "connected"
+
+
+def test_readiness_fails_when_database_is_unreachable(client, mocker):
+    mocker.patch.object(database, "ping", side_effect=Exception("disk I/O error"))
+
+    r = client.get("/readyz")
+
+    assert r.status_code == 503
+    assert r.json()["ready"] is False
+    assert client.get("/health").json()["status"] == "error"
+
+
+def test_migrations_run_once_and_set_schema_version(tmp_path, monkeypatch, mocker):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "fresh.db"))
+    migrate = mocker.spy(database, "migrate")
+
+    database.init_database()
+    database.init_database()
+
+    assert migrate.call_count == 1
+    assert database.get_schema_version() == len(database.MIGRATIONS)
+    assert database.migrate() == len(database.MIGRATIONS)
+
+
+def test_importing_the_app_does_not_touch_the_database(tmp_path):
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": backend_dir, "DATABASE_URL": ""}
+
+    subprocess.run([sys.executable, "-c", "import main"], cwd=tmp_path, env=env, check=True, capture_output=True)
+
+    assert not (tmp_path / "app.db").exists()
@@ -0,0 +1,89 @@
+# backend/tests/test_http_cache.py
+import hashlib
+import time
+import pytest
+from fastapi.testclient import TestClient
+import auth
+import storage
+from main import app
+
+SHA = "ab" * 32
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_storage", storage.LocalStorage(str(tmp_path)))
+    (tmp_path / "uploads").mkdir()
+    (tmp_path / "uploads" / f"{SHA}.jpg").write_bytes(b"\xff\xd8\xff" + b"x" * 1000)
+    (tmp_path / "uploads" / "legacy.jpg").write_bytes(b"\xff\xd8\xff legacy")
+    (tmp_path / "downloads").mkdir()
+    (tmp_path / "downloads" / f"{SHA}.pdf").write_bytes(b"%PDF-1.4 " + b"0123456789" * 10)
+    monkeypatch.setattr(auth, "get_optional_user", lambda credentials: {"id": 1, "email": "test@example.com"})
+    return TestClient(app)
+
+
+def test_content_addressed_upload_is_immutable_and_revalidates(client):
+    r = client.get(f"/uploads/{SHA}.jpg")
+
+    assert r.status_code == 200
+    assert r.headers["etag"] == f'"{SHA}.jpg"'
+    assert "immutable" in r.headers["cache-control"]
+
+    r = client.get(f"/uploads/{SHA}.jpg", headers={"If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
+    assert r.content == b""
+
+
+def test_legacy_upload_gets_hash_etag_and_no_cache(client, tmp_path):
+    r = client.get("/uploads/legacy.jpg")
+
+    digest = hashlib.sha256((tmp_path / "uploads" / "legacy.jpg").read_bytes()).hexdigest()
+    assert r.headers["etag"] == f'"{digest}"'
+    assert r.headers["cache-control"] == "public, no-cache"
+
+
+def test_download_supports_conditional_get_and_ranges(client):
+    r = client.get(f"/downloads/{SHA}.pdf")
+    etag = r.headers["etag"]
+
+    assert r.headers["cache-control"].startswith("private")
+    assert client.get(f"/downloads/{SHA}.pdf", headers={"If-None-Match": f"W/{etag}, \"other\""}).status_code == 304
+
+    r = client.get(f"/downloads/{SHA}.pdf", headers={"Range": "bytes=0-3"})
+    assert r.status_code == 206
+    assert r.content == b"%PDF"
+
+
+def test_signed_download_needs_no_auth_and_is_publicly_cacheable(client, monkeypatch):
+    monkeypatch.setattr(auth, "get_optional_user", lambda credentials: None)
+    signed = auth.sign_download_url(f"/downloads/{SHA}.pdf")
+
+    r = client.get(signed["url"])
+
+    assert r.status_code == 200
+    assert r.content.startswith(b"%PDF")
+    cache_control = r.headers["cache-control"]
+    assert cache_control.startswith("public, max-age=")
+    assert 0 < int(cache_control.split("max-age=")[1].split(",")[0]) <= signed["expires"] - time.time() + 1
+
+
+def test_download_rejects_bad_or_expired_signature(client, monkeypatch):
+    monkeypatch.setattr(auth, "get_optional_user", lambda credentials: None)
+    signed = auth.sign_download_url(f"/downloads/{SHA}.pdf")
+
+    assert client.get(signed["url"][:-4] + "0000").status_code == 403
+    assert client.get(signed["url"].replace(SHA, "cd" * 32)).status_code == 403
+    expired = auth.sign_download_url(f"/downloads/{SHA}.pdf", ttl_seconds=-7200)
+    assert client.get(expired["url"]).status_code == 403
+    assert client.get(f"/downloads/{SHA}.pdf").status_code == 401
+
+
+def test_signed_download_ignores_expired_bearer_token(client, monkeypatch):
+    lookup = []
+    monkeypatch.setattr(auth, "get_optional_user", lambda credentials: lookup.append(credentials))
+    signed = auth.sign_download_url(f"/downloads/{SHA}.pdf")
+
+    r = client.get(signed["url"], headers={"Authorization": "Bearer expired.token.value"})
+
+    assert r.status_code == 200
+    assert lookup == []
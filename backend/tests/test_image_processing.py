@@ -0,0 +1,169 @@
+# backend/tests/test_image_processing.py
+import asyncio
+import hashlib
+import io
+import pytest
+from PIL import Image
+import database
+import image_processing
+
+
+def _save(tmp_path, name, img, **kwargs):
+    path = tmp_path / name
+    img.save(path, **kwargs)
+    return str(path)
+
+
+def test_cmyk_jpeg_becomes_baseline_rgb_jpeg(tmp_path):
+    src = _save(tmp_path, "cmyk.jpg", Image.new("CMYK", (400, 300), (0, 100, 100, 0)), progressive=True)
+
+    info = image_processing.normalize_image(src, str(tmp_path), "abc")
+
+    assert info["filename"] == "abc.jpg"
+    assert info["format"] == "JPEG"
+    assert not info["has_alpha"]
+    with Image.open(tmp_path / "abc.jpg") as img:
+        assert img.mode == "RGB"
+        assert not img.info.get("progressive")
+
+
+def test_webp_photo_becomes_jpeg(tmp_path):
+    src = _save(tmp_path, "photo.webp", Image.new("RGB", (300, 200), (10, 20, 30)))
+
+    info = image_processing.normalize_image(src, str(tmp_path), "webp")
+
+    assert info["filename"] == "webp.jpg"
+    assert (info["width"], info["height"]) == (300, 200)
+
+
+def test_transparent_palette_png_becomes_rgba_png(tmp_path):
+    img = Image.new("P", (100, 50), 0)
+    img.putpalette([255, 255, 255, 0, 0, 0])
+    img.paste(1, (10, 10, 40, 40))
+    src = _save(tmp_path, "logo.png", img, transparency=0)
+
+    info = image_processing.normalize_image(src, str(tmp_path), "logo")
+
+    assert info["filename"] == "logo.png"
+    assert info["has_alpha"]
+    with Image.open(tmp_path / "logo.png") as out:
+        assert out.mode == "RGBA"
+
+
+def test_opaque_rgba_png_becomes_jpeg(tmp_path):
+    src = _save(tmp_path, "opaque.png", Image.new("RGBA", (100, 100), (1, 2, 3, 255)))
+
+    info = image_processing.normalize_image(src, str(tmp_path), "opaque")
+
+    assert info["format"] == "JPEG"
+    assert not info["has_alpha"]
+
+
+def test_large_image_is_resized(tmp_path):
+    src = _save(tmp_path, "large.jpg", Image.new("RGB", (4000, 3000)))
+
+    info = image_processing.normalize_image(src, str(tmp_path), "large")
+
+    assert info["width"] <= 1920 and info["height"] <= 1080
+
+
+def test_invalid_file_raises(tmp_path):
+    src = tmp_path / "not_an_image.jpg"
+    src.write_bytes(b"hello")
+
+    with pytest.raises(image_processing.ImageProcessingError):
+        image_processing.normalize_image(str(src), str(tmp_path), "bad")
+
+
+def test_get_image_info_prefers_recorded_metadata(tmp_path, temp_db):
+    src = _save(tmp_path, "photo.jpg", Image.new("RGB", (640, 480)))
+    info = image_processing.normalize_image(src, str(tmp_path), "meta")
+    database.create_image(image_id="meta", **info)
+
+    stored = image_processing.get_image_info(str(tmp_path / info["filename"]))
+
+    assert stored["image_id"] == "meta"
+    assert (stored["width"], stored["height"]) == (640, 480)
+    assert image_processing.image_mask(stored) is None
+
+
+class _FakeUpload:
+    """Minimal stand-in for fastapi.UploadFile that records how much was read"""
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    async def read(self, size=-1):
+        return self.stream.read(size)
+
+
+def _jpeg_bytes(size=(64, 64)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (10, 20, 30)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_stream_upload_writes_temp_file(tmp_path):
+    data = _jpeg_bytes()
+
+    path, sha256 = asyncio.run(image_processing.stream_upload(_FakeUpload(data), str(tmp_path)))
+
+    assert open(path, "rb").read() == data
+    assert sha256 == hashlib.sha256(data).hexdigest()
+
+
+def test_stream_upload_rejects_bad_magic_bytes_early(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_processing, "UPLOAD_CHUNK_SIZE", 16)
+    upload = _FakeUpload(b"<html>not an image</html>" * 100)
+
+    with pytest.raises(image_processing.ImageProcessingError):
+        asyncio.run(image_processing.stream_upload(upload, str(tmp_path)))
+
+    assert upload.stream.tell() == 16
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stream_upload_enforces_size_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_processing, "UPLOAD_CHUNK_SIZE", 1024)
+    upload = _FakeUpload(_jpeg_bytes() + b"\x00" * 10000)
+
+    with pytest.raises(image_processing.UploadTooLargeError):
+        asyncio.run(image_processing.stream_upload(upload, str(tmp_path), max_bytes=4096))
+
+    assert upload.stream.tell() <= 4096 + 1024
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_detect_image_type():
+    assert image_processing.detect_image_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "webp"
+    assert image_processing.detect_image_type(b"\x00\x00\x00\x18ftypheic") == "heic"
+    assert image_processing.detect_image_type(b"%PDF-1.4") is None
+
+
+def test_large_jpeg_is_decoded_in_draft_mode(tmp_path, mocker):
+    src = _save(tmp_path, "big.jpg", Image.new("RGB", (6000, 4000), (90, 120, 150)))
+    from PIL import JpegImagePlugin
+    draft = mocker.spy(JpegImagePlugin.JpegImageFile, "draft")
+
+    info = image_processing.normalize_image(src, str(tmp_path), "big")
+
+    assert draft.call_args.args[2] == (1620, 1080)
+    assert (info["width"], info["height"]) == (1620, 1080)
+
+
+def test_draft_respects_exif_orientation(tmp_path):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees
+    src = _save(tmp_path, "rotated.jpg", Image.new("RGB", (4000, 3000)), exif=exif)
+
+    info = image_processing.normalize_image(src, str(tmp_path), "rotated")
+
+    assert (info["width"], info["height"]) == (810, 1080)
+
+
+def test_pixel_ceiling_rejects_from_header(tmp_path, monkeypatch):
+    src = _save(tmp_path, "bomb.png", Image.new("L", (2000, 2000)))
+    monkeypatch.setattr(image_processing, "MAX_IMAGE_PIXELS", 1000 * 1000)
+
+    with pytest.raises(image_processing.ImageProcessingError, match="for stort"):
+        image_processing.normalize_image(src, str(tmp_path), "bomb")
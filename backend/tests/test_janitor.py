@@ -0,0 +1,119 @@
+# backend/tests/test_janitor.py
+import os
+import time
+import pytest
+from PIL import Image
+import database
+import janitor
+import storage
+import upload_store
+
+
+@pytest.fixture
+def dirs(local_storage, tmp_path):
+    (tmp_path / "uploads").mkdir()
+    (tmp_path / "downloads").mkdir()
+    return tmp_path
+
+
+def _write(path, size, age_seconds=0):
+    path.write_bytes(b"x" * size)
+    stamp = time.time() - age_seconds
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def _store(tmp_path, image_id):
+    raw = tmp_path / f"{image_id}.raw.jpg"
+    Image.new("RGB", (64, 64), (1, 2, 3)).save(raw)
+    stored = upload_store.store_image(str(raw), image_id, str(tmp_path), image_id)
+    os.remove(raw)
+    return stored
+
+
+def test_expired_downloads_and_orphans_are_removed(dirs):
+    old_pdf = _write(dirs / "downloads" / "old.pdf", 100, age_seconds=8 * 24 * 3600)
+    recent_pdf = _write(dirs / "downloads" / "recent.pdf", 100)
+    orphan = _write(dirs / "uploads" / f"{'a' * 64}.jpg", 50, age_seconds=2 * 3600)
+    interrupted = _write(dirs / "uploads" / "tmpold.part", 20, age_seconds=2 * 3600)
+    uploading = _write(dirs / "uploads" / "tmpabc.part", 50)
+    stored = _store(dirs, "id-1")
+
+    stats = janitor.run_once()
+
+    assert not old_pdf.exists() and not orphan.exists() and not interrupted.exists()
+    assert recent_pdf.exists() and uploading.exists()
+    assert (dirs / "uploads" / stored["filename"]).exists()
+    assert stats["bytes_reclaimed_by_reason"]["download_ttl"] == 100
+    assert stats["bytes_reclaimed_by_reason"]["orphan"] == 70
+
+
+def test_uploads_from_before_content_addressing_are_kept(dirs):
+    (dirs / "uploads" / "renditions").mkdir()
+    legacy = _write(dirs / "uploads" / "0044a23e-7e1c-418a-b9af-ebf2747667e3.jpg", 50, age_seconds=48 * 3600)
+    rendition = _write(dirs / "uploads" / "renditions" / "0044a23e-7e1c-418a-b9af-ebf2747667e3.thumb.webp",
+                       10, age_seconds=48 * 3600)
+    stale_rendition = _write(dirs / "uploads" / "renditions" / "deleted-upload.thumb.webp", 10, age_seconds=48 * 3600)
+
+    stats = janitor.run_once()
+
+    assert legacy.exists() and rendition.exists()
+    assert not stale_rendition.exists()
+    assert stats["bytes_reclaimed_by_reason"]["orphan"] == 10
+
+
+def test_quota_evicts_least_recently_accessed_first(dirs, monkeypatch):
+    monkeypatch.setattr(janitor, "STORAGE_QUOTA_MB", 250 / (1024 * 1024))
+    first = _write(dirs / "downloads" / "first.pdf", 100, age_seconds=300)
+    second = _write(dirs / "downloads" / "second.pdf", 100, age_seconds=200)
+    third = _write(dirs / "downloads" / "third.pdf", 100, age_seconds=100)
+    janitor.mark_accessed("downloads/first.pdf")
+
+    stats = janitor.run_once()
+
+    assert first.exists() and third.exists() and not second.exists()
+    assert stats["bytes_reclaimed_by_reason"]["quota"] == 100
+
+
+def test_expired_upload_references_release_content(dirs, monkeypatch):
+    stored = _store(dirs, "id-1")
+    monkeypatch.setattr(janitor, "UPLOAD_TTL_HOURS", -1)
+    before = janitor.get_metrics()["bytes_reclaimed"]
+
+    janitor.run_once()
+
+    assert not (dirs / "uploads" / stored["filename"]).exists()
+    assert database.get_image_ref("id-1") is None
+    assert janitor.get_metrics()["bytes_reclaimed"] > before + stored["byte_size"]
+
+
+def _age(path, seconds):
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+def test_uploads_expire_by_last_use_not_upload_time(dirs):
+    used = _store(dirs, "id-used")
+    Image.new("RGB", (64, 64), (9, 9, 9)).save(dirs / "raw.jpg")
+    unused = upload_store.store_image(str(dirs / "raw.jpg"), "other", str(dirs), "id-unused")
+    for path in (dirs / "uploads").rglob("*.*"):
+        _age(path, 40 * 24 * 3600)
+    janitor.mark_accessed(f"uploads/renditions/{used['filename'].split('.')[0]}.thumb.webp")
+
+    janitor.run_once()
+
+    assert (dirs / "uploads" / used["filename"]).exists()
+    assert database.get_image_ref("id-used") is not None
+    assert not (dirs / "uploads" / unused["filename"]).exists()
+    assert database.get_image_ref("id-unused") is None
+
+
+def test_uploads_do_not_expire_without_access_times(dirs, mocker):
+    _store(dirs, "id-1")
+    for path in (dirs / "uploads").rglob("*.*"):
+        _age(path, 40 * 24 * 3600)
+    mocker.patch.object(storage.LocalStorage, "tracks_access", False)
+
+    janitor.run_once()
+
+    assert database.get_image_ref("id-1") is not None
@@ -0,0 +1,128 @@
+# backend/tests/test_postgres.py
+# Runs the database functions against PostgreSQL. Set TEST_DATABASE_URL to a disposable database
+# (e.g. postgresql://postgres@localhost/test); its tables are dropped first.
+import os
+import threading
+from datetime import datetime
+import pytest
+import database
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+TABLES = ["usage_render_histogram", "usage_rollups", "usage_events", "image_refs", "images", "invitations", "rate_limits", "users", "schema_version"]
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    pytest.importorskip("psycopg")
+    backend = database.PostgresBackend(TEST_DATABASE_URL, min_size=1, max_size=4)
+    with backend.transaction() as conn:
+        for table in TABLES:
+            conn.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+    monkeypatch.setattr(database, "_backend", backend)
+    monkeypatch.setattr(database, "_migrated", set())
+    database.init_database()
+    yield backend
+    backend.close()
+
+
+def test_schema_is_migrated_once(postgres):
+    assert database.get_schema_version() == len(database.MIGRATIONS)
+    assert database.migrate() == len(database.MIGRATIONS)
+    assert database.ping()
+
+
+def test_users_and_invitations(postgres):
+    assert database.is_first_user()
+    admin_id = database.create_user("g1", "admin@example.com", "Admin", is_first_user=True)
+    user_id = database.create_test_user("user@example.com", "User", role="user")
+
+    assert database.get_user_by_id(admin_id)["role"] == "admin"
+    assert database.get_user_by_google_id("g1")["id"] == admin_id
+    assert database.get_user_by_email("user@example.com")["id"] == user_id
+    assert database.get_user_by_id(user_id)["is_active"] is True
+
+    invitation_id = database.create_invitation("code", "new@example.com", admin_id)
+    assert database.get_invitation_by_code("code")["id"] == invitation_id
+    database.mark_invitation_used(invitation_id, datetime.now())
+    assert database.get_invitation_by_code("code") is None
+
+    assert database.promote_to_admin(user_id)
+    assert database.get_user_by_id(user_id)["role"] == "admin"
+    assert database.delete_user(user_id)
+    assert database.get_user_by_id(user_id) is None
+    # The invitation's creator can be deleted too; their invitations go with them
+    database.create_invitation("pending", "other@example.com", admin_id)
+    assert database.delete_user(admin_id)
+    assert database.get_invitation_by_code("pending") is None
+
+
+def test_integrity_errors_roll_back(postgres):
+    database.create_test_user("a@example.com", "A")
+
+    with pytest.raises(database.IntegrityError):
+        with database.connection():
+            database.create_test_user("b@example.com", "B")
+            database.create_test_user("a@example.com", "duplicate")
+
+    assert database.get_user_by_email("b@example.com") is None
+
+
+def test_image_references(postgres):
+    user_id = database.create_test_user("a@example.com", "A")
+    database.create_image("img1", "abc.jpg", "JPEG", 10, 20, False, 100, "abc", uploaded_by=user_id)
+    assert database.add_image_ref("img1", "abc", "src", uploaded_by=user_id) == 1
+    assert database.add_image_ref("img2", "abc", "src") == 2
+
+    assert database.find_image_by_source_sha256("src")["filename"] == "abc.jpg"
+    assert database.get_image_ref("img2")["width"] == 10
+    assert database.get_image_ids_for_file("abc.jpg") == ["img1", "img2"]
+    # Uploads outlive their uploader
+    assert database.delete_user(user_id)
+    assert database.get_image_ref("img1")["filename"] == "abc.jpg"
+    assert database.delete_image_ref("img1")["ref_count"] == 1
+    assert database.delete_image_ref("img2") == {"sha256": "abc", "filenames": ["abc.jpg"], "ref_count": 0}
+    assert database.get_stored_image_filenames() == []
+
+
+def test_users_page_and_pool_across_threads(postgres):
+    def create(i):
+        database.create_test_user(f"user{i}@example.com", f"User {i}", role="user")
+
+    threads = [threading.Thread(target=create, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    first = database.get_users_page(4, columns=["email"])
+    last = database.get_users_page(4, after=(first[-1]["created_at"], first[-1]["id"]))
+    assert len(first) == 4
+    assert len(last) == 2
+    assert {user["id"] for user in first} | {user["id"] for user in last} == set(range(1, 7))
+
+
+def test_usage_events(postgres):
+    events = [{"created_at": "2026-01-01 12:00:00", "user_id": 1, "generator": "price_quote",
+               "document_id": f"sheet{i}", "options": {"mva": "y"}, "byte_size": 100,
+               "timings": {"render": 1.5}, "duration_ms": 2.0, "cache_hit": i == 1} for i in range(2)]
+
+    assert database.insert_usage_events(events) == 2
+
+    latest = database.get_usage_events(limit=1)[0]
+    assert latest["document_id"] == "sheet1"
+    assert latest["options"] == {"mva": "y"}
+    assert latest["cache_hit"] is True
+
+
+def test_usage_rollups(postgres):
+    event = {"created_at": "2026-01-01 12:30:00", "user_id": 1, "generator": "price_quote", "document_id": "s",
+             "options": {}, "byte_size": 100, "timings": {}, "duration_ms": 300.0, "cache_hit": False}
+    database.insert_usage_events([event])
+    database.insert_usage_events([event])
+
+    day = database.get_usage_rollups("day", datetime(2026, 1, 1))
+    assert [(row["bucket_start"], row["events"], row["bytes"]) for row in day] == [("2026-01-01 00:00:00", 2, 200)]
+    histogram = database.get_usage_render_histogram("hour", datetime(2026, 1, 1, 12, 59))
+    assert [(row["bucket_start"], row["bucket"], row["events"]) for row in histogram] == [("2026-01-01 12:00:00", 2, 2)]
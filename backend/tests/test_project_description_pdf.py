@@ -0,0 +1,159 @@
+# backend/tests/test_project_description_pdf.py
+import io
+import shutil
+import pytest
+from PIL import Image
+from models import ImageUploadResponse
+from pdf_generators import project_description
+
+CONTENT = {"goals": "Mål", "concept": "Konsept"}
+
+
+@pytest.fixture
+def uploads(local_storage, tmp_path):
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    Image.new("RGB", (1600, 900), (200, 50, 50)).save(upload_dir / "photo.jpg")
+    Image.new("RGB", (600, 900), (50, 200, 50)).save(upload_dir / "portrait.jpg")
+    logo = Image.new("RGBA", (300, 100), (0, 0, 0, 0))
+    logo.paste((255, 255, 255, 255), (20, 20, 280, 80))
+    logo.save(upload_dir / "logo.png")
+    return upload_dir
+
+
+def _image(filename, placeholder_type):
+    return ImageUploadResponse(image_id=filename, filename=filename, url=f"/uploads/{filename}",
+                               placeholder_type=placeholder_type)
+
+
+def test_prepare_images_dedupes_and_encodes(uploads):
+    logo = _image("logo.png", "logo")
+    photo = _image("photo.jpg", "content")
+
+    prepared = project_description._prepare_images([logo, photo, photo, None, _image("missing.jpg", "content")])
+
+    assert list(prepared) == ["logo.png", "photo.jpg", "missing.jpg"]
+    assert prepared["photo.jpg"]["info"]["width"] == 1600
+    assert "DCTDecode" in prepared["photo.jpg"]["xobject"]["image"]["_filters"]
+    assert prepared["logo.png"]["xobject"]["smask"] is not None
+    assert prepared["missing.jpg"]["exists"] is False
+
+
+def test_generate_with_logo_and_two_images(uploads):
+    images = [_image("logo.png", "logo"), _image("photo.jpg", "content"), _image("portrait.jpg", "content")]
+
+    buffer = project_description.generate_project_description_pdf("event", "Test", CONTENT, images)
+
+    assert buffer.getvalue().startswith(b"%PDF")
+
+
+def test_generate_with_single_image(uploads):
+    buffer = project_description.generate_project_description_pdf(
+        "event", "Test", CONTENT, [_image("portrait.jpg", "content")], language="EN"
+    )
+
+    assert buffer.getvalue().startswith(b"%PDF")
+
+
+def test_identical_images_share_one_xobject(uploads):
+    shutil.copy(uploads / "photo.jpg", uploads / "copy.jpg")
+    images = [_image("photo.jpg", "content"), _image("copy.jpg", "content")]
+
+    pdf = project_description.generate_project_description_pdf("event", "Test", CONTENT, images).getvalue()
+
+    # One photo plus the LEA FILMS logo and its soft mask
+    assert pdf.count(b"/Subtype /Image") == 3
+
+
+def test_dry_run_returns_layout_without_rendering(uploads, mocker):
+    encode = mocker.patch.object(project_description.image_cache, "get_encoded_image")
+    images = [_image("logo.png", "logo"), _image("photo.jpg", "content"), _image("missing.jpg", "content")]
+
+    layout = project_description.generate_project_description_pdf("event", "Test", CONTENT, images, dry_run=True)
+
+    encode.assert_not_called()
+    frames = {frame["role"]: frame for frame in layout["frames"]}
+    assert set(frames) == {"logo", "left", "right"}
+    # 1600x900 photo in the 520x650 left frame: scaled to the frame height, cropped in width
+    left = frames["left"]
+    assert left["scale"] == pytest.approx(650 / 900)
+    assert left["image"]["height"] == pytest.approx(650)
+    assert left["crop"]["width"] == pytest.approx(520 / (650 / 900))
+    assert left["crop"]["height"] == pytest.approx(900)
+    assert frames["right"]["missing"] is True
+    assert [text["role"] for text in layout["texts"]][0] == "project_text"
+
+
+def test_layout_single_tall_image_is_centered_vertically(uploads):
+    layout = project_description.compute_project_description_layout(
+        "event", CONTENT, [_image("portrait.jpg", "content")]
+    )
+
+    single = layout["frames"][0]
+    # 600x900 portrait in the 400x500 frame: scaled to the frame width, crop centered
+    assert single["scale"] == pytest.approx(400 / 600)
+    assert single["crop"]["y"] == pytest.approx((900 - 500 / (400 / 600)) / 2)
+    assert single["crop"]["height"] == pytest.approx(500 / (400 / 600))
+
+
+def test_generate_with_only_logo(uploads):
+    buffer = project_description.generate_project_description_pdf(
+        "event", "Test", CONTENT, [_image("logo.png", "logo")]
+    )
+
+    assert buffer.getvalue().startswith(b"%PDF")
+
+
+def test_images_are_clipped_to_their_frame(uploads):
+    from reportlab.pdfgen import canvas
+    layout = project_description.compute_project_description_layout(
+        "event", CONTENT, [_image("photo.jpg", "content")]
+    )
+    frame = layout["frames"][0]
+    prepared = project_description._prepare_images([_image("photo.jpg", "content")])["photo.jpg"]
+    c = canvas.Canvas(str(uploads / "out.pdf"), pagesize=(1920, 1080))
+
+    project_description._draw_frame(c, frame, prepared)
+
+    code = "\n".join(c._code)
+    bounds = frame["frame"]
+    # The single 1600x900 photo is wider than its frame; the overflow is clipped away
+    clip = f"{bounds['x']:g} {bounds['y']:g} {bounds['width']:g} {bounds['height']:g} re W"
+    assert frame["image"]["width"] > bounds["width"]
+    assert clip in code
+    assert code.index(clip) < code.index(" Do")
+
+
+def _pdf_images(pdf):
+    """Image XObjects of the first page, resolved with pypdf (independent of ReportLab)"""
+    pypdf = pytest.importorskip("pypdf")
+    page = pypdf.PdfReader(io.BytesIO(pdf)).pages[0]
+    xobjects = page["/Resources"]["/XObject"]
+    return {name: xobjects[name].get_object() for name in xobjects
+            if xobjects[name].get_object()["/Subtype"] == "/Image"}
+
+
+def test_cached_xobjects_and_soft_masks_resolve(uploads):
+    images = [_image("logo.png", "logo"), _image("photo.jpg", "content"), _image("portrait.jpg", "content")]
+
+    pdf = project_description.generate_project_description_pdf("event", "Test", CONTENT, images).getvalue()
+
+    xobjects = _pdf_images(pdf)
+    sizes = {(image["/Width"], image["/Height"]) for image in xobjects.values()}
+    assert {(1600, 900), (600, 900), (300, 100)} <= sizes
+    logo = next(image for image in xobjects.values() if (image["/Width"], image["/Height"]) == (300, 100))
+    smask = logo["/SMask"].get_object()
+    assert (smask["/Width"], smask["/Height"]) == (300, 100)
+    assert len(smask.get_data()) == 300 * 100
+    assert all(image.get_data() for image in xobjects.values())
+
+
+def test_draw_image_falls_back_without_reportlab_internals(uploads, monkeypatch):
+    monkeypatch.setattr(project_description.image_cache, "_CANVAS_INTERNALS", ("_renamed_in_a_later_release",))
+
+    pdf = project_description.generate_project_description_pdf(
+        "event", "Test", CONTENT, [_image("logo.png", "logo"), _image("photo.jpg", "content")]
+    ).getvalue()
+
+    sizes = {(image["/Width"], image["/Height"]) for image in _pdf_images(pdf).values()}
+    assert {(1600, 900), (300, 100)} <= sizes
@@ -0,0 +1,113 @@
+# backend/tests/test_rate_limit.py
+import io
+import os
+import pytest
+from fastapi import HTTPException
+import auth
+import rate_limit
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    limiter = rate_limit.MemoryRateLimiter()
+
+    assert all(limiter.acquire("1:pdf", 3, 60)[0] for _ in range(3))
+    allowed, retry_after = limiter.acquire("1:pdf", 3, 60)
+    assert not allowed
+    assert retry_after == pytest.approx(20)
+
+    clock.now += 20
+    assert limiter.acquire("1:pdf", 3, 60)[0]
+    assert not limiter.acquire("1:pdf", 3, 60)[0]
+    assert limiter.acquire("2:pdf", 3, 60)[0]
+
+
+def test_full_buckets_are_evicted(clock):
+    limiter = rate_limit.MemoryRateLimiter(max_buckets=2)
+    limiter.acquire("a", 10, 10)
+    limiter.acquire("b", 10, 10)
+
+    clock.now += 2
+    limiter.acquire("c", 10, 10)
+
+    assert set(limiter._buckets) == {"c"}
+
+
+def test_rate_limit_raises_429_with_retry_after(monkeypatch, mocker):
+    monkeypatch.setattr(rate_limit, "_limiter", rate_limit.MemoryRateLimiter())
+    monkeypatch.setitem(auth.RATE_LIMITS, "generate-pdf", {"max_requests": 2, "window_minutes": 1})
+    connect = mocker.patch("database.get_db_connection")
+
+    auth.check_rate_limit_middleware(7, "generate-pdf")
+    auth.check_rate_limit_middleware(7, "generate-pdf")
+    with pytest.raises(HTTPException) as error:
+        auth.check_rate_limit_middleware(7, "generate-pdf")
+
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "30"
+    connect.assert_not_called()
+
+
+def test_generate_pdf_endpoint_returns_429_with_retry_after(monkeypatch, mocker):
+    from fastapi.testclient import TestClient
+    from main import app
+    monkeypatch.setattr(rate_limit, "_limiter", rate_limit.MemoryRateLimiter())
+    monkeypatch.setitem(auth.RATE_LIMITS, "generate-pdf", {"max_requests": 1, "window_minutes": 1})
+    generate = mocker.patch("main.generate_pdf", side_effect=lambda *args, **kwargs: (io.BytesIO(b"%PDF"), "a.pdf"))
+    mocker.patch("usage_log.record")
+    app.dependency_overrides[auth.get_current_user] = lambda: {"id": 7, "email": "test@example.com"}
+    body = {"url": "https://docs.google.com/spreadsheets/d/ABC123/edit", "language": "NO", "reise": "n", "mva": "n"}
+    try:
+        client = TestClient(app)
+        first = client.post("/generate-pdf", json=body)
+        second = client.post("/generate-pdf", json=body)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert second.headers["Retry-After"] == "60"
+    assert generate.call_count == 1
+
+
+def test_redis_limiter_is_shared():
+    redis = pytest.importorskip("redis")
+    url = os.getenv("REDIS_TEST_URL")
+    if not url:
+        pytest.skip("REDIS_TEST_URL not set")
+    first = rate_limit.RedisRateLimiter(url, prefix="test-ratelimit:")
+    second = rate_limit.RedisRateLimiter(url, prefix="test-ratelimit:")
+    first.reset()
+
+    assert first.acquire("1:pdf", 2, 60)[0]
+    assert second.acquire("1:pdf", 2, 60)[0]
+    assert not first.acquire("1:pdf", 2, 60)[0]
+    first.reset()
+
+
+def test_limiter_reads_dotenv_loaded_after_import(tmp_path, monkeypatch, mocker):
+    from dotenv import load_dotenv
+    monkeypatch.setattr(os, "environ", {k: v for k, v in os.environ.items() if not k.startswith(("RATE_LIMIT", "REDIS"))})
+    env_file = tmp_path / ".env"
+    env_file.write_text("RATE_LIMIT_BACKEND=redis\nREDIS_URL=redis://cache:6379/1\nRATE_LIMIT_KEY_PREFIX=app:\n")
+    redis_limiter = mocker.patch.object(rate_limit, "RedisRateLimiter")
+
+    assert isinstance(rate_limit.create_limiter(), rate_limit.MemoryRateLimiter)
+    load_dotenv(env_file)
+    rate_limit.create_limiter()
+
+    redis_limiter.assert_called_once_with("redis://cache:6379/1", prefix="app:")
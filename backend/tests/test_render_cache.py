@@ -0,0 +1,76 @@
+# backend/tests/test_render_cache.py
+import pytest
+import render_cache
+from models import ProjectDescriptionRequest
+
+CONTENT = {
+    "goals": "Mål", "concept": "Konsept", "target_audience": "Alle",
+    "key_features": "Mye", "timeline": "Snart", "success_metrics": "Mange",
+}
+
+
+@pytest.fixture
+def cache_dirs(local_storage, tmp_path):
+    (tmp_path / "uploads").mkdir()
+    (tmp_path / "uploads" / "a.jpg").write_bytes(b"first image")
+    return tmp_path
+
+
+def _request(**overrides):
+    data = {
+        "project_type": "event",
+        "project_name": "Test",
+        "generated_content": CONTENT,
+        "images": [{"image_id": "a", "filename": "a.jpg", "url": "/uploads/a.jpg", "placeholder_type": "content"}],
+        "language": "NO",
+    }
+    data.update(overrides)
+    return ProjectDescriptionRequest(**data)
+
+
+def test_identical_requests_share_key(cache_dirs):
+    assert render_cache.project_description_key(_request()) == render_cache.project_description_key(_request())
+
+
+def test_key_ignores_field_order_without_deprecation_warnings(cache_dirs, recwarn):
+    reordered = _request(generated_content=dict(reversed(list(CONTENT.items()))))
+
+    assert render_cache.project_description_key(reordered) == render_cache.project_description_key(_request())
+    assert not [w for w in recwarn if issubclass(w.category, DeprecationWarning)]
+
+
+def test_key_changes_with_request_content(cache_dirs):
+    assert render_cache.project_description_key(_request()) != render_cache.project_description_key(_request(language="EN"))
+
+
+def test_key_changes_when_image_bytes_change(cache_dirs):
+    before = render_cache.project_description_key(_request())
+    (cache_dirs / "uploads" / "a.jpg").write_bytes(b"replaced image with other bytes")
+
+    assert render_cache.project_description_key(_request()) != before
+
+
+def test_store_and_get_cached_pdf(cache_dirs):
+    key = render_cache.project_description_key(_request())
+    assert render_cache.get_cached_pdf(key) is None
+
+    with render_cache.pdf_writer(key) as pdf_path:
+        with open(pdf_path, "wb") as f:
+            f.write(b"%PDF-1.4 test")
+        assert render_cache.get_cached_pdf(key) is None
+
+    assert render_cache.get_cached_pdf(key)["key"] == f"downloads/{key}.pdf"
+    assert list((cache_dirs / "downloads").iterdir()) == [cache_dirs / "downloads" / f"{key}.pdf"]
+
+
+def test_failed_render_leaves_nothing_behind(cache_dirs):
+    key = render_cache.project_description_key(_request())
+
+    with pytest.raises(RuntimeError):
+        with render_cache.pdf_writer(key) as pdf_path:
+            with open(pdf_path, "wb") as f:
+                f.write(b"%PDF-1.4 partial")
+            raise RuntimeError("render failed")
+
+    assert render_cache.get_cached_pdf(key) is None
+    assert list((cache_dirs / "downloads").iterdir()) == []
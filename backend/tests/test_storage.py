@@ -0,0 +1,144 @@
+# backend/tests/test_storage.py
+# The S3 backend runs against moto's in-process S3, or against a real S3-compatible
+# endpoint (e.g. a local MinIO) when S3_TEST_ENDPOINT_URL is set.
+import os
+import time
+import uuid
+import pytest
+import storage
+
+
+@pytest.fixture
+def local(tmp_path):
+    return storage.LocalStorage(str(tmp_path / "root"))
+
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch):
+    boto3 = pytest.importorskip("boto3")
+    endpoint_url = os.getenv("S3_TEST_ENDPOINT_URL")
+    bucket = f"test-{uuid.uuid4().hex[:12]}"
+
+    if endpoint_url:
+        client = boto3.client("s3", endpoint_url=endpoint_url)
+        client.create_bucket(Bucket=bucket)
+        yield storage.S3Storage(bucket, client=client, prefix="app/", cache_dir=str(tmp_path / "cache"))
+        return
+
+    moto = pytest.importorskip("moto")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=bucket)
+        yield storage.S3Storage(bucket, client=client, prefix="app/", cache_dir=str(tmp_path / "cache"))
+
+
+@pytest.fixture(params=["local", "s3"])
+def backend(request):
+    return request.getfixturevalue(request.param)
+
+
+def test_put_stat_open_and_delete(backend, tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"abc" * 1000)
+
+    backend.put_file("uploads/a.jpg", str(source))
+    backend.put_bytes("downloads/b.pdf", b"%PDF")
+
+    assert backend.stat("uploads/a.jpg")["size"] == 3000
+    assert backend.stat("uploads/missing.jpg") is None
+    with backend.open("uploads/a.jpg") as f:
+        assert f.read(3) == b"abc"
+    assert open(backend.local_path("downloads/b.pdf"), "rb").read() == b"%PDF"
+    assert backend.local_path("downloads/missing.pdf") is None
+    assert backend.delete("downloads/b.pdf") is True
+    assert backend.exists("downloads/b.pdf") is False
+
+
+def test_list_is_not_recursive(backend):
+    backend.put_bytes("uploads/a.jpg", b"a")
+    backend.put_bytes("uploads/renditions/a.thumb.webp", b"t")
+
+    assert [f["key"] for f in backend.list("uploads/")] == ["uploads/a.jpg"]
+    assert [f["key"] for f in backend.list("uploads/renditions/")] == ["uploads/renditions/a.thumb.webp"]
+    assert list(backend.list("downloads/")) == []
+
+
+def test_s3_local_copy_is_refreshed_when_object_changes(s3):
+    s3.put_bytes("downloads/a.pdf", b"first")
+    assert open(s3.local_path("downloads/a.pdf"), "rb").read() == b"first"
+
+    s3.put_bytes("downloads/a.pdf", b"second version")
+
+    assert open(s3.local_path("downloads/a.pdf"), "rb").read() == b"second version"
+
+
+def test_s3_requires_bucket():
+    with pytest.raises(storage.StorageError):
+        storage.S3Storage("", client=object())
+
+
+def test_s3_cache_evicts_least_recently_used_copies(s3):
+    for name in ("a", "b", "c"):
+        s3.put_bytes(f"downloads/{name}.pdf", b"x" * 100)
+        path = s3.local_path(f"downloads/{name}.pdf")
+        os.utime(path, (time.time() - {"a": 300, "b": 100, "c": 200}[name],) * 2)
+    s3.local_path("downloads/a.pdf")  # used again: most recent
+    s3.cache_max_bytes = 250
+
+    assert s3.trim_cache() == 100
+
+    cached = sorted(os.listdir(os.path.join(s3.cache_dir, "downloads")))
+    assert cached == ["a.pdf", "b.pdf"]
+
+
+def test_s3_downloads_are_streamed_without_local_copy(s3, monkeypatch):
+    from fastapi.testclient import TestClient
+    import auth
+    from main import app
+
+    monkeypatch.setattr(storage, "_storage", s3)
+    key = f"downloads/{'ab' * 32}.pdf"
+    s3.put_bytes(key, b"%PDF-1.4 " + b"0" * 300_000)
+    signed = auth.sign_download_url(f"/{key}")
+
+    r = TestClient(app).get(signed["url"])
+
+    assert r.status_code == 200
+    assert r.content.startswith(b"%PDF-1.4") and len(r.content) == 300_009
+    assert r.headers["content-length"] == "300009"
+    assert r.headers["etag"]
+    assert not os.path.exists(os.path.join(s3.cache_dir, "downloads"))
+    assert TestClient(app).get(signed["url"], headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+
+
+def test_s3_downloads_serve_byte_ranges(s3, monkeypatch):
+    from fastapi.testclient import TestClient
+    import auth
+    from main import app
+
+    monkeypatch.setattr(storage, "_storage", s3)
+    key = f"downloads/{'cd' * 32}.pdf"
+    data = b"%PDF-1.4 " + bytes(range(256)) * 1000
+    s3.put_bytes(key, data)
+    url = auth.sign_download_url(f"/{key}")["url"]
+    client = TestClient(app)
+    etag = client.get(url).headers["etag"]
+
+    partial = client.get(url, headers={"Range": "bytes=100-299"})
+    suffix = client.get(url, headers={"Range": "bytes=-10"})
+    stale = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    current = client.get(url, headers={"Range": "bytes=0-9", "If-Range": etag})
+    beyond = client.get(url, headers={"Range": f"bytes={len(data)}-"})
+
+    assert partial.status_code == 206
+    assert partial.content == data[100:300]
+    assert partial.headers["content-range"] == f"bytes 100-299/{len(data)}"
+    assert partial.headers["content-length"] == "200"
+    assert (suffix.status_code, suffix.content) == (206, data[-10:])
+    assert (stale.status_code, len(stale.content)) == (200, len(data))
+    assert (current.status_code, current.content) == (206, data[:10])
+    assert beyond.status_code == 416
+    assert beyond.headers["content-range"] == f"bytes */{len(data)}"
@@ -0,0 +1,127 @@
+# backend/tests/test_upload_api.py
+import io
+import pytest
+from PIL import Image
+from fastapi.testclient import TestClient
+import auth
+from main import app
+
+
+@pytest.fixture
+def client(local_storage):
+    app.dependency_overrides[auth.get_current_user] = lambda: {"id": None, "email": "test@example.com"}
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def _jpeg(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (320, 240), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_batch_upload_returns_result_per_file(client, tmp_path):
+    files = [
+        ("files", ("a.jpg", _jpeg((255, 0, 0)), "image/jpeg")),
+        ("files", ("b.jpg", _jpeg((0, 255, 0)), "image/jpeg")),
+        ("files", ("notes.txt", b"not an image", "text/plain")),
+        ("files", ("fake.jpg", b"<html></html>", "image/jpeg")),
+    ]
+
+    r = client.post("/upload-images", files=files, data={"placeholder_types": "content"})
+
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [result["filename"] for result in results] == ["a.jpg", "b.jpg", "notes.txt", "fake.jpg"]
+    assert [result["status_code"] for result in results] == [200, 200, 400, 400]
+    assert results[0]["image"]["placeholder_type"] == "content"
+    assert (tmp_path / "uploads" / results[1]["image"]["filename"]).exists()
+    assert results[2]["error"] == "Kun bildefiler er tillatt"
+
+
+def test_batch_upload_with_placeholder_type_per_file(client):
+    files = [
+        ("files", ("logo.jpg", _jpeg((0, 0, 0)), "image/jpeg")),
+        ("files", ("photo.jpg", _jpeg((9, 9, 9)), "image/jpeg")),
+    ]
+
+    r = client.post("/upload-images", files=files, data={"placeholder_types": ["logo", "content"]})
+
+    assert [result["image"]["placeholder_type"] for result in r.json()["results"]] == ["logo", "content"]
+
+
+def test_batch_upload_rejects_mismatched_placeholder_types(client):
+    files = [("files", (f"{i}.jpg", _jpeg((i, i, i)), "image/jpeg")) for i in range(3)]
+
+    r = client.post("/upload-images", files=files, data={"placeholder_types": ["logo", "content"]})
+
+    assert r.status_code == 400
+
+
+def _project_request(images):
+    content = {key: "tekst" for key in ["goals", "concept", "target_audience", "key_features", "timeline", "success_metrics"]}
+    return {"project_type": "event", "project_name": "Test", "generated_content": content, "images": images}
+
+
+def test_generate_project_description_inline(client, tmp_path):
+    r = client.post("/upload-images", files=[("files", ("a.jpg", _jpeg((1, 2, 3)), "image/jpeg"))],
+                    data={"placeholder_types": "content"})
+    body = _project_request([r.json()["results"][0]["image"]])
+
+    r = client.post("/generate-project-description?inline=true", json=body)
+
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/pdf"
+    assert r.content.startswith(b"%PDF")
+    assert r.headers["x-cached"] == "false"
+    pdf_path = r.headers["x-pdf-url"].split("?")[0]
+    assert (tmp_path / pdf_path.lstrip("/")).read_bytes() == r.content
+    assert client.get(r.headers["x-pdf-url"], headers={"Authorization": ""}).content == r.content
+    assert not [p for p in (tmp_path / "downloads").iterdir() if p.suffix == ".tmp"]
+
+    again = client.post("/generate-project-description", json=body).json()
+    assert again["cached"] is True
+    assert again["pdf_url"] == r.headers["x-pdf-url"]
+
+
+def test_inline_pdf_missing_from_storage_is_404(client, mocker):
+    mocker.patch("http_cache.cached_storage_response", return_value=None)
+
+    r = client.post("/generate-project-description?inline=true", json=_project_request([]))
+
+    assert r.status_code == 404
+    assert r.json()["detail"] == "PDF ikke funnet"
+
+
+def test_oversized_upload_is_rejected_before_the_body_is_parsed(client, monkeypatch, mocker):
+    import image_processing
+    import main
+    monkeypatch.setattr(image_processing, "MAX_UPLOAD_BYTES", 10_000)
+    monkeypatch.setattr(main, "UPLOAD_BODY_OVERHEAD_BYTES", 1_000)
+    parse = mocker.patch("starlette.requests.Request.form")
+
+    r = client.post("/upload-image", files={"file": ("big.jpg", _jpeg((1, 2, 3)) + b"\0" * 20_000, "image/jpeg")},
+                    data={"placeholder_type": "content"})
+
+    assert r.status_code == 413
+    parse.assert_not_called()
+
+
+def test_chunked_upload_is_cut_off_at_the_limit(client, monkeypatch, mocker):
+    import image_processing
+    import main
+    monkeypatch.setattr(image_processing, "MAX_UPLOAD_BYTES", 10_000)
+    monkeypatch.setattr(main, "UPLOAD_BODY_OVERHEAD_BYTES", 1_000)
+    copy = mocker.spy(image_processing, "stream_upload")
+
+    def body():
+        yield b"--boundary\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.jpg\"\r\n"
+        yield b"Content-Type: image/jpeg\r\n\r\n"
+        for _ in range(30):
+            yield b"\0" * 1_000
+
+    r = client.post("/upload-image", content=body(), headers={"Content-Type": "multipart/form-data; boundary=boundary"})
+
+    assert r.status_code == 413
+    assert "for stor" in r.json()["detail"]
+    copy.assert_not_called()
@@ -0,0 +1,78 @@
+# backend/tests/test_upload_store.py
+import hashlib
+import shutil
+import pytest
+from PIL import Image
+import database
+import storage
+import upload_store
+
+
+@pytest.fixture
+def store(temp_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_storage", storage.LocalStorage(str(tmp_path / "store")))
+    (tmp_path / "work").mkdir()
+    return tmp_path / "store" / "uploads"
+
+
+def _raw(tmp_path, name, color=(200, 50, 50), fmt="JPEG"):
+    path = tmp_path / name
+    Image.new("RGB", (300, 200), color).save(path, format=fmt)
+    return str(path), hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_duplicate_upload_reuses_stored_content(tmp_path, store, mocker):
+    raw_path, source_sha256 = _raw(tmp_path, "a.jpg")
+    first = upload_store.store_image(raw_path, source_sha256, str(tmp_path / "work"), "id-1")
+    normalize = mocker.spy(upload_store, "normalize_image")
+
+    second = upload_store.store_image(raw_path, source_sha256, str(tmp_path / "work"), "id-2")
+
+    normalize.assert_not_called()
+    assert first["filename"] == f"{first['sha256']}.jpg"
+    assert second["filename"] == first["filename"]
+    assert second["deduplicated"] is True
+    assert second["ref_count"] == 2
+    assert sorted(p.name for p in store.iterdir()) == [first["filename"], "renditions"]
+    assert database.get_image_ref("id-2")["filename"] == first["filename"]
+
+
+def test_different_originals_with_same_normalized_content_share_file(tmp_path, store):
+    jpeg_path, jpeg_sha = _raw(tmp_path, "a.jpg")
+    first = upload_store.store_image(jpeg_path, jpeg_sha, str(tmp_path / "work"), "id-1")
+    copy_path = tmp_path / "b.jpg"
+    shutil.copy(store / first["filename"], copy_path)
+
+    second = upload_store.store_image(str(copy_path), "other-source", str(tmp_path / "work"), "id-2")
+
+    assert second["deduplicated"] is True
+    assert second["filename"] == first["filename"]
+    assert len(list(store.glob("*.jpg"))) == 1
+
+
+def test_release_deletes_file_with_last_reference(tmp_path, store):
+    raw_path, source_sha256 = _raw(tmp_path, "a.jpg")
+    stored = upload_store.store_image(raw_path, source_sha256, str(tmp_path / "work"), "id-1")
+    upload_store.store_image(raw_path, source_sha256, str(tmp_path / "work"), "id-2")
+
+    assert upload_store.release_image("id-1") == 1
+    assert (store / stored["filename"]).exists()
+    assert upload_store.release_image("id-2") == 0
+    assert not (store / stored["filename"]).exists()
+    assert list((store / "renditions").iterdir()) == []
+    assert database.get_image_by_sha256(stored["sha256"]) is None
+    assert upload_store.release_image("id-2") is None
+
+
+def test_new_content_gets_renditions(tmp_path, store):
+    raw_path, source_sha256 = _raw(tmp_path, "a.jpg")
+
+    stored = upload_store.store_image(raw_path, source_sha256, str(tmp_path / "work"), "id-1")
+
+    stem = stored["sha256"]
+    assert sorted(p.name for p in (store / "renditions").iterdir()) == sorted([
+        f"{stem}.thumb.webp", f"{stem}.thumb.jpg", f"{stem}.preview.webp", f"{stem}.preview.jpg",
+        f"{stem}.master.webp",
+    ])
+    with Image.open(store / "renditions" / f"{stem}.thumb.webp") as thumb:
+        assert max(thumb.size) == 256
@@ -0,0 +1,184 @@
+# backend/tests/test_usage_log.py
+import asyncio
+from datetime import datetime, timezone
+import io
+import pytest
+from PIL import Image
+from fastapi.testclient import TestClient
+import auth
+import database
+import usage_log
+from main import app
+
+
+@pytest.fixture
+def db(temp_db):
+    usage_log.reset()
+    yield
+    usage_log.reset()
+
+
+def _record(document_id="sheet", **kwargs):
+    usage_log.record("price_quote", 1, document_id, {"language": "NO"}, 1234,
+                     {"fetch": 10.0, "render": 5.0}, 16.0, **kwargs)
+
+
+def test_events_are_buffered_until_flushed(db):
+    _record()
+    _record("other", cache_hit=True)
+
+    assert database.get_usage_events() == []
+    assert usage_log.flush() == 2
+
+    events = database.get_usage_events()
+    assert [event["document_id"] for event in events] == ["other", "sheet"]
+    assert events[1]["options"] == {"language": "NO"}
+    assert events[1]["timings"] == {"fetch": 10.0, "render": 5.0}
+    assert events[1]["byte_size"] == 1234
+    assert [event["cache_hit"] for event in events] == [True, False]
+    assert usage_log.get_metrics()["written"] == 2
+
+
+def test_flush_writes_in_batches(db, monkeypatch, mocker):
+    monkeypatch.setattr(usage_log, "USAGE_FLUSH_BATCH_SIZE", 2)
+    insert = mocker.spy(database, "insert_usage_events")
+    for i in range(5):
+        _record(str(i))
+
+    assert usage_log.flush() == 5
+    assert [len(call.args[0]) for call in insert.call_args_list] == [2, 2, 1]
+
+
+def test_failed_flush_keeps_events_and_buffer_is_bounded(db, monkeypatch, mocker):
+    monkeypatch.setattr(usage_log, "USAGE_BUFFER_MAX_EVENTS", 3)
+    mocker.patch.object(database, "insert_usage_events", side_effect=database.DatabaseError("nede"))
+    for i in range(4):
+        _record(str(i))
+
+    with pytest.raises(database.DatabaseError):
+        usage_log.flush()
+
+    metrics = usage_log.get_metrics()
+    assert metrics["buffered"] == 3
+    assert metrics["dropped"] == 1
+    assert metrics["failed_flushes"] == 1
+
+    mocker.stopall()
+    usage_log.flush()
+    assert [event["document_id"] for event in database.get_usage_events()] == ["3", "2", "1"]
+
+
+def test_full_batch_wakes_the_flusher(db, monkeypatch):
+    monkeypatch.setattr(usage_log, "USAGE_FLUSH_INTERVAL_SECONDS", 60)
+    monkeypatch.setattr(usage_log, "USAGE_FLUSH_BATCH_SIZE", 2)
+
+    async def scenario():
+        task = asyncio.create_task(usage_log.run_forever())
+        await asyncio.sleep(0)
+        _record("a")
+        _record("b")
+        for _ in range(100):
+            if usage_log.get_metrics()["written"] == 2:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(scenario())
+
+    assert len(database.get_usage_events()) == 2
+
+
+def _jpeg():
+    buffer = io.BytesIO()
+    Image.new("RGB", (320, 240), (10, 20, 30)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_project_descriptions_are_logged(db, local_storage):
+    user_id = database.create_test_user("test@example.com", "Test")
+    app.dependency_overrides[auth.get_current_user] = lambda: {"id": user_id, "email": "test@example.com"}
+    client = TestClient(app)
+    try:
+        r = client.post("/upload-images", files=[("files", ("a.jpg", _jpeg(), "image/jpeg"))],
+                        data={"placeholder_types": "content"})
+        content = {key: "tekst" for key in ["goals", "concept", "target_audience", "key_features",
+                                            "timeline", "success_metrics"]}
+        body = {"project_type": "event", "project_name": "Test", "generated_content": content,
+                "images": [r.json()["results"][0]["image"]]}
+
+        first = client.post("/generate-project-description", json=body).json()
+        client.post("/generate-project-description", json=body)
+    finally:
+        app.dependency_overrides.clear()
+    usage_log.flush()
+
+    cached, rendered = database.get_usage_events()
+    assert rendered["generator"] == "project_description"
+    assert rendered["user_id"] == user_id
+    assert rendered["document_id"] == first["project_id"]
+    assert rendered["options"] == {"project_type": "event", "language": "NO", "images": 1, "inline": False}
+    assert rendered["byte_size"] > 0
+    assert set(rendered["timings"]) == {"cache_lookup", "prepare_images", "layout", "render"}
+    assert (rendered["cache_hit"], cached["cache_hit"]) == (False, True)
+    assert cached["byte_size"] == rendered["byte_size"]
+
+
+def _event(created_at, user_id=1, duration_ms=300.0, cache_hit=False, generator="price_quote"):
+    return {"created_at": created_at, "user_id": user_id, "generator": generator, "document_id": "x",
+            "options": {}, "byte_size": 1000, "timings": {}, "duration_ms": duration_ms, "cache_hit": cache_hit}
+
+
+def test_rollups_are_updated_incrementally(db):
+    database.insert_usage_events([_event("2026-03-01 10:15:00"), _event("2026-03-01 10:45:00", user_id=2)])
+    database.insert_usage_events([_event("2026-03-01 11:05:00", cache_hit=True, duration_ms=5.0)])
+
+    hours = database.get_usage_rollups("hour", datetime(2026, 3, 1))
+    assert [(row["bucket_start"], row["user_id"], row["events"]) for row in hours] == [
+        ("2026-03-01 10:00:00", 1, 1), ("2026-03-01 10:00:00", 2, 1), ("2026-03-01 11:00:00", 1, 1)
+    ]
+    days = database.get_usage_rollups("day", datetime(2026, 3, 1, 12))
+    assert [(row["user_id"], row["events"], row["cache_hits"], row["bytes"]) for row in days] == [
+        (1, 2, 1, 2000), (2, 1, 0, 1000)
+    ]
+    # Cache hits are not render times
+    histogram = database.get_usage_render_histogram("day", datetime(2026, 3, 1))
+    assert [(row["bucket"], row["events"]) for row in histogram] == [(2, 2)]
+    assert database.get_usage_rollups("day", datetime(2026, 3, 2)) == []
+
+
+def test_summary_percentiles_and_cache_hit_rate(db):
+    durations = [50.0] * 50 + [400.0] * 40 + [2000.0] * 9 + [90000.0]
+    database.insert_usage_events([_event("2026-03-01 10:00:00", duration_ms=d) for d in durations])
+    database.insert_usage_events([_event("2026-03-01 10:00:00", cache_hit=True, generator="project_description")])
+
+    summary = usage_log.get_usage_summary("day", datetime(2026, 3, 1))
+
+    quotes, descriptions = summary["totals"]
+    assert quotes["generator"] == "price_quote"
+    assert quotes["events"] == 100
+    assert quotes["cache_hit_rate"] == 0
+    assert quotes["render_ms"] == {"p50": 100.0, "p90": 500.0, "p99": 2500.0}
+    assert descriptions["cache_hit_rate"] == 1
+    assert descriptions["render_ms"]["p50"] is None
+    assert [(user["generator"], user["events"]) for user in summary["users"]] == [("price_quote", 100), ("project_description", 1)]
+    assert len(summary["buckets"]) == 2
+
+
+def test_admin_usage_endpoint(db):
+    database.insert_usage_events([_event(datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"))])
+    app.dependency_overrides[auth.get_current_admin_user] = lambda: {"id": 1, "role": "admin"}
+    client = TestClient(app)
+    try:
+        r = client.get("/admin/usage?period=hour&days=1")
+        too_long = client.get("/admin/usage?period=hour&days=90")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert r.status_code == 200
+    body = r.json()
+    assert body["period"] == "hour"
+    assert body["totals"][0]["events"] == 1
+    assert body["users"] == [{"bucket_start": body["buckets"][0]["bucket_start"], "user_id": 1,
+                              "generator": "price_quote", "events": 1}]
+    assert "buffered" in body["log"]
+    assert too_long.status_code == 400
@@ -0,0 +1,96 @@
+# Content-addressed store for uploaded images
+# Normalized images are stored once as uploads/{sha256}.{ext}. Every upload gets its own
+# image_id that refers to the content hash; identical uploads share the stored file and
+# skip normalization entirely. Browser renditions (thumb, preview, master in WebP and
+# JPEG/PNG) are created once per stored image.
+import os
+from typing import Optional, Dict, Any
+import database
+import storage
+from image_processing import normalize_image, create_renditions, remove_renditions
+
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "PNG": "png"}
+
+
+def content_filename(sha256: str, format: str) -> str:
+    """Filename of stored content"""
+    return f"{sha256}.{FORMAT_EXTENSIONS.get(format, format.lower())}"
+
+
+def upload_key(filename: str) -> str:
+    """Storage key of a stored upload"""
+    return f"uploads/{filename}"
+
+
+def _stored(image: Optional[Dict[str, Any]]) -> bool:
+    return bool(image) and storage.get_storage().exists(upload_key(image["filename"]))
+
+
+def store_image(raw_path: str, source_sha256: str, work_dir: str, image_id: str,
+                uploaded_by: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Store an uploaded image and register image_id as a reference to its content.
+
+    If the same original bytes were uploaded before, the existing processed image is reused
+    without decoding anything. Otherwise the upload is normalized (in work_dir) and, if the
+    result matches stored content, the new file is discarded in favour of the existing one.
+
+    Returns the image metadata plus "deduplicated" and "ref_count".
+    """
+    existing = database.find_image_by_source_sha256(source_sha256)
+    if _stored(existing):
+        print(f"♻️ Duplicate upload, reusing {existing['filename']}")
+        ref_count = database.add_image_ref(image_id, existing["sha256"], source_sha256, uploaded_by)
+        return {**existing, "image_id": image_id, "deduplicated": True, "ref_count": ref_count}
+
+    info = normalize_image(raw_path, work_dir, f"{image_id}.part")
+    normalized_path = os.path.join(work_dir, info["filename"])
+    filename = content_filename(info["sha256"], info["format"])
+
+    try:
+        existing = database.get_image_by_sha256(info["sha256"])
+        deduplicated = _stored(existing)
+        if deduplicated:
+            print(f"♻️ Normalized image matches stored content {existing['filename']}")
+            info = existing
+        else:
+            storage.get_storage().put_file(upload_key(filename), normalized_path)
+            info = {**info, "filename": filename}
+            try:
+                database.create_image(
+                    image_id=image_id,
+                    filename=filename,
+                    format=info["format"],
+                    width=info["width"],
+                    height=info["height"],
+                    has_alpha=info["has_alpha"],
+                    byte_size=info["byte_size"],
+                    sha256=info["sha256"],
+                    uploaded_by=uploaded_by
+                )
+            except database.IntegrityError:
+                # Same content recorded concurrently (or its file was restored after going missing)
+                pass
+            create_renditions(filename, master_path=normalized_path)
+    finally:
+        os.remove(normalized_path)
+
+    ref_count = database.add_image_ref(image_id, info["sha256"], source_sha256, uploaded_by)
+    return {**info, "image_id": image_id, "deduplicated": deduplicated, "ref_count": ref_count}
+
+
+def release_image(image_id: str) -> Optional[int]:
+    """
+    Drop one reference to stored content, deleting the file when no references remain.
+    Returns the remaining reference count, or None if the image_id is unknown.
+    """
+    released = database.delete_image_ref(image_id)
+    if released is None:
+        return None
+
+    if released["ref_count"] == 0:
+        for filename in released["filenames"]:
+            remove_renditions(filename)
+            if storage.get_storage().delete(upload_key(filename)):
+                print(f"🗑️ Removed unreferenced image {filename}")
+    return released["ref_count"]
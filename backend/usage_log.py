@@ -0,0 +1,219 @@
+# Write-behind usage log of generated documents (price quotes and project descriptions)
+# record() only appends the event to an in-memory buffer, so the generators never wait for the
+# database. A background task (run_forever) writes the buffer to the usage_events table in batched
+# transactions every USAGE_FLUSH_INTERVAL_SECONDS, or as soon as USAGE_FLUSH_BATCH_SIZE events wait.
+# Loss is bounded: a crash loses at most one flush interval of events, and while the database is
+# unreachable at most USAGE_BUFFER_MAX_EVENTS are kept (the oldest are dropped and counted).
+# Whatever is left is flushed on shutdown.
+# Each flush also adds its events to hourly and daily rollups (see database.insert_usage_events);
+# get_usage_summary() reads only those, so analytics cost the same however long the history is.
+import asyncio
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Deque
+import async_database
+import database
+
+USAGE_FLUSH_INTERVAL_SECONDS = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", "5"))
+USAGE_FLUSH_BATCH_SIZE = int(os.getenv("USAGE_FLUSH_BATCH_SIZE", "500"))
+USAGE_BUFFER_MAX_EVENTS = int(os.getenv("USAGE_BUFFER_MAX_EVENTS", "10000"))
+
+GENERATORS = ("price_quote", "project_description")
+# Render time percentiles reported by get_usage_summary
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+_buffer: Deque[Dict[str, Any]] = deque()
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_metrics = {
+    "recorded": 0,
+    "written": 0,
+    "dropped": 0,
+    "failed_flushes": 0,
+    "last_flush_at": None,
+}
+
+# Set by run_forever, so record() can wake the flusher from any thread once a batch is full
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wakeup: Optional[asyncio.Event] = None
+
+
+def record(generator: str, user_id: Optional[int], document_id: Optional[str], options: Dict[str, Any],
+           byte_size: Optional[int], timings: Dict[str, float], duration_ms: float, cache_hit: bool = False):
+    """
+    Queue one usage event (no I/O).
+
+    Args:
+        generator: 'price_quote' or 'project_description'
+        document_id: Google Sheets id of a quote, render cache key of a project description
+        options: Generation options (language, discount, ...)
+        byte_size: Size of the generated PDF
+        timings: Duration of each stage in ms
+        duration_ms: Total time spent in the endpoint
+        cache_hit: Whether an earlier render was reused
+    """
+    if generator not in GENERATORS:
+        raise ValueError(f"Unknown generator: {generator}")
+    event = {
+        "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "user_id": user_id,
+        "generator": generator,
+        "document_id": document_id,
+        "options": options,
+        "byte_size": byte_size,
+        "timings": timings,
+        "duration_ms": round(duration_ms, 1),
+        "cache_hit": cache_hit,
+    }
+    with _lock:
+        _buffer.append(event)
+        _metrics["recorded"] += 1
+        _trim()
+        batch_ready = len(_buffer) >= USAGE_FLUSH_BATCH_SIZE
+    if batch_ready:
+        _wake()
+
+
+def _trim():
+    """Drop the oldest events beyond USAGE_BUFFER_MAX_EVENTS (caller holds _lock)"""
+    while len(_buffer) > USAGE_BUFFER_MAX_EVENTS:
+        _buffer.popleft()
+        _metrics["dropped"] += 1
+
+
+def _wake():
+    loop, wakeup = _loop, _wakeup
+    if loop is None or wakeup is None:
+        return
+    try:
+        loop.call_soon_threadsafe(wakeup.set)
+    except RuntimeError:
+        pass  # Event loop already closed; the shutdown flush picks the events up
+
+
+def flush() -> int:
+    """
+    Write buffered events to the database, USAGE_FLUSH_BATCH_SIZE per transaction.
+    A failed batch is put back in front of the buffer and the error raised. Returns the number written.
+    """
+    written = 0
+    with _flush_lock:
+        while True:
+            with _lock:
+                batch = [_buffer.popleft() for _ in range(min(USAGE_FLUSH_BATCH_SIZE, len(_buffer)))]
+            if not batch:
+                break
+            try:
+                database.insert_usage_events(batch)
+            except Exception:
+                with _lock:
+                    _buffer.extendleft(reversed(batch))
+                    _trim()
+                    _metrics["failed_flushes"] += 1
+                raise
+            written += len(batch)
+            with _lock:
+                _metrics["written"] += len(batch)
+                _metrics["last_flush_at"] = datetime.now().isoformat()
+    return written
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Counters since process start and the number of events waiting to be written"""
+    with _lock:
+        return {**_metrics, "buffered": len(_buffer)}
+
+
+def reset():
+    """Forget buffered events and counters"""
+    with _lock:
+        _buffer.clear()
+        for key in _metrics:
+            _metrics[key] = None if key == "last_flush_at" else 0
+
+
+def _percentile(counts: List[int], q: float) -> Optional[float]:
+    """Estimate the q-quantile from histogram bucket counts (interpolated linearly within the bucket)"""
+    total = sum(counts)
+    if not total:
+        return None
+    bounds = database.USAGE_RENDER_BUCKETS_MS
+    rank = q * total
+    seen = 0
+    for index, count in enumerate(counts):
+        if count and seen + count >= rank:
+            lower = bounds[index - 1] if index > 0 else 0
+            if index == len(bounds):
+                return float(lower)  # Slower than the last bound: report the bound
+            return round(lower + (bounds[index] - lower) * (rank - seen) / count, 1)
+        seen += count
+    return float(bounds[-1])
+
+
+def _new_stats() -> Dict[str, Any]:
+    return {"events": 0, "cache_hits": 0, "bytes": 0, "duration_ms": 0.0,
+            "histogram": [0] * (len(database.USAGE_RENDER_BUCKETS_MS) + 1)}
+
+
+def _finish_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
+    events = stats["events"]
+    return {
+        "events": events,
+        "cache_hits": stats["cache_hits"],
+        "cache_hit_rate": round(stats["cache_hits"] / events, 4) if events else None,
+        "bytes": stats["bytes"],
+        "avg_duration_ms": round(stats["duration_ms"] / events, 1) if events else None,
+        "render_ms": {name: _percentile(stats["histogram"], q) for name, q in PERCENTILES.items()},
+    }
+
+
+def get_usage_summary(period: str, since: datetime) -> Dict[str, Any]:
+    """
+    Usage per period bucket and generator, totals per generator and documents per user and bucket,
+    from the rollups since the given (UTC) time. Events still in the buffer are not included yet.
+    """
+    rollups = database.get_usage_rollups(period, since)
+    histogram = database.get_usage_render_histogram(period, since)
+
+    buckets: Dict[tuple, Dict[str, Any]] = {}
+    totals: Dict[str, Dict[str, Any]] = {}
+    users = []
+    for row in rollups:
+        for stats in (buckets.setdefault((row["bucket_start"], row["generator"]), _new_stats()),
+                      totals.setdefault(row["generator"], _new_stats())):
+            for field in ("events", "cache_hits", "bytes", "duration_ms"):
+                stats[field] += row[field]
+        users.append({"bucket_start": row["bucket_start"], "user_id": row["user_id"] or None,
+                      "generator": row["generator"], "events": row["events"]})
+    for row in histogram:
+        for stats in (buckets.setdefault((row["bucket_start"], row["generator"]), _new_stats()),
+                      totals.setdefault(row["generator"], _new_stats())):
+            stats["histogram"][row["bucket"]] += row["events"]
+
+    return {
+        "buckets": [{"bucket_start": bucket_start, "generator": generator, **_finish_stats(stats)}
+                    for (bucket_start, generator), stats in sorted(buckets.items())],
+        "totals": [{"generator": generator, **_finish_stats(stats)} for generator, stats in sorted(totals.items())],
+        "users": users,
+    }
+
+
+async def run_forever():
+    """Flush every USAGE_FLUSH_INTERVAL_SECONDS, or earlier when a full batch is waiting (on the database thread)"""
+    global _loop, _wakeup
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=USAGE_FLUSH_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        try:
+            written = await async_database.run(flush)
+            if written:
+                print(f"📝 Usage log: wrote {written} events")
+        except Exception as e:
+            print(f"❌ Usage log flush failed ({get_metrics()['buffered']} events kept): {e}")
@@ -25,6 +25,13 @@ interface ImageUpload {
   placeholder_type: string
 }
 
+interface BatchUploadResult {
+  filename: string | null
+  status_code: number
+  image: ImageUpload | null
+  error: string | null
+}
+
 export default function ProjectDescPage() {
   const navigate = useNavigate()
   const [projectTypes, setProjectTypes] = useState<ProjectType[]>([])
@@ -45,6 +52,7 @@ export default function ProjectDescPage() {
   const [currentStep, setCurrentStep] = useState(1)
   const [uploadingImage, setUploadingImage] = useState(false)
   const [generatedPDFUrl, setGeneratedPDFUrl] = useState<string | null>(null)
+  const [generatedPDFBlob, setGeneratedPDFBlob] = useState<Blob | null>(null)
 
   useEffect(() => {
     fetchProjectTypes()
@@ -145,8 +153,8 @@ export default function ProjectDescPage() {
   }
 
   const handleImageUpload = async (event: React.ChangeEvent<HTMLInputElement>, placeholderType: string) => {
-    const file = event.target.files?.[0]
-    if (!file) return
+    const files = Array.from(event.target.files ?? [])
+    if (files.length === 0) return
 
     setUploadingImage(true)
     setError(null)
@@ -154,10 +162,11 @@ export default function ProjectDescPage() {
     try {
       const token = localStorage.getItem('access_token')
       const formData = new FormData()
-      formData.append('file', file)
-      formData.append('placeholder_type', placeholderType)
+      files.forEach(file => formData.append('files', file))
+      formData.append('placeholder_types', placeholderType)
 
-      const response = await fetch(`${config.backendUrl}/upload-image`, {
+      // All selected files go in one request and are processed in parallel on the server
+      const response = await fetch(`${config.backendUrl}/upload-images`, {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`
@@ -166,9 +175,16 @@ export default function ProjectDescPage() {
       })
 
       if (response.ok) {
-        const imageData = await response.json()
-        setImages(prev => [...prev, imageData])
-        setSuccess('Bilde lastet opp!')
+        const { results }: { results: BatchUploadResult[] } = await response.json()
+        const uploaded = results.flatMap(result => result.image ? [result.image] : [])
+        const failed = results.filter(result => !result.image)
+        setImages(prev => [...prev, ...uploaded])
+        if (failed.length > 0) {
+          setError(`Feil ved bildeopplasting: ${failed.map(result => `${result.filename}: ${result.error}`).join(', ')}`)
+        }
+        if (uploaded.length > 0) {
+          setSuccess(uploaded.length === 1 ? 'Bilde lastet opp!' : `${uploaded.length} bilder lastet opp!`)
+        }
       } else {
         const errorText = await response.text()
         setError(`Feil ved bildeopplasting: ${errorText}`)
@@ -177,6 +193,7 @@ export default function ProjectDescPage() {
       setError('Feil ved bildeopplasting')
     } finally {
       setUploadingImage(false)
+      event.target.value = ''
     }
   }
 
@@ -195,7 +212,7 @@ export default function ProjectDescPage() {
 
     try {
       const token = localStorage.getItem('access_token')
-      const response = await fetch(`${config.backendUrl}/generate-project-description`, {
+      const response = await fetch(`${config.backendUrl}/generate-project-description?inline=true`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -218,9 +235,11 @@ export default function ProjectDescPage() {
       console.log('  Language:', language)
 
       if (response.ok) {
-        const result = await response.json()
-        console.log('PDF generated:', result)
-        setGeneratedPDFUrl(result.pdf_url)
+        // The PDF comes back inline, so the download button needs no second request
+        const blob = await response.blob()
+        console.log('PDF generated:', response.headers.get('X-PDF-URL'), `(cached: ${response.headers.get('X-Cached')})`)
+        setGeneratedPDFBlob(blob)
+        setGeneratedPDFUrl(response.headers.get('X-PDF-URL'))
         setSuccess('PDF generert! Du kan nå laste den ned.')
         setCurrentStep(3)
       } else {
@@ -234,23 +253,30 @@ export default function ProjectDescPage() {
     }
   }
 
+  const fetchPDF = async (): Promise<Blob | null> => {
+    if (generatedPDFBlob) {
+      return generatedPDFBlob
+    }
+    const token = localStorage.getItem('access_token')
+    const response = await fetch(`${config.backendUrl}${generatedPDFUrl}`, {
+      headers: {
+        'Authorization': `Bearer ${token}`
+      }
+    })
+    return response.ok ? await response.blob() : null
+  }
+
   const downloadPDF = async () => {
-    if (!generatedPDFUrl) {
+    if (!generatedPDFBlob && !generatedPDFUrl) {
       setError('Ingen PDF-URL funnet')
       return
     }
 
     try {
-      const token = localStorage.getItem('access_token')
-      const response = await fetch(`${config.backendUrl}${generatedPDFUrl}`, {
-        headers: {
-          'Authorization': `Bearer ${token}`
-        }
-      })
+      const blob = await fetchPDF()
 
-      if (response.ok) {
+      if (blob) {
         // Create blob and download
-        const blob = await response.blob()
         const url = window.URL.createObjectURL(blob)
         const a = document.createElement('a')
         a.href = url
@@ -281,6 +307,7 @@ export default function ProjectDescPage() {
     setError(null)
     setSuccess(null)
     setGeneratedPDFUrl(null)
+    setGeneratedPDFBlob(null)
   }
 
   return (
@@ -706,6 +733,7 @@ export default function ProjectDescPage() {
                     <input
                       type="file"
                       accept="image/*"
+                      multiple
                       onChange={(e) => handleImageUpload(e, placeholderType)}
                       style={{ display: 'none' }}
                       id={`upload-${placeholderType}`}
@@ -798,7 +826,7 @@ export default function ProjectDescPage() {
                             overflow: 'hidden'
                           }}>
                             <img
-                              src={`${config.backendUrl}${image.url}`}
+                              src={`${config.backendUrl}${image.url}?size=thumb`}
                               alt={image.filename}
                               style={{
                                 width: '100%',
@@ -859,7 +887,7 @@ export default function ProjectDescPage() {
                       backgroundColor: '#ffffff'
                     }}>
                       <img
-                        src={`${config.backendUrl}${image.url}`}
+                        src={`${config.backendUrl}${image.url}?size=thumb`}
                         alt={image.filename}
                         style={{
                           width: '100%',